@@ -4,8 +4,13 @@ from flask import Blueprint, jsonify, request, send_file, abort
 import os
 import yaml
 import json
+import re
 
 from commons.get_config import get_config
+from engine.utils.workflow_catalog import workflow_catalog
+from engine.state.lifetime_manager import lifetime_manager
+from engine.state.definition_store import definition_store
+from engine.state.artifact_store import artifact_store
 
 config = get_config()
 directories = config["directories"]
@@ -40,38 +45,53 @@ def get_module_config(module_name):
 
 @api.route("/lifetimes", methods=["GET"])
 def get_active_lifetimes():
-    response = []
-    path = os.path.join(directories["lifetimes"])
-    for file in os.listdir(path):
-        if file.endswith(".yaml"):
-            response.append(file.replace(".yaml", ""))
-    return response
+    return lifetime_manager.list_active()
 
 @api.route("/lifetimes/completed", methods=["GET"])
 def get_completed_lifetimes():
-    response = []
-    path = os.path.join(directories["lifetimes"], "completed")
-    for file in os.listdir(path):
-        if file.endswith(".yaml"):
-            response.append(file.replace(".yaml", ""))
-    return response
+    return lifetime_manager.list_completed()
+
+@api.route("/lifetimes/index", methods=["GET"])
+def query_lifetimes():
+    # Answered from the lifetime store's index (status, workflow name, current step, timestamps)
+    return jsonify(lifetime_manager.query(
+        status=request.args.get("status"),
+        workflow=request.args.get("workflow"),
+        limit=request.args.get("limit", type=int)
+    ))
 
 @api.route("/lifetimes/<uid>", methods=["GET"])
 def get_lifetime_by_uid(uid):
-    full_path = os.path.join(directories["lifetimes"], f"{uid}.yaml")
-    if os.path.exists(full_path):
-        with open(full_path, "r") as f:
-            return jsonify(yaml.safe_load(f))
+    lifetime_map = lifetime_manager.load(uid, completed=False)
+    if lifetime_map:
+        return jsonify(lifetime_map)
     return abort(404)
 
 @api.route("/lifetimes/completed/<uid>", methods=["GET"])
 def get_completed_lifetime_by_uid(uid):
-    full_path = os.path.join(directories["lifetimes"], "completed", f"{uid}.yaml")
-    if os.path.exists(full_path):
-        with open(full_path, "r") as f:
-            return jsonify(yaml.safe_load(f))
+    lifetime_map = lifetime_manager.load(uid)
+    if lifetime_map and lifetime_map.get("reason") == "completed":
+        return jsonify(lifetime_map)
     return abort(404)
 
+@api.route("/definitions/<content_hash>", methods=["GET"])
+def get_workflow_definition(content_hash):
+    # Lifetimes reference the workflow definition they run by its workflow_hash
+    workflow = definition_store.get(content_hash)
+    if workflow is None:
+        return abort(404)
+    return jsonify(workflow)
+
+@api.route("/artifacts/<digest>", methods=["GET"])
+def get_artifact(digest):
+    # Large step outputs are shown in lifetimes as {"__artifact__": digest, "size", "length"}
+    if not re.fullmatch(r"[0-9a-f]{64}", digest):
+        return abort(400)
+    try:
+        return jsonify({"artifact": digest, "content": artifact_store.read(digest)})
+    except FileNotFoundError:
+        return abort(404)
+
 ### ────── MODULE ENDPOINTS ──────
 
 @api.route("/modules", methods=["GET"])
@@ -105,14 +125,8 @@ def get_module_manifest(module_name):
 
 @api.route("/workflows", methods=["GET"])
 def list_workflow_dirs():
-    base = directories["workflows"]
-    result = {}
-    for root, dirs, files in os.walk(base):
-        rel = os.path.relpath(root, base)
-        if rel == "." or any(ignored in rel for ignored in config["app"].get("ignored_workflow_dirs", [])):
-            continue
-        result[rel] = [f for f in files if f.endswith(".yaml")]
-    return jsonify(result)
+    # Served from the workflow catalog instead of walking the tree per request
+    return jsonify(workflow_catalog.listing())
 
 @api.route("/workflows/<path:dir>/<wf_name>", methods=["GET"])
 def get_workflow_yaml(dir, wf_name):
@@ -142,19 +156,3 @@ def get_component_log(component_name):
         return abort(404)
     with open(path, "r") as f:
         return jsonify({"log": f.read()})
-    
-
-### ────── HELPER ──────
-
-def _get_lifetime_runs(folder):
-    if not os.path.exists(folder):
-        return jsonify([])
-
-    entries = []
-    for file in os.listdir(folder):
-        try:
-            with open(os.path.join(folder, file), "r") as f:
-                entries.append(yaml.safe_load(f))
-        except Exception:
-            continue
-    return jsonify(entries)
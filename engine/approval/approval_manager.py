@@ -1,6 +1,7 @@
 # approval_manager.py
 
 import threading
+from engine.utils.parking import parking_lot
 from commons.logs import get_logger
 
 logger = get_logger("approval_manager")
@@ -19,26 +20,37 @@ class ApprovalManager:
         thread = threading.Thread(target=self._listen_for_results, daemon=True)
         thread.start()
 
-    def request_approval(self, uid, step_id, message, timeout_minutes, approval_link, delivery_step=None, context_snapshot={}):
+    def request_approval(self, uid, step_id, message, timeout_minutes, approval_link, delivery_step=None, context_snapshot={}, wait=True, expires_at=None):
+        """
+        Register the approval route. With wait=False no event is created: the
+        run is parked and the result is delivered through the parking lot.
+        `expires_at` (UTC ISO-8601) pins the deadline; otherwise it is
+        `timeout_minutes` from when the route is registered.
+        """
         logger.info(f"[APPROVAL] Registering approval {uid}/{step_id} with link {approval_link}")
         key = (uid, step_id)
-        with self._lock:
-            if key in self._events:
-                logger.warning(f"[APPROVAL] Duplicate approval requested for {key}, overwriting event")
-            event = threading.Event()
-            self._events[key] = event
+        event = None
+        if wait:
+            with self._lock:
+                if key in self._events:
+                    logger.warning(f"[APPROVAL] Duplicate approval requested for {key}, overwriting event")
+                event = threading.Event()
+                self._events[key] = event
 
-        # Inject approval_link into delivery_step input if needed
+        # Inject approval_link into delivery_step input if needed.
+        # Work on a copy: step definitions belong to the shared execution plan.
         if delivery_step and 'input' in delivery_step:
-            for k, v in delivery_step['input'].items():
-                if isinstance(v, str) and "{{ context.approval_link }}" in v:
-                    delivery_step['input'][k] = v.replace("{{ context.approval_link }}", approval_link)
+            delivery_step = dict(delivery_step, input={
+                k: v.replace("{{ context.approval_link }}", approval_link) if isinstance(v, str) else v
+                for k, v in delivery_step['input'].items()
+            })
 
         self.approval_request_q.put({
             "action": "register",
             "uid": uid,
             "step_id": step_id,
             "timeout_minutes": timeout_minutes,
+            "expires_at": expires_at,
             "message": message,
             "approval_link": approval_link,
             "delivery_step": delivery_step,
@@ -63,17 +75,24 @@ class ApprovalManager:
         logger.info(f"[APPROVAL] Approval result for {key} → {result}")
         return result
 
-    def resolve(self, uid, step_id, status):
+    def resolve(self, uid, step_id, status, interactive=True, **details):
         logger.info(f"resolve is called with uid={uid}, step_id={step_id}, status={status}")
         key = (uid, step_id)
+        result = {"status": status, **details}
         with self._lock:
             event = self._events.get(key)
             if event:
-                self._results[key] = {"status": status}
+                self._results[key] = result
                 event.set()
                 logger.info(f"[APPROVAL] Resolved approval for {key} with status={status}")
-            else:
-                logger.warning(f"[APPROVAL] No pending event found for {key}")
+                return True
+
+        if parking_lot.resolve(uid, step_id, result, interactive=interactive):
+            logger.info(f"[APPROVAL] Resolved parked approval for {key} with status={status}")
+            return True
+
+        logger.warning(f"[APPROVAL] No pending event found for {key}")
+        return False
 
     def _listen_for_results(self):
         while True:
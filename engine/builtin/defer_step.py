@@ -1,14 +1,18 @@
 # engine/builtin/defer_step.py
 
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from dateutil import parser as dtparser
+from engine.utils.template_cache import template_cache
 
 def resolve_defer_time(step_def, context):
+    """Naive UTC datetime a defer step waits until; `context` is the run's context dict."""
     if "time" in step_def:
-        ts_raw = context.render(step_def["time"])
-        return dtparser.parse(ts_raw)
+        ts = dtparser.parse(template_cache.render(str(step_def["time"]), context=context))
+        if ts.tzinfo is not None:
+            ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+        return ts
     elif "minutes_from_now" in step_def:
-        minutes = int(context.render(step_def["minutes_from_now"]))
+        minutes = float(template_cache.render(str(step_def["minutes_from_now"]), context=context))
         return datetime.utcnow() + timedelta(minutes=minutes)
     else:
         raise ValueError("Defer step must include 'time' or 'minutes_from_now'")
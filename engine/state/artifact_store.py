@@ -0,0 +1,167 @@
+# engine/state/artifact_store.py
+
+import os
+import hashlib
+import threading
+import yaml
+from commons.logs import get_logger
+from commons.get_config import get_config
+
+logger = get_logger("lifetime_manager")
+config = get_config()
+
+ARTIFACTS_DIR = os.path.join(config["directories"]["workdir"], "artifacts")
+ARTIFACT_THRESHOLD_BYTES = int(config.get("engine", {}).get("artifact_threshold_bytes", 65536))
+ARTIFACT_MARKER = "__artifact__"
+
+
+class ArtifactRef:
+    """
+    Stand-in for a large string spilled to the artifact store. Reads the
+    content back only when it is used as a string (template output,
+    `| tojson`, `in`, string methods); `| length`, `is string` and hashing
+    need only the reference. Persisted and shown as
+    {"__artifact__": digest, "size": bytes, "length": chars}.
+    """
+
+    __slots__ = ("digest", "size", "length")
+
+    def __init__(self, digest, size, length):
+        self.digest = digest
+        self.size = size
+        self.length = length
+
+    @property
+    def value(self):
+        return artifact_store.read(self.digest)
+
+    def to_dict(self):
+        return {ARTIFACT_MARKER: self.digest, "size": self.size, "length": self.length}
+
+    def __str__(self):
+        return self.value
+
+    def __repr__(self):
+        return f"<artifact {self.digest[:12]} {self.size} bytes>"
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        return iter(self.value)
+
+    def __contains__(self, item):
+        return item in self.value
+
+    def __getitem__(self, index):
+        return self.value[index]
+
+    def __eq__(self, other):
+        if isinstance(other, ArtifactRef):
+            return self.digest == other.digest
+        return isinstance(other, str) and self.length == len(other) and self.value == other
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def __getattr__(self, name):
+        # String methods (.strip(), .splitlines(), ...) act on the content
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.value, name)
+
+
+class ArtifactStore:
+    """
+    Content-addressed store for large step outputs, one file per sha256
+    digest under `<workdir>/artifacts/<2 hex>/<digest>`. spill() swaps every
+    string in a step result longer than `threshold` bytes for an
+    ArtifactRef, so lifetimes and the context carry only references; equal
+    outputs are stored once.
+    """
+
+    def __init__(self, base_dir=ARTIFACTS_DIR, threshold=ARTIFACT_THRESHOLD_BYTES):
+        self.base_dir = base_dir
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._stats = {"spilled": 0, "stored": 0, "bytes_stored": 0, "reads": 0}
+        os.makedirs(base_dir, exist_ok=True)
+
+    def _path(self, digest):
+        return os.path.join(self.base_dir, digest[:2], digest)
+
+    def put(self, text):
+        data = text.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._stats["stored"] += 1
+                self._stats["bytes_stored"] += len(data)
+        return ArtifactRef(digest, len(data), len(text))
+
+    def read(self, digest):
+        with self._lock:
+            self._stats["reads"] += 1
+        with open(self._path(digest), "rb") as f:
+            return f.read().decode("utf-8")
+
+    def spill(self, value):
+        """`value` with every string over the threshold (at any depth of dicts and lists) replaced by an ArtifactRef."""
+        if not self.threshold:
+            return value
+        if isinstance(value, str):
+            # Cheap pre-check on characters; UTF-8 is never shorter
+            if len(value) <= self.threshold or len(value.encode("utf-8")) <= self.threshold:
+                return value
+            ref = self.put(value)
+            with self._lock:
+                self._stats["spilled"] += 1
+            logger.info(f"[ARTIFACT] Spilled {ref.size} bytes to artifact {ref.digest[:12]}")
+            return ref
+        if isinstance(value, dict):
+            return {k: self.spill(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.spill(v) for v in value]
+        return value
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, threshold_bytes=self.threshold)
+
+
+def artifact_json_default(value):
+    """json.dumps default= hook: references as their marker dict, anything else as str()."""
+    if isinstance(value, ArtifactRef):
+        return value.to_dict()
+    return str(value)
+
+
+def artifact_content_default(value):
+    """json.dumps default= hook for templates (`| tojson`): references as the content they stand for."""
+    if isinstance(value, ArtifactRef):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def revive_artifacts(value):
+    """Turn the persisted marker dicts of a lifetime back into ArtifactRefs."""
+    if isinstance(value, dict):
+        if ARTIFACT_MARKER in value:
+            return ArtifactRef(value[ARTIFACT_MARKER], value.get("size", 0), value.get("length", 0))
+        return {k: revive_artifacts(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [revive_artifacts(v) for v in value]
+    return value
+
+
+yaml.SafeDumper.add_representer(ArtifactRef, lambda dumper, ref: dumper.represent_dict(ref.to_dict()))
+
+
+# Singleton
+artifact_store = ArtifactStore()
@@ -0,0 +1,94 @@
+# engine/state/definition_store.py
+
+import os
+import json
+import threading
+from collections import OrderedDict
+from engine.utils.workflow_compiler import workflow_hash
+from commons.logs import get_logger
+from commons.get_config import get_config
+
+logger = get_logger("lifetime_manager")
+config = get_config()
+
+DEFINITIONS_DIR = os.path.join(config["directories"]["lifetimes"], "definitions")
+DEFINITION_CACHE_SIZE = 256
+
+
+class DefinitionStore:
+    """
+    Workflow definitions stored once per content hash (the same hash the
+    ExecutionPlan cache uses), as `<hash>.json`. Lifetimes keep only the
+    hash, so a run resumes with the exact definition it started with even
+    if the workflow file changed since. Files are immutable once written.
+    """
+
+    def __init__(self, base_dir=DEFINITIONS_DIR, cache_size=DEFINITION_CACHE_SIZE):
+        self.base_dir = base_dir
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # hash → definition, most recently used last
+        self._lock = threading.Lock()
+        self._stats = {"stored": 0, "disk_reads": 0}
+        os.makedirs(base_dir, exist_ok=True)
+
+    def _path(self, content_hash):
+        return os.path.join(self.base_dir, f"{content_hash}.json")
+
+    def _remember(self, content_hash, workflow):
+        self._cache[content_hash] = workflow
+        self._cache.move_to_end(content_hash)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def put(self, workflow, content_hash=None):
+        """Store a definition (if not already stored) and return its hash."""
+        content_hash = content_hash or workflow_hash(workflow)
+        with self._lock:
+            if content_hash in self._cache:
+                self._cache.move_to_end(content_hash)
+                return content_hash
+            path = self._path(content_hash)
+            if not os.path.exists(path):
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(workflow, f, default=str)
+                os.replace(tmp_path, path)
+                self._stats["stored"] += 1
+                logger.info(f"[DEFINITIONS] Stored workflow '{workflow.get('name')}' as {content_hash[:12]}")
+            self._remember(content_hash, workflow)
+        return content_hash
+
+    def get(self, content_hash):
+        """The definition stored under `content_hash`, or None if there is none."""
+        with self._lock:
+            workflow = self._cache.get(content_hash)
+            if workflow is not None:
+                self._cache.move_to_end(content_hash)
+                return workflow
+            path = self._path(content_hash)
+            if not os.path.exists(path):
+                return None
+            with open(path, "r") as f:
+                workflow = json.load(f)
+            self._stats["disk_reads"] += 1
+            self._remember(content_hash, workflow)
+            return workflow
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, cached=len(self._cache))
+
+
+def workflow_of(lifetime_map):
+    """
+    The workflow definition a lifetime runs: looked up by its
+    `workflow_hash`, or embedded for lifetimes written before definitions
+    were stored separately.
+    """
+    if lifetime_map.get("workflow_hash"):
+        return definition_store.get(lifetime_map["workflow_hash"])
+    return lifetime_map.get("workflow")
+
+
+# Singleton
+definition_store = DefinitionStore()
@@ -2,9 +2,6 @@
 
 import os
 import threading
-import queue
-import yaml
-import shutil
 import time
 from datetime import datetime
 from commons.logs import get_logger
@@ -12,6 +9,7 @@ logger = get_logger("lifetime_manager")
 from commons.get_config import get_config
 config = get_config()
 from commons.utils import retry_this
+from engine.state.lifetime_store import create_lifetime_store, shard_of
 
 LIFETIME_DIR = config["directories"]["lifetimes"]
 MODULES_BASE = config["directories"]["modules"]
@@ -25,49 +23,171 @@ os.makedirs(COMPLETED_DIR, exist_ok=True)
 logger.info(f"[LIFETIME] Lifetime directory: {LIFETIME_DIR}")
 logger.info(f"[LIFETIME] Completed directory: {COMPLETED_DIR}")
 
-_lifetime_queue = queue.Queue()
-_file_lock = threading.Lock()
+FLUSH_INTERVAL_SECONDS = int(config.get("engine", {}).get("lifetime_flush_interval_ms", 200)) / 1000.0
+WRITER_SHARDS = int(config.get("engine", {}).get("lifetime_writers", 4))
 
-def _get_lifetime_path(uid):
-    return os.path.join(LIFETIME_DIR, f"{uid}.yaml")
+class _WriterShard:
+    """One writer thread with its own dirty set and condition, owning the uids that hash to it."""
 
-def _get_completed_path(uid):
-    return os.path.join(COMPLETED_DIR, f"{uid}.yaml")
-
-class LifetimeManager:
-    def __init__(self):
+    def __init__(self, index, store, flush_interval):
+        self.index = index
+        self.store = store
+        self.flush_interval = flush_interval
         self.running = True
-        self.worker = threading.Thread(target=self._process_loop, daemon=True)
+        self._dirty = {}        # uid → (lifetime_map, dirty_since)
+        self._inflight = set()  # uids the writer is writing right now
+        self._urgent = False
+        self._cond = threading.Condition()
+        self.stats = {"updates": 0, "coalesced": 0, "writes": 0, "batches": 0, "max_lag_seconds": 0.0}
+        self.worker = threading.Thread(target=self._process_loop, name=f"lifetime-writer-{index}", daemon=True)
         self.worker.start()
 
     def stop(self):
-        self.running = False
-        _lifetime_queue.put(None)
+        self.flush()
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
 
     def _process_loop(self):
-        while self.running:
-            item = _lifetime_queue.get()
-            if item is None:
-                break
-            uid, lifetime_map = item
+        while True:
+            with self._cond:
+                while self.running and not self._dirty:
+                    self._cond.wait()
+                if not self.running and not self._dirty:
+                    break
+                # Let updates pile up until the oldest is due, unless a barrier asks for them now
+                while self.running and not self._urgent:
+                    oldest = min(since for _, since in self._dirty.values())
+                    remaining = oldest + self.flush_interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._dirty = self._dirty, {}
+                self._inflight = set(batch)
+                self._urgent = False
+
             try:
-                with _file_lock:
-                    with open(_get_lifetime_path(uid), "w") as f:
-                        yaml.safe_dump(lifetime_map, f)
+                written = self.store.write_batch({uid: lifetime_map for uid, (lifetime_map, _) in batch.items()})
             except Exception as e:
-                print(f"[ERROR] Failed to write lifetime for {uid}: {e}")
+                logger.error(f"[LIFETIME] Failed to write a batch of {len(batch)} lifetimes: {e}")
+                written = []
+            now = time.monotonic()
+            lag = max((now - since for _, since in batch.values()), default=0.0)
+
+            with self._cond:
+                self.stats["batches"] += 1
+                self.stats["writes"] += len(written)
+                self.stats["max_lag_seconds"] = max(self.stats["max_lag_seconds"], round(lag, 3))
+                self._inflight = set()
+                self._cond.notify_all()
+
+    def update(self, uid, lifetime_map):
+        with self._cond:
+            self.stats["updates"] += 1
+            pending = self._dirty.get(uid)
+            if pending:
+                self.stats["coalesced"] += 1
+                self._dirty[uid] = (lifetime_map, pending[1])
+            else:
+                self._dirty[uid] = (lifetime_map, time.monotonic())
+                self._cond.notify_all()
+
+    def _pending(self, uid):
+        if uid is None:
+            return bool(self._dirty or self._inflight)
+        return uid in self._dirty or uid in self._inflight
+
+    def flush(self, uid=None):
+        with self._cond:
+            if self._pending(uid):
+                self._urgent = True
+                self._cond.notify_all()
+            while self._pending(uid):
+                self._cond.wait()
+
+    def oldest_dirty(self):
+        with self._cond:
+            return min((since for _, since in self._dirty.values()), default=None), len(self._dirty)
+
+
+class LifetimeManager:
+    """
+    Write-behind persistence of run lifetimes. update() only marks a run
+    dirty and keeps its latest map; a writer thread hands every dirty run
+    to the lifetime store as one batch once its oldest unwritten update is
+    `flush_interval` old, so a burst of updates to one run collapses into a
+    single write. Runs are sharded over `writers` independent writer threads
+    by uid hash, so a slow write of one large run only delays the runs
+    sharing its shard. flush() is the durability barrier: it forces pending
+    writes out (all, or one run's) and waits for them. Where and how
+    lifetimes are kept is up to the store (engine.lifetime_store: file or
+    sqlite).
+    """
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL_SECONDS, store=None, writers=WRITER_SHARDS):
+        self.flush_interval = flush_interval
+        self.store = store or create_lifetime_store()
+        self._shards = [_WriterShard(i, self.store, flush_interval) for i in range(max(1, writers))]
+        logger.info(f"[LIFETIME] Using the {self.store.name} lifetime store with {len(self._shards)} writers")
+
+    def _shard(self, uid):
+        return self._shards[shard_of(uid, len(self._shards))]
+
+    def stop(self):
+        for shard in self._shards:
+            shard.stop()
 
     def update(self, uid, lifetime_map):
-        _lifetime_queue.put((uid, lifetime_map))
+        self._shard(uid).update(uid, lifetime_map)
+
+    def flush(self, uid=None):
+        """Block until pending lifetime updates (all, or just `uid`'s) have been written."""
+        if uid is not None:
+            self._shard(uid).flush(uid)
+            return
+        for shard in self._shards:
+            shard.flush()
+
+    def load(self, uid, completed=True):
+        """Current lifetime of a run (active, or completed unless completed=False), after pending writes land; None if unknown."""
+        self.flush(uid)
+        return self.store.load(uid, completed=completed)
+
+    def list_active(self):
+        """uids of every run with an active lifetime."""
+        return self.store.list_active()
+
+    def list_completed(self):
+        return self.store.list_completed()
+
+    def query(self, status=None, workflow=None, limit=None):
+        """Summaries of runs (uid, workflow, status, current_step, defer_until, started_at, finished_at), newest first."""
+        self.flush()
+        return self.store.query(status=status, workflow=workflow, limit=limit)
 
     @retry_this(2)
     def mark_complete(self, uid):
-        time.sleep(0.1) # Ensure the file is written before moving
-        with _file_lock:
-            src = _get_lifetime_path(uid)
-            dst = _get_completed_path(uid)
-            if os.path.exists(src):
-                shutil.move(src, dst)
+        self.flush(uid)  # Only this run's final state must land before it is archived
+        self.store.complete(uid)
+
+    def stats(self):
+        totals = {"updates": 0, "coalesced": 0, "writes": 0, "batches": 0, "max_lag_seconds": 0.0}
+        dirty, oldest = 0, None
+        for shard in self._shards:
+            for key, value in shard.stats.items():
+                totals[key] = max(totals[key], value) if key == "max_lag_seconds" else totals[key] + value
+            shard_oldest, shard_dirty = shard.oldest_dirty()
+            dirty += shard_dirty
+            if shard_oldest is not None and (oldest is None or shard_oldest < oldest):
+                oldest = shard_oldest
+        return dict(
+            totals,
+            writers=len(self._shards),
+            dirty=dirty,
+            lag_seconds=round(time.monotonic() - oldest, 3) if oldest is not None else 0.0,
+            flush_interval_seconds=self.flush_interval,
+            store=self.store.stats()
+        )
 
 # Singleton
 lifetime_manager = LifetimeManager()
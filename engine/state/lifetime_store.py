@@ -0,0 +1,433 @@
+# engine/state/lifetime_store.py
+
+import os
+import json
+import sqlite3
+import zlib
+import threading
+import yaml
+from engine.state.artifact_store import artifact_json_default
+from commons.logs import get_logger
+from commons.get_config import get_config
+
+logger = get_logger("lifetime_manager")
+config = get_config()
+
+LIFETIME_DIR = config["directories"]["lifetimes"]
+COMPLETED_DIR = os.path.join(LIFETIME_DIR, "completed")
+COMPACT_EVERY = int(config.get("engine", {}).get("lifetime_compact_every", 50))
+SQLITE_PATH = config.get("engine", {}).get("lifetime_db_path") or os.path.join(LIFETIME_DIR, "lifetimes.db")
+
+FINISHED_STATUSES = ["completed", "failed"]
+LOCK_STRIPES = 64
+
+
+def shard_of(uid, shards):
+    """Stable shard index of a run uid (same across processes, unlike hash())."""
+    return zlib.crc32(uid.encode()) % shards
+
+
+def lifetime_status(lifetime_map):
+    """running, parked, completed or failed."""
+    if lifetime_map.get("reason") == "completed":
+        return "failed" if (lifetime_map.get("context") or {}).get("workflow_failed") else "completed"
+    parked = lifetime_map.get("parked")
+    if parked and not parked.get("resolved_at"):
+        return "parked"
+    return "running"
+
+
+def lifetime_summary(lifetime_map):
+    """The indexed fields of a lifetime."""
+    status = lifetime_status(lifetime_map)
+    parked = lifetime_map.get("parked") or {}
+    return {
+        "uid": lifetime_map.get("uid"),
+        "workflow": lifetime_map.get("workflow_name") or (lifetime_map.get("workflow") or {}).get("name"),
+        "status": status,
+        "current_step": lifetime_map.get("current_step"),
+        "defer_until": (parked.get("detail") or {}).get("wake_at") if status == "parked" else None,
+        "started_at": lifetime_map.get("started_at"),
+        "finished_at": lifetime_map.get("last_updated") if status in FINISHED_STATUSES else None
+    }
+
+
+class LifetimeStore:
+    """
+    Where lifetime_manager keeps run state. write_batch() is only called
+    from the lifetime writer thread, with the latest map of every run that
+    changed since the previous batch; everything else may be called from
+    any thread.
+    """
+
+    name = None
+
+    def write_batch(self, batch):
+        """Persist {uid: lifetime_map}. Returns the uids that were written."""
+        raise NotImplementedError
+
+    def load(self, uid, completed=True):
+        raise NotImplementedError
+
+    def complete(self, uid):
+        """Archive a finished run; its final state has already been written."""
+        raise NotImplementedError
+
+    def list_active(self):
+        raise NotImplementedError
+
+    def list_completed(self):
+        raise NotImplementedError
+
+    def query(self, status=None, workflow=None, limit=None):
+        """Summaries (see lifetime_summary) of runs matching the filters, newest first."""
+        raise NotImplementedError
+
+    def stats(self):
+        return {"backend": self.name}
+
+
+def _serialized(uid, lifetime_map, serialize):
+    # The run may mutate its context while it is being serialized; take the newer state
+    for attempt in range(3):
+        try:
+            return serialize(lifetime_map)
+        except RuntimeError:
+            continue
+    logger.error(f"[LIFETIME] Gave up writing lifetime for {uid}: context kept changing during the dump")
+    return None
+
+
+def _fingerprint(lifetime_map):
+    """What the next write is diffed against. Context keys and step results are kept by reference: the
+    engine hands over copy-on-write context snapshots, so an unchanged value is the very same object in
+    the next one and only changed values are ever encoded. The few top-level keys are kept as JSON."""
+    context = lifetime_map.get("context") or {}
+    return {
+        "top": {k: json.dumps(v, default=artifact_json_default, sort_keys=True) for k, v in list(lifetime_map.items()) if k != "context"},
+        "ctx": {k: v for k, v in list(context.items()) if k != "step_results"},
+        "results": dict(context.get("step_results") or {})
+    }
+
+
+def _delta(old, new):
+    """Journal record turning `old` into `new`, or None if nothing changed."""
+    record = {}
+    for section, set_key, unset_key in [("top", "set", "unset"), ("ctx", "ctx", "ctx_unset"), ("results", "results", "results_unset")]:
+        if section == "top":
+            changed = {k: json.loads(v) for k, v in new[section].items() if old[section].get(k) != v}
+        else:
+            changed = {k: v for k, v in new[section].items() if k not in old[section] or old[section][k] is not v}
+        removed = [k for k in old[section] if k not in new[section]]
+        if changed:
+            record[set_key] = changed
+        if removed:
+            record[unset_key] = removed
+    return record or None
+
+
+def _apply(lifetime_map, record):
+    lifetime_map.update(record.get("set", {}))
+    for key in record.get("unset", []):
+        lifetime_map.pop(key, None)
+    context = lifetime_map.setdefault("context", {})
+    context.update(record.get("ctx", {}))
+    for key in record.get("ctx_unset", []):
+        context.pop(key, None)
+    if "results" in record or "results_unset" in record:
+        results = context.setdefault("step_results", {})
+        results.update(record.get("results", {}))
+        for key in record.get("results_unset", []):
+            results.pop(key, None)
+
+
+class FileLifetimeStore(LifetimeStore):
+    """
+    An active run is a snapshot `<uid>.yaml` plus an append-only
+    `<uid>.journal` of JSON delta records (top-level keys, context keys and
+    step results that changed since the previous write). Every
+    `compact_every` records the snapshot is rewritten atomically (temp file
+    and rename) and the journal dropped. Readers replay snapshot plus tail,
+    ignoring records the snapshot already covers and a torn last line.
+    Completed runs are archived as one compacted YAML under `completed/`.
+    Runs only share a lock with the runs in the same lock stripe, so
+    writers on different shards do not wait for each other.
+    """
+
+    name = "file"
+
+    def __init__(self, base_dir=LIFETIME_DIR, compact_every=COMPACT_EVERY):
+        self.base_dir = base_dir
+        self.completed_dir = os.path.join(base_dir, "completed")
+        self.compact_every = compact_every
+        self._journals = {}  # uid → {"seq", "records", "fingerprint"} of the last write
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._stats_lock = threading.Lock()
+        self._stats = {"appends": 0, "compactions": 0}
+        os.makedirs(self.completed_dir, exist_ok=True)
+
+    def _lock(self, uid):
+        return self._locks[shard_of(uid, LOCK_STRIPES)]
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def _active_path(self, uid):
+        return os.path.join(self.base_dir, f"{uid}.yaml")
+
+    def _journal_path(self, uid):
+        return os.path.join(self.base_dir, f"{uid}.journal")
+
+    def _completed_path(self, uid):
+        return os.path.join(self.completed_dir, f"{uid}.yaml")
+
+    @staticmethod
+    def _dump_atomic(path, lifetime_map):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            yaml.safe_dump(lifetime_map, f)
+        os.replace(tmp_path, path)
+
+    def write_batch(self, batch):
+        written = []
+        for uid, lifetime_map in batch.items():
+            try:
+                if _serialized(uid, lifetime_map, lambda m: self._write(uid, m)):
+                    written.append(uid)
+            except Exception as e:
+                logger.error(f"[LIFETIME] Failed to write lifetime for {uid}: {e}")
+        return written
+
+    def _write(self, uid, lifetime_map):
+        fingerprint = _fingerprint(lifetime_map)
+        with self._lock(uid):
+            journal = self._journals.get(uid)
+            if journal is None or journal["records"] >= self.compact_every:
+                self._compact(uid, lifetime_map, fingerprint, journal["seq"] if journal else self._journal_tail_seq(uid))
+            else:
+                self._append(uid, journal, fingerprint)
+        return True
+
+    def _compact(self, uid, lifetime_map, fingerprint, seq):
+        """Atomically replace the snapshot, then drop the journal it now covers (caller holds the uid's lock)."""
+        self._dump_atomic(self._active_path(uid), dict(lifetime_map, journal_seq=seq))
+        if os.path.exists(self._journal_path(uid)):
+            os.remove(self._journal_path(uid))
+        self._journals[uid] = {"seq": seq, "records": 0, "fingerprint": fingerprint}
+        self._count("compactions")
+
+    def _journal_tail_seq(self, uid):
+        """Highest seq in the run's journal left by an earlier process, 0 if none (caller holds the uid's lock).
+        The first compaction after a restart must cover those records, or a crash before the journal is
+        removed would replay them over the newer snapshot."""
+        seq = 0
+        journal_path = self._journal_path(uid)
+        if os.path.exists(journal_path):
+            with open(journal_path, "r") as f:
+                for line in f:
+                    try:
+                        seq = max(seq, json.loads(line)["seq"])
+                    except ValueError:
+                        break
+        return seq
+
+    def _append(self, uid, journal, fingerprint):
+        record = _delta(journal["fingerprint"], fingerprint)
+        if record is None:
+            return
+        record["seq"] = journal["seq"] + 1
+        with open(self._journal_path(uid), "a") as f:
+            f.write(json.dumps(record, default=artifact_json_default) + "\n")
+        journal.update(seq=record["seq"], records=journal["records"] + 1, fingerprint=fingerprint)
+        self._count("appends")
+
+    def _read(self, uid):
+        """Snapshot plus journal tail of an active run (caller holds the uid's lock); None if there is no snapshot."""
+        path = self._active_path(uid)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            lifetime_map = yaml.safe_load(f)
+        snapshot_seq = lifetime_map.pop("journal_seq", 0)
+        journal_path = self._journal_path(uid)
+        if os.path.exists(journal_path):
+            with open(journal_path, "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn last line from a crash mid-append
+                        break
+                    if record["seq"] > snapshot_seq:
+                        _apply(lifetime_map, record)
+        return lifetime_map
+
+    def load(self, uid, completed=True):
+        with self._lock(uid):
+            lifetime_map = self._read(uid)
+            if lifetime_map is None and completed and os.path.exists(self._completed_path(uid)):
+                with open(self._completed_path(uid), "r") as f:
+                    lifetime_map = yaml.safe_load(f)
+        return lifetime_map
+
+    def complete(self, uid):
+        with self._lock(uid):
+            lifetime_map = self._read(uid)
+            if lifetime_map is not None:
+                self._dump_atomic(self._completed_path(uid), lifetime_map)
+                os.remove(self._active_path(uid))
+                if os.path.exists(self._journal_path(uid)):
+                    os.remove(self._journal_path(uid))
+            self._journals.pop(uid, None)
+
+    @staticmethod
+    def _uids(folder):
+        return [
+            fname[:-len(".yaml")] for fname in os.listdir(folder)
+            if fname.endswith(".yaml") and not fname.startswith("~")
+        ]
+
+    def list_active(self):
+        return self._uids(self.base_dir)
+
+    def list_completed(self):
+        return self._uids(self.completed_dir)
+
+    def query(self, status=None, workflow=None, limit=None):
+        # No index on disk: every lifetime is read
+        summaries = []
+        for uid in self.list_active() + self.list_completed():
+            try:
+                summary = lifetime_summary(self.load(uid) or {})
+            except Exception as e:
+                logger.warning(f"[LIFETIME] Skipping unreadable lifetime {uid}: {e}")
+                continue
+            if (status is None or summary["status"] == status) and (workflow is None or summary["workflow"] == workflow):
+                summaries.append(summary)
+        summaries.sort(key=lambda s: s["started_at"] or "", reverse=True)
+        return summaries[:limit] if limit else summaries
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(super().stats(), compact_every=self.compact_every, **self._stats)
+
+
+class SqliteLifetimeStore(LifetimeStore):
+    """
+    One row per run in a SQLite database in WAL mode: the indexed summary
+    columns plus the full lifetime as JSON. Each writer batch is committed
+    in one transaction, and listings and status lookups are index queries.
+    Readers and writer shards each use their own per-thread connection;
+    readers never wait on a writer, and SQLite serializes the writers. Lifetime files found on first open are imported.
+    """
+
+    name = "sqlite"
+    COLUMNS = ["uid", "workflow", "status", "current_step", "defer_until", "started_at", "finished_at"]
+
+    def __init__(self, db_path=SQLITE_PATH, import_dir=LIFETIME_DIR):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {"commits": 0, "rows_written": 0}
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS lifetimes ("
+                "uid TEXT PRIMARY KEY, workflow TEXT, status TEXT, current_step TEXT, "
+                "defer_until TEXT, started_at TEXT, finished_at TEXT, data TEXT NOT NULL)"
+            )
+            for column in ["workflow", "status", "defer_until", "started_at", "finished_at"]:
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_lifetimes_{column} ON lifetimes({column})")
+        if import_dir and not conn.execute("SELECT 1 FROM lifetimes LIMIT 1").fetchone():
+            self._import(FileLifetimeStore(import_dir))
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _import(self, file_store):
+        batch = {}
+        for uid in file_store.list_active() + file_store.list_completed():
+            try:
+                batch[uid] = file_store.load(uid)
+            except Exception as e:
+                logger.warning(f"[LIFETIME] Not importing unreadable lifetime {uid}: {e}")
+        if batch:
+            self.write_batch(batch)
+            logger.info(f"[LIFETIME] Imported {len(batch)} lifetime files into {self.db_path}")
+
+    def write_batch(self, batch):
+        rows = []
+        for uid, lifetime_map in batch.items():
+            data = _serialized(uid, lifetime_map, lambda m: json.dumps(m, default=artifact_json_default))
+            if data is None:
+                continue
+            summary = lifetime_summary(lifetime_map)
+            summary["uid"] = uid
+            rows.append([summary[c] for c in self.COLUMNS] + [data])
+        if rows:
+            conn = self._conn()
+            with conn:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO lifetimes ({', '.join(self.COLUMNS)}, data) "
+                    f"VALUES ({', '.join('?' * (len(self.COLUMNS) + 1))})",
+                    rows
+                )
+            with self._stats_lock:
+                self._stats["commits"] += 1
+                self._stats["rows_written"] += len(rows)
+        return [row[0] for row in rows]
+
+    def load(self, uid, completed=True):
+        sql = "SELECT data FROM lifetimes WHERE uid = ?"
+        if not completed:
+            sql += " AND finished_at IS NULL"
+        row = self._conn().execute(sql, (uid,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def complete(self, uid):
+        # finished_at was set by the final write; nothing moves
+        pass
+
+    def list_active(self):
+        return [row[0] for row in self._conn().execute("SELECT uid FROM lifetimes WHERE finished_at IS NULL")]
+
+    def list_completed(self):
+        return [row[0] for row in self._conn().execute("SELECT uid FROM lifetimes WHERE finished_at IS NOT NULL")]
+
+    def query(self, status=None, workflow=None, limit=None):
+        clauses, params = [], []
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if workflow is not None:
+            clauses.append("workflow = ?")
+            params.append(workflow)
+        sql = f"SELECT {', '.join(self.COLUMNS)} FROM lifetimes"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY started_at DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        return [dict(zip(self.COLUMNS, row)) for row in self._conn().execute(sql, params)]
+
+    def stats(self):
+        by_status = dict(self._conn().execute("SELECT status, COUNT(*) FROM lifetimes GROUP BY status").fetchall())
+        return dict(super().stats(), by_status=by_status, **self._stats)
+
+
+STORES = {"file": FileLifetimeStore, "sqlite": SqliteLifetimeStore}
+
+
+def create_lifetime_store(name=None):
+    name = name or config.get("engine", {}).get("lifetime_store", "file")
+    if name not in STORES:
+        raise ValueError(f"Unsupported lifetime store '{name}'. Must be one of {list(STORES)}")
+    return STORES[name]()
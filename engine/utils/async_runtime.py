@@ -0,0 +1,90 @@
+# engine/utils/async_runtime.py
+
+import asyncio
+import functools
+import threading
+import httpx
+from concurrent.futures import ThreadPoolExecutor
+from commons.logs import get_logger
+from commons.get_config import get_config
+
+logger = get_logger(__name__)
+config = get_config()
+
+DEFAULT_SYNC_WORKERS = 32
+
+
+class AsyncRuntime:
+    """
+    Engine-wide asyncio event loop running on a single daemon thread.
+    Coroutine module methods are awaited here, so many in-flight calls share
+    one thread; blocking work reached from the loop is offloaded to a
+    bounded thread pool via `to_thread`.
+    """
+
+    def __init__(self, sync_workers=DEFAULT_SYNC_WORKERS):
+        self.sync_workers = max(int(sync_workers), 1)
+        self._loop = None
+        self._thread = None
+        self._executor = None
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._http_client = None
+
+    @property
+    def loop(self):
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    self._executor = ThreadPoolExecutor(max_workers=self.sync_workers, thread_name_prefix="async-offload")
+                    loop.set_default_executor(self._executor)
+                    self._thread = threading.Thread(target=loop.run_forever, name="async-runtime", daemon=True)
+                    self._thread.start()
+                    self._loop = loop
+                    logger.info(f"[ASYNC] Event loop started ({self.sync_workers} offload workers)")
+        return self._loop
+
+    def submit(self, coro):
+        """Schedule a coroutine on the shared loop; returns a concurrent.futures.Future."""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("AsyncRuntime.submit() called from the event loop thread; await the coroutine instead")
+        return asyncio.run_coroutine_threadsafe(self._track(coro), self.loop)
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the shared loop and block the calling thread for its result."""
+        return self.submit(coro).result(timeout)
+
+    def http_client(self):
+        """
+        httpx.AsyncClient shared by every module coroutine on the loop, so
+        connections are pooled across steps and modules. No default timeout,
+        like `requests` in the sync methods; callers pass their own.
+        """
+        if self._http_client is None:
+            with self._lock:
+                if self._http_client is None:
+                    self._http_client = httpx.AsyncClient(timeout=None)
+        return self._http_client
+
+    async def to_thread(self, func, *args, **kwargs):
+        """Await a blocking callable on the offload pool without stalling the loop."""
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+    async def _track(self, coro):
+        self._inflight += 1
+        try:
+            return await coro
+        finally:
+            self._inflight -= 1
+
+    def stats(self):
+        return {
+            "running": self._loop is not None and self._loop.is_running(),
+            "inflight": self._inflight,
+            "sync_workers": self.sync_workers
+        }
+
+
+# Singleton
+async_runtime = AsyncRuntime(config.get("engine", {}).get("async_sync_workers", DEFAULT_SYNC_WORKERS))
@@ -0,0 +1,149 @@
+# engine/utils/concurrency_manager.py
+
+import threading
+from collections import deque
+from engine.utils.template_cache import template_cache
+from commons.logs import get_logger
+
+logger = get_logger(__name__)
+
+CONCURRENCY_POLICIES = ["queue", "drop", "cancel_previous"]
+
+
+class ConcurrencyManager:
+    """
+    Enforces workflow `concurrency` blocks: at most `limit` runs per rendered
+    key at a time. Runs over the limit are held here (queue), refused (drop),
+    or admitted after cancelling the oldest active runs (cancel_previous).
+    Held runs never occupy an executor worker or queue slot.
+    """
+
+    def __init__(self):
+        self._active = {}   # key → [uid, ...] oldest first
+        self._waiting = {}  # key → deque[(uid, start)]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(workflow, payload):
+        """Rendered concurrency key, namespaced by workflow name; None when the workflow sets no concurrency."""
+        block = workflow.get("concurrency")
+        if not block:
+            return None
+        key = template_cache.render(str(block.get("key", "")), **(payload or {})).strip()
+        return f"{workflow.get('name')}:{key}"
+
+    def admit(self, key, block, uid, start, cancel, discard):
+        """
+        Admit run `uid` under `key`. `start()` hands it to the executor,
+        `cancel(uid)` stops an active run and `discard(uid)` forgets a held one.
+        Returns "started", "queued" or "dropped".
+        """
+        limit = max(int(block.get("limit", 1)), 1)
+        policy = block.get("policy", "queue")
+        if policy not in CONCURRENCY_POLICIES:
+            raise ValueError(f"Unsupported concurrency policy '{policy}'")
+
+        with self._lock:
+            active = self._active.setdefault(key, [])
+            waiting = self._waiting.setdefault(key, deque())
+
+            if len(active) < limit and not waiting:
+                active.append(uid)
+                decision = "started"
+            elif policy == "drop":
+                decision = "dropped"
+            elif policy == "cancel_previous":
+                # Superseded runs that never started are discarded outright
+                superseded = [w_uid for w_uid, _ in waiting]
+                waiting.clear()
+                victims = active[:len(active) - limit + 1]
+                waiting.append((uid, start))
+                decision = "queued"
+            else:
+                waiting.append((uid, start))
+                decision = "queued"
+
+        if decision == "started":
+            self._start(key, uid, start)
+        elif policy == "cancel_previous" and decision == "queued":
+            for w_uid in superseded:
+                logger.info(f"[CONCURRENCY] {key}: dropping superseded queued run {w_uid}")
+                discard(w_uid)
+            for victim in victims:
+                logger.info(f"[CONCURRENCY] {key}: cancelling run {victim} in favour of {uid}")
+                cancel(victim)
+
+        logger.info(f"[CONCURRENCY] {key}: run {uid} {decision} (policy={policy}, limit={limit})")
+        return decision
+
+    def readmit(self, key, block, uid, start=None):
+        """
+        Admit again a run that was admitted before and then parked, or was
+        recovered at boot. It keeps the slot it still holds under `key`,
+        takes a free one (its slot was lost with a restart), or else waits
+        for one as under policy queue. With `start` None the run stays parked
+        and only reclaims a free slot. Returns True if it holds a slot.
+        """
+        limit = max(int(block.get("limit", 1)), 1)
+        with self._lock:
+            active = self._active.setdefault(key, [])
+            waiting = self._waiting.setdefault(key, deque())
+            holds = uid in active
+            if not holds and len(active) < limit and not waiting:
+                active.append(uid)
+                holds = True
+            elif not holds and start is not None:
+                waiting.append((uid, start))
+            if not active and not waiting:
+                self._active.pop(key, None)
+                self._waiting.pop(key, None)
+
+        logger.info(f"[CONCURRENCY] {key}: run {uid} re-admitted ({'holds a slot' if holds else 'waiting for a slot'})")
+        if holds and start is not None:
+            # The slot stays held if the executor refuses the resume; the caller retries it
+            start()
+        return holds
+
+    def _start(self, key, uid, start):
+        try:
+            start()
+        except Exception:
+            self.release(key, uid)
+            raise
+
+    def release(self, key, uid):
+        """Free `uid`'s slot under `key` and start the next held run, if any."""
+        with self._lock:
+            active = self._active.get(key, [])
+            if uid in active:
+                active.remove(uid)
+            waiting = self._waiting.get(key)
+            promoted = None
+            if waiting:
+                promoted = waiting.popleft()
+                active.append(promoted[0])
+            if not active and not waiting:
+                self._active.pop(key, None)
+                self._waiting.pop(key, None)
+
+        if promoted:
+            # Called from the finishing run's worker; a full executor queue must not stall it
+            logger.info(f"[CONCURRENCY] {key}: starting held run {promoted[0]}")
+            threading.Thread(target=self._start_held, args=(key, *promoted), daemon=True).start()
+
+    def _start_held(self, key, uid, start):
+        try:
+            self._start(key, uid, lambda: start(block=True))
+        except Exception as e:
+            logger.error(f"[CONCURRENCY] {key}: failed to start held run {uid}: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                key: {"active": list(self._active.get(key, [])), "waiting": [uid for uid, _ in self._waiting.get(key, [])]}
+                for key in set(self._active) | set(self._waiting)
+            }
+
+
+# Singleton
+concurrency_manager = ConcurrencyManager()
@@ -1,20 +1,119 @@
 # context_manager.py
 
+import threading
+from commons.logs import get_logger
+
+logger = get_logger(__name__)
+
+
 class ContextManager:
+    """
+    Run context kept as copy-on-write versions. A write never changes the
+    current dict: it installs a new one that shares every unchanged value
+    with the previous version. snapshot() (and get_all()) is therefore O(1)
+    and returns a version that nothing modifies afterwards, so the lifetime
+    writer, approvals and the UI can read it while the run moves on.
+
+    Values are shared between versions: replace nested dicts and lists
+    instead of mutating them (set_in() / pop_in() do that for one level).
+
+    Writes also wake wait_for() / wait_until() callers and notify
+    subscribers, so nothing needs to poll the context for a key to appear.
+    """
+
     def __init__(self):
         self._context = {}
+        self._version = 0
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self._subscribers = []  # (keys or None, callback)
+
+    def _install(self, changes):
+        with self._lock:
+            subscribers = self._swap(changes)
+        self._notify(subscribers, changes)
+
+    def _swap(self, changes):
+        """Install the next version (caller holds the lock); returns the subscribers to notify once it is released."""
+        context = dict(self._context)
+        context.update(changes)
+        self._context = context
+        self._version += 1
+        self._changed.notify_all()
+        return list(self._subscribers)
+
+    @staticmethod
+    def _notify(subscribers, changes):
+        # Outside the lock: a callback may read or write the context itself
+        for keys, callback in subscribers:
+            for key, value in changes.items():
+                if keys is None or key in keys:
+                    try:
+                        callback(key, value)
+                    except Exception as e:
+                        logger.exception(f"[CONTEXT] Subscriber failed on '{key}': {e}")
 
     def set(self, key, value):
-        self._context[key] = value
+        self._install({key: value})
 
     def get(self, key, default=None):
         return self._context.get(key, default)
 
     def get_all(self):
+        """The current version; treat it as read-only."""
         return self._context
 
+    def snapshot(self):
+        """Immutable view of the context as of now (the current version, not a copy)."""
+        return self._context
+
+    @property
+    def version(self):
+        return self._version
+
     def update(self, new_data: dict):
-        self._context.update(new_data)
+        self._install(new_data)
+
+    def set_in(self, key, subkey, value):
+        """context[key][subkey] = value, on a copy of the nested dict."""
+        with self._lock:
+            nested = dict(self._context.get(key) or {})
+            nested[subkey] = value
+            subscribers = self._swap({key: nested})
+        self._notify(subscribers, {key: nested})
+
+    def pop_in(self, key, subkey, default=None):
+        """Remove and return context[key][subkey], on a copy of the nested dict."""
+        with self._lock:
+            nested = dict(self._context.get(key) or {})
+            value = nested.pop(subkey, default)
+            subscribers = self._swap({key: nested})
+        self._notify(subscribers, {key: nested})
+        return value
+
+    def wait_until(self, predicate, timeout=None):
+        """Block until predicate(context) holds for the current version; False if `timeout` seconds pass first."""
+        with self._changed:
+            return self._changed.wait_for(lambda: predicate(self._context), timeout)
+
+    def wait_for(self, keys, timeout=None):
+        """Block until every key in `keys` is set; False if `timeout` seconds pass first."""
+        return self.wait_until(lambda context: all(key in context for key in keys), timeout)
+
+    def subscribe(self, callback, keys=None):
+        """
+        callback(key, value) after every write of `keys` (all keys if None),
+        on the writing thread. Returns a function that unsubscribes.
+        """
+        entry = (set(keys) if keys is not None else None, callback)
+        with self._lock:
+            self._subscribers.append(entry)
+
+        def unsubscribe():
+            with self._lock:
+                if entry in self._subscribers:
+                    self._subscribers.remove(entry)
+        return unsubscribe
 
     def __contains__(self, key):
         return key in self._context
@@ -23,4 +122,4 @@ class ContextManager:
         return self._context[key]
 
     def __setitem__(self, key, value):
-        self._context[key] = value
+        self.set(key, value)
@@ -0,0 +1,177 @@
+# engine/utils/cron_scheduler.py
+
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from croniter import croniter
+from engine.utils.timer_service import timer_service
+from engine.utils.run_executor import submit_workflow, RunQueueFull, RunDropped
+from commons.logs import get_logger
+from commons.get_config import get_config
+
+logger = get_logger(__name__)
+config = get_config()
+
+CRON_STATE_PATH = os.path.join(config["directories"]["lifetimes"], "cron_state.json")
+CATCHUP_POLICIES = ["none", "last", "all"]
+MAX_CATCHUP_RUNS = 100
+
+
+def jitter_offset(wf_id, jitter_seconds):
+    """Stable per-workflow start offset in [0, jitter_seconds), so the spread survives restarts."""
+    if not jitter_seconds:
+        return 0.0
+    digest = int(hashlib.md5(wf_id.encode()).hexdigest(), 16)
+    return (digest % int(jitter_seconds * 1000)) / 1000.0
+
+
+class CronScheduler:
+    """
+    Fires `scheduled` triggers. Each trigger keeps exactly one pending timer
+    on the timer service for its next slot (plus its jitter offset), so
+    nothing wakes up between due times. Due runs go straight to
+    submit_workflow(); the last slot fired per workflow is persisted so runs
+    missed while the engine was down are replayed per the trigger's `catchup`.
+    """
+
+    def __init__(self, state_path=CRON_STATE_PATH):
+        self.state_path = state_path
+        self._entries = {}  # wf_id → {"cron", "catchup", "jitter", "workflow_dict", "approval_manager", "next_slot"}
+        self._last_run = self._load_state()
+        self._lock = threading.Lock()
+        self._fired = 0
+        timer_service.register("cron", self._on_timer)
+
+    def register(self, wf_id, workflow_dict, trigger, approval_manager):
+        cron_expr = trigger["cron"]
+        if not croniter.is_valid(cron_expr):
+            raise ValueError(f"Invalid cron expression '{cron_expr}'")
+        catchup = trigger.get("catchup", "none")
+        if catchup not in CATCHUP_POLICIES:
+            raise ValueError(f"Unsupported catchup policy '{catchup}'. Must be one of {CATCHUP_POLICIES}")
+
+        entry = {
+            "cron": cron_expr,
+            "catchup": catchup,
+            "jitter": float(trigger.get("jitter_seconds", 0)),
+            "workflow_dict": workflow_dict,
+            "approval_manager": approval_manager
+        }
+        now = datetime.utcnow()
+        with self._lock:
+            self._entries[wf_id] = entry
+            last_run = self._last_run.get(wf_id)
+
+        for slot in self._missed_slots(entry, last_run, now):
+            logger.info(f"[SCHED] Catching up missed run of {wf_id} due {slot.isoformat()} (catchup={catchup})")
+            self._dispatch(wf_id, entry, slot)
+        if last_run is None:
+            # First sighting: nothing counts as missed before now
+            self._record(wf_id, now)
+
+        self._arm(wf_id, entry, croniter(cron_expr, now).get_next(datetime))
+        logger.info(f"[SCHED] Registered scheduled trigger for {wf_id} with cron: {cron_expr}")
+
+    def unregister(self, wf_id):
+        with self._lock:
+            self._entries.pop(wf_id, None)
+        timer_service.cancel(self._timer_id(wf_id))
+
+    def _missed_slots(self, entry, last_run, now):
+        if entry["catchup"] == "none" or last_run is None:
+            return []
+        slots = []
+        it = croniter(entry["cron"], datetime.fromisoformat(last_run))
+        slot = it.get_next(datetime)
+        while slot <= now:
+            slots.append(slot)
+            if len(slots) > MAX_CATCHUP_RUNS:
+                slots.pop(0)
+            slot = it.get_next(datetime)
+        if entry["catchup"] == "last":
+            return slots[-1:]
+        return slots
+
+    @staticmethod
+    def _timer_id(wf_id):
+        return f"cron:{wf_id}"
+
+    def _arm(self, wf_id, entry, slot):
+        entry["next_slot"] = slot
+        due = slot + timedelta(seconds=jitter_offset(wf_id, entry["jitter"]))
+        timer_service.schedule(self._timer_id(wf_id), due, "cron", {"wf_id": wf_id, "slot": slot.isoformat()})
+
+    def _on_timer(self, payload):
+        wf_id = payload["wf_id"]
+        with self._lock:
+            entry = self._entries.get(wf_id)
+        if entry is None or entry.get("next_slot") != datetime.fromisoformat(payload["slot"]):
+            # Left over from a trigger that was removed or re-registered
+            return
+        slot = entry["next_slot"]
+        self._dispatch(wf_id, entry, slot)
+        self._arm(wf_id, entry, croniter(entry["cron"], slot).get_next(datetime))
+
+    def _dispatch(self, wf_id, entry, slot):
+        payload = {"payload": {"mode": "scheduled", "scheduled_for": slot.isoformat()}}
+        args = (entry["workflow_dict"], payload, entry["approval_manager"])
+        self._fired += 1
+        self._record(wf_id, slot)
+        try:
+            uid = submit_workflow(*args)
+            logger.info(f"[SCHED] Triggered {wf_id} for {slot.isoformat()} as run {uid}")
+        except RunDropped as e:
+            logger.info(f"[SCHED] {wf_id}: {e}")
+        except RunQueueFull:
+            # The timer thread must not block; wait for queue room on a side thread
+            logger.warning(f"[SCHED] Run queue full; {wf_id} waits for a free slot")
+            threading.Thread(target=self._submit_blocking, args=(wf_id, args), daemon=True).start()
+        except Exception as e:
+            logger.exception(f"[SCHED] Error triggering {wf_id}: {e}")
+
+    @staticmethod
+    def _submit_blocking(wf_id, args):
+        try:
+            submit_workflow(*args, block=True)
+        except RunDropped as e:
+            logger.info(f"[SCHED] {wf_id}: {e}")
+        except Exception as e:
+            logger.exception(f"[SCHED] Error triggering {wf_id}: {e}")
+
+    def _load_state(self):
+        if not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"[SCHED] Ignoring unreadable cron state {self.state_path}: {e}")
+            return {}
+
+    def _record(self, wf_id, slot):
+        with self._lock:
+            self._last_run[wf_id] = slot.isoformat()
+            tmp_path = f"{self.state_path}.tmp"
+            try:
+                with open(tmp_path, "w") as f:
+                    json.dump(self._last_run, f)
+                os.replace(tmp_path, self.state_path)
+            except Exception as e:
+                logger.error(f"[SCHED] Failed to persist cron state: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "triggers": len(self._entries),
+                "fired": self._fired,
+                "next": {
+                    wf_id: entry["next_slot"].isoformat()
+                    for wf_id, entry in self._entries.items() if entry.get("next_slot")
+                }
+            }
+
+
+# Singleton
+cron_scheduler = CronScheduler()
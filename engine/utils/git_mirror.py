@@ -0,0 +1,135 @@
+# engine/utils/git_mirror.py
+
+import os
+import time
+import hashlib
+import threading
+from git import Repo, GitCommandError
+from git.cmd import Git
+from commons.logs import get_logger
+from commons.get_config import get_config
+
+logger = get_logger(__name__)
+config = get_config()
+
+MIRRORS_DIR = os.path.join(config["directories"]["workdir"], "git-mirrors")
+LS_REMOTE_TTL_SECONDS = float(config.get("engine", {}).get("git_ls_remote_ttl_seconds", 15))
+
+
+class GitMirror:
+    """
+    Bare mirror of one remote repository. Fetched only when the watched
+    branch head has moved, and read with rev-parse, never checked out.
+    """
+
+    def __init__(self, url, path):
+        self.url = url
+        self.path = path
+        self.lock = threading.Lock()
+        self._repo = None
+        self._hashes = {}  # (sha, paths) → combined object-id hash, for the latest head only
+        self.fetches = 0
+
+    @property
+    def repo(self):
+        if self._repo is None and os.path.isdir(self.path):
+            self._repo = Repo(self.path)
+        return self._repo
+
+    def has_commit(self, sha):
+        try:
+            return self.repo is not None and self.repo.git.cat_file("-t", sha) == "commit"
+        except GitCommandError:
+            return False
+
+    def sync(self, auth_url, sha):
+        """Make sure `sha` is present locally: clone once, then incremental fetches only."""
+        if self.has_commit(sha):
+            return
+        if self.repo is None:
+            logger.info(f"[GIT-MIRROR] Cloning bare mirror of {self.url}")
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._repo = Repo.clone_from(auth_url, self.path, bare=True, no_checkout=True)
+            # Keep credentials out of the mirror's config; fetches pass the auth URL explicitly
+            self._repo.git.remote("set-url", "origin", self.url)
+        else:
+            logger.info(f"[GIT-MIRROR] Fetching {self.url} (head moved to {sha[:12]})")
+            self.repo.git.fetch(auth_url, "+refs/heads/*:refs/heads/*", "--prune")
+        self.fetches += 1
+
+    def paths_hash(self, sha, paths):
+        """Combined hash of the tree/blob ids of `paths` at commit `sha`; a missing path counts as absent."""
+        key = (sha, tuple(sorted(paths)))
+        if key not in self._hashes:
+            if any(cached_sha != sha for cached_sha, _ in self._hashes):
+                self._hashes.clear()
+            digest = hashlib.md5()
+            for path in key[1]:
+                try:
+                    object_id = self.repo.git.rev_parse(f"{sha}:{path.strip('/')}")
+                except GitCommandError:
+                    object_id = "-"
+                digest.update(f"{path}\0{object_id}\n".encode())
+            self._hashes[key] = digest.hexdigest()
+        return self._hashes[key]
+
+
+class GitMirrorCache:
+    """
+    One bare mirror per repository URL, shared by every gitops trigger that
+    watches it. Branch heads come from `git ls-remote`, cached for
+    LS_REMOTE_TTL_SECONDS so triggers polling the same repo share one call.
+    """
+
+    def __init__(self, base_dir=MIRRORS_DIR, ls_remote_ttl=LS_REMOTE_TTL_SECONDS):
+        self.base_dir = base_dir
+        self.ls_remote_ttl = ls_remote_ttl
+        self._mirrors = {}
+        self._heads = {}  # (url, branch) → (sha, fetched_at)
+        self._lock = threading.Lock()
+        self.ls_remote_calls = 0
+
+    def mirror(self, url):
+        with self._lock:
+            if url not in self._mirrors:
+                name = hashlib.sha1(url.encode()).hexdigest()[:16]
+                self._mirrors[url] = GitMirror(url, os.path.join(self.base_dir, f"{name}.git"))
+            return self._mirrors[url]
+
+    def remote_head(self, url, auth_url, branch):
+        key = (url, branch)
+        cached = self._heads.get(key)
+        if cached and time.monotonic() - cached[1] < self.ls_remote_ttl:
+            return cached[0]
+        output = Git().ls_remote(auth_url, f"refs/heads/{branch}")
+        self.ls_remote_calls += 1
+        if not output:
+            raise ValueError(f"Branch '{branch}' not found in {url}")
+        sha = output.split()[0]
+        self._heads[key] = (sha, time.monotonic())
+        return sha
+
+    def watched_hash(self, url, branch, paths, auth_url=None):
+        """
+        Hash of the watched `paths` at the head of `branch`. Costs one
+        (shared, cached) ls-remote while the head is unchanged, and an
+        incremental fetch when it moves.
+        """
+        auth_url = auth_url or url
+        sha = self.remote_head(url, auth_url, branch)
+        mirror = self.mirror(url)
+        with mirror.lock:
+            mirror.sync(auth_url, sha)
+            return mirror.paths_hash(sha, paths)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "mirrors": len(self._mirrors),
+                "ls_remote_calls": self.ls_remote_calls,
+                "fetches": sum(m.fetches for m in self._mirrors.values())
+            }
+
+
+# Singleton
+git_mirrors = GitMirrorCache()
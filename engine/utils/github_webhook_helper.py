@@ -10,9 +10,9 @@ def extract_repo_slug(url: str) -> str:
     parsed = urlparse(url)
     return parsed.path.strip("/").replace(".git", "")
 
-def install_webhook(repo_url, token, sawe_url, repo_name, workflow_name):
+def install_webhook(repo_url, token, sawe_url):
     slug = extract_repo_slug(repo_url)
-    webhook_url = f"{sawe_url}/api/{repo_name}/{workflow_name}"
+    webhook_url = f"{sawe_url}/api/gitops/push"
     api_url = f"https://api.github.com/repos/{slug}/hooks"
 
     headers = {
@@ -3,6 +3,7 @@
 import ast
 from jinja2 import Template
 
+from engine.state.artifact_store import ArtifactRef
 from commons.logs import get_logger
 logger = get_logger(__name__)
 
@@ -29,6 +30,8 @@ def extract_json_path(data, path):
         return None
 
 def evaluate_operator(operator, actual, expected):
+    if isinstance(actual, ArtifactRef):
+        actual = str(actual)
     try:
         if operator == "equals":
             return actual == expected
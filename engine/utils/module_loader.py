@@ -1,6 +1,9 @@
 # module_loader.py
 import importlib.util
+import hashlib
 import os
+import threading
+from datetime import datetime
 from commons.get_config import get_config
 from commons.logs import get_logger
 logger = get_logger(__name__)
@@ -8,16 +11,92 @@ logger = get_logger(__name__)
 config = get_config()
 MODULES_BASE = config["directories"]["modules"]
 
+
+def _file_digest(path):
+    hash_sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            hash_sha.update(chunk)
+    return hash_sha.hexdigest()
+
+
+class ModuleRegistry:
+    """
+    Process-wide registry of module classes.
+    Each modules/<name>/<class>.py is imported once and re-imported only when
+    the file's mtime changes and its content hash no longer matches.
+    """
+
+    def __init__(self):
+        self._entries = {}  # mod_path → {"cls", "mtime", "sha256", ...}
+        self._lock = threading.RLock()
+        self.generation = 0
+
+    def load_class(self, module_name, class_name, modules_base_path=MODULES_BASE):
+        mod_path = os.path.join(modules_base_path, module_name, f"{class_name.lower()}.py")
+        mtime = os.stat(mod_path).st_mtime
+
+        entry = self._entries.get(mod_path)
+        if entry and entry["mtime"] == mtime and entry["class_name"] == class_name:
+            return entry["cls"]
+
+        with self._lock:
+            entry = self._entries.get(mod_path)
+            if entry and entry["mtime"] == mtime and entry["class_name"] == class_name:
+                return entry["cls"]
+
+            digest = _file_digest(mod_path)
+            if entry and entry["sha256"] == digest and entry["class_name"] == class_name:
+                # Touched but unchanged — keep the already imported class
+                entry["mtime"] = mtime
+                return entry["cls"]
+
+            logger.debug(f"Importing class {class_name} from {mod_path}")
+            spec = importlib.util.spec_from_file_location(class_name, mod_path)
+            mod = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(mod)
+            cls = getattr(mod, class_name)
+
+            self._entries[mod_path] = {
+                "module": module_name,
+                "class_name": class_name,
+                "cls": cls,
+                "path": mod_path,
+                "mtime": mtime,
+                "sha256": digest,
+                "loaded_at": datetime.utcnow().isoformat(),
+                "generation": self.generation
+            }
+            logger.info(f"[MODULES] Loaded {module_name}.{class_name} ({digest[:12]})")
+            return cls
+
+    def invalidate(self, module_name=None):
+        """Drop cached classes (all, or those of one module) so the next load re-imports."""
+        with self._lock:
+            if module_name is None:
+                self._entries = {}
+            else:
+                self._entries = {p: e for p, e in self._entries.items() if e["module"] != module_name}
+            self.generation += 1
+        logger.info(f"[MODULES] Registry invalidated ({module_name or 'all modules'}), generation {self.generation}")
+
+    def list_loaded(self):
+        with self._lock:
+            return [
+                {k: v for k, v in entry.items() if k != "cls"}
+                for entry in sorted(self._entries.values(), key=lambda e: e["path"])
+            ]
+
+
+# Singleton
+module_registry = ModuleRegistry()
+
+
 def load_class(module_name, class_name):
     logger.debug(f"Loading class {class_name} from module {module_name}")
-    # Check if the module exists
+    mod_path = os.path.join(MODULES_BASE, module_name, f"{class_name.lower()}.py")
     try:
-        mod_path = os.path.join(MODULES_BASE, module_name, f"{class_name.lower()}.py")
-        spec = importlib.util.spec_from_file_location(class_name, mod_path)
-        mod = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(mod)
-        cls = getattr(mod, class_name)
-        return cls
+        return module_registry.load_class(module_name, class_name)
     except FileNotFoundError:
         logger.error(f"Module {mod_path} not found.")
         raise
@@ -27,5 +106,3 @@ def load_class(module_name, class_name):
     except Exception as e:
         logger.error(f"Error loading class {class_name} from module {mod_path}: {e}")
         raise
-    finally:
-        logger.debug(f"Class {class_name} loaded successfully from module {module_name}")
@@ -0,0 +1,219 @@
+# engine/utils/parking.py
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from engine.state.lifetime_manager import lifetime_manager
+from engine.utils.timer_service import timer_service
+from commons.logs import get_logger
+from commons.get_config import get_config
+
+logger = get_logger(__name__)
+config = get_config()
+
+DEFAULT_RESUME_WORKERS = 4
+RESUME_WORKERS = int(config.get("engine", {}).get("resume_workers", DEFAULT_RESUME_WORKERS))
+
+_local = threading.local()
+
+
+class RunParked(Exception):
+    """
+    Raised by a step that has to wait for something outside the engine
+    (approval click, form submit, agent input). The engine persists the run
+    at that step and releases its thread; ParkingLot.resolve() re-enqueues it.
+    """
+
+    def __init__(self, step_id, reason, detail=None):
+        super().__init__(f"Run parked at step '{step_id}' ({reason})")
+        self.step_id = step_id
+        self.reason = reason
+        self.detail = detail or {}
+
+
+def wake_timer_id(uid, step_id):
+    """Timer that resumes a run parked with `wake_at` in its detail."""
+    return f"wake:{uid}:{step_id}"
+
+
+def parkable():
+    """True on a run's main step thread, where raising RunParked is allowed.
+    Steps running inside parallel groups, foreach items or DAG workers must block instead."""
+    return getattr(_local, "enabled", False)
+
+
+@contextmanager
+def parking_enabled():
+    _local.enabled = True
+    try:
+        yield
+    finally:
+        _local.enabled = False
+
+
+def current_step_id():
+    """Id of the step executing on this thread, set by the engine's dispatcher; modules key per-step state by it."""
+    return getattr(_local, "step_id", None)
+
+
+@contextmanager
+def executing_step(step_id):
+    previous = getattr(_local, "step_id", None)
+    _local.step_id = step_id
+    try:
+        yield
+    finally:
+        _local.step_id = previous
+
+
+class ParkingLot:
+    """
+    Index of parked runs: uid → the step they wait on. Parked runs hold no
+    thread and no engine; their state lives in the lifetime file under
+    `parked`. A resolution is written to that lifetime before the run is
+    handed back to `resume_handler(lifetime_map, interactive)`, where
+    `interactive` tells whether a person resolved it. Runs parked with a
+    `wake_at` are also resolved by the timer service when it falls due;
+    those resumes (lifetime load, flush, engine rebuild) run on a small
+    resume pool, so the timer thread only hands them off.
+    """
+
+    def __init__(self, resume_workers=RESUME_WORKERS):
+        self._entries = {}  # uid → {"step_id", "reason", "state": expected|parked, "result"?}
+        self._lock = threading.Lock()
+        self.resume_handler = None
+        self.resume_workers = max(int(resume_workers), 1)
+        self._resumer = None  # created on the first timer resume
+        self._handed_off = 0
+
+    def expect(self, uid, step_id, reason):
+        """Announce a wait before its link goes out, so a resolution that beats park() is kept."""
+        with self._lock:
+            self._entries[uid] = {"step_id": step_id, "reason": reason, "state": "expected"}
+
+    def park(self, uid, step_id, reason, wake_at=None):
+        """Mark a run as parked (its lifetime is already flushed). Resumes at once if it was resolved meanwhile."""
+        with self._lock:
+            entry = self._entries.get(uid)
+            if entry and entry["step_id"] == step_id and "result" in entry:
+                self._entries.pop(uid)
+                early = entry
+            else:
+                self._entries[uid] = {"step_id": step_id, "reason": reason, "state": "parked"}
+                early = None
+        logger.info(f"[PARKING] Run {uid} parked at '{step_id}' ({reason})")
+        if early:
+            self._resume(uid, step_id, early["result"], early.get("context_updates"), early["interactive"])
+        elif wake_at:
+            timer_service.schedule(wake_timer_id(uid, step_id), wake_at, "wake", {"uid": uid, "step_id": step_id})
+
+    def discard(self, uid, step_id):
+        """Forget an expected wait whose step failed before parking."""
+        with self._lock:
+            entry = self._entries.get(uid)
+            if entry and entry["step_id"] == step_id and entry["state"] == "expected":
+                self._entries.pop(uid)
+
+    def restore(self, lifetime_map):
+        """Re-index a run found parked in its lifetime at boot. Returns False if it is not parked."""
+        parked = lifetime_map.get("parked")
+        if not parked or "result" in parked:
+            return False
+        with self._lock:
+            self._entries[lifetime_map["uid"]] = {"step_id": parked["step_id"], "reason": parked["reason"], "state": "parked"}
+        wake_at = (parked.get("detail") or {}).get("wake_at")
+        if wake_at:
+            # Keeps the persisted timer; re-arms one that fired before this run was re-indexed
+            timer_service.schedule(wake_timer_id(lifetime_map["uid"], parked["step_id"]), wake_at, "wake",
+                                   {"uid": lifetime_map["uid"], "step_id": parked["step_id"]}, replace=False)
+        logger.info(f"[PARKING] Restored parked run {lifetime_map['uid']} at '{parked['step_id']}'")
+        return True
+
+    def is_parked(self, uid, step_id=None):
+        entry = self._entries.get(uid)
+        return bool(entry) and (step_id is None or entry["step_id"] == step_id)
+
+    def resolve(self, uid, step_id, result, context_updates=None, interactive=True):
+        """
+        Deliver the outcome a parked step waits for. `interactive` is False
+        when a timer rather than a person resolves it. Returns False when
+        nothing waits on (uid, step_id).
+        """
+        with self._lock:
+            entry = self._entries.get(uid)
+            if not entry or entry["step_id"] != step_id or "result" in entry:
+                return False
+            if entry["state"] == "expected":
+                # The run has not finished parking yet; park() picks this up
+                entry["result"] = result
+                entry["context_updates"] = context_updates
+                entry["interactive"] = interactive
+                logger.info(f"[PARKING] Early resolution for {uid}/{step_id}")
+                return True
+            self._entries.pop(uid)
+
+        timer_service.cancel(wake_timer_id(uid, step_id))
+        if interactive:
+            self._resume(uid, step_id, result, context_updates, interactive)
+        else:
+            self._hand_off(uid, step_id, result, context_updates)
+        return True
+
+    def cancel(self, uid):
+        """Resume a parked run so it can act on a cancel command. Returns False if it is not parked."""
+        entry = self._entries.get(uid)
+        if not entry:
+            return False
+        logger.info(f"[PARKING] Waking run {uid} at '{entry['step_id']}' to cancel it")
+        return self.resolve(uid, entry["step_id"], {"status": "cancelled"})
+
+    def _hand_off(self, uid, step_id, result, context_updates):
+        """Resume on the resume pool; called from timer handlers, which must not block the timer thread."""
+        with self._lock:
+            if self._resumer is None:
+                self._resumer = ThreadPoolExecutor(max_workers=self.resume_workers, thread_name_prefix="parking-resume")
+            self._handed_off += 1
+
+        def resume():
+            try:
+                self._resume(uid, step_id, result, context_updates, interactive=False)
+            except Exception as e:
+                logger.exception(f"[PARKING] Failed to resume run {uid} at '{step_id}': {e}")
+            finally:
+                with self._lock:
+                    self._handed_off -= 1
+
+        self._resumer.submit(resume)
+
+    def _resume(self, uid, step_id, result, context_updates=None, interactive=True):
+        lifetime_map = lifetime_manager.load(uid)
+        if not lifetime_map or (lifetime_map.get("parked") or {}).get("step_id") != step_id:
+            logger.error(f"[PARKING] Lifetime of {uid} is not parked at '{step_id}'; dropping resolution")
+            return
+        lifetime_map["parked"]["result"] = result
+        lifetime_map["parked"]["resolved_at"] = datetime.utcnow().isoformat()
+        if context_updates:
+            lifetime_map.setdefault("context", {}).update(context_updates)
+        lifetime_manager.update(uid, lifetime_map)
+        lifetime_manager.flush(uid)
+
+        logger.info(f"[PARKING] Resuming run {uid} at '{step_id}'")
+        if self.resume_handler is None:
+            logger.error(f"[PARKING] No resume handler registered; run {uid} stays parked until restart")
+            return
+        self.resume_handler(lifetime_map, interactive)
+
+    def stats(self):
+        with self._lock:
+            by_reason = {}
+            for entry in self._entries.values():
+                if entry["state"] == "parked":
+                    by_reason[entry["reason"]] = by_reason.get(entry["reason"], 0) + 1
+            return {"parked": sum(by_reason.values()), "by_reason": by_reason, "resumes_pending": self._handed_off}
+
+
+# Singleton
+parking_lot = ParkingLot()
+
+timer_service.register("wake", lambda payload: parking_lot.resolve(payload["uid"], payload["step_id"], {"status": "woken"}, interactive=False))
@@ -0,0 +1,77 @@
+# engine/utils/push_index.py
+
+import threading
+from fnmatch import fnmatch
+from engine.utils.github_webhook_helper import extract_repo_slug
+from commons.logs import get_logger
+
+logger = get_logger(__name__)
+
+
+def path_matches(path, pattern):
+    """A watched `files` path matches itself, anything below it, or anything its glob covers."""
+    pattern = pattern.strip("/")
+    return path == pattern or path.startswith(pattern + "/") or fnmatch(path, pattern)
+
+
+class PushIndex:
+    """
+    (repo slug, branch) → gitops webhook workflows and the path globs they
+    watch. A push event is matched against it so only the workflows whose
+    `files` were touched are dispatched, without cloning anything.
+    """
+
+    def __init__(self):
+        self._index = {}  # (slug, branch) → {wf_id: {"paths", "workflow_dict", "approval_manager"}}
+        self._lock = threading.Lock()
+
+    def add(self, wf_id, workflow_dict, trigger, approval_manager):
+        key = (extract_repo_slug(trigger["repo"]).lower(), trigger.get("branch", "main"))
+        paths = [f.get("path") for f in trigger.get("files", []) if f.get("path")]
+        with self._lock:
+            self._remove(wf_id)
+            self._index.setdefault(key, {})[wf_id] = {
+                "paths": paths,
+                "workflow_dict": workflow_dict,
+                "approval_manager": approval_manager
+            }
+        logger.info(f"[GITOPS] Indexed push trigger {wf_id} on {key[0]}@{key[1]} ({len(paths) or 'all'} paths)")
+
+    def remove(self, wf_id):
+        with self._lock:
+            self._remove(wf_id)
+
+    def _remove(self, wf_id):
+        for key in [k for k, entries in self._index.items() if wf_id in entries]:
+            self._index[key].pop(wf_id)
+            if not self._index[key]:
+                self._index.pop(key)
+
+    def match(self, slug, branch, changed_paths):
+        """[(wf_id, entry)] of the workflows on slug@branch whose watched paths intersect `changed_paths`."""
+        with self._lock:
+            entries = list(self._index.get((slug.lower(), branch), {}).items())
+        return [
+            (wf_id, entry) for wf_id, entry in entries
+            if not entry["paths"] or any(path_matches(path, pattern) for path in changed_paths for pattern in entry["paths"])
+        ]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "repos": len(self._index),
+                "workflows": sum(len(entries) for entries in self._index.values())
+            }
+
+
+def changed_paths_of(push_event):
+    """Every path added, modified or removed by the commits of a GitHub push event."""
+    changed = set()
+    for commit in push_event.get("commits") or []:
+        for field in ("added", "modified", "removed"):
+            changed.update(commit.get(field) or [])
+    return changed
+
+
+# Singleton
+push_index = PushIndex()
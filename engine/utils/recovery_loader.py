@@ -1,10 +1,16 @@
 # recovery_loader.py
 
 import os
-import yaml
 import asyncio
+from datetime import datetime, timedelta
 from engine.we import WorkflowEngine
-import threading
+from engine.utils.run_executor import submit_engine, run_registry, resolve_lane
+from engine.utils.concurrency_manager import concurrency_manager
+from engine.utils.parking import parking_lot
+from engine.state.lifetime_manager import lifetime_manager
+from engine.state.definition_store import workflow_of
+from engine.state.artifact_store import revive_artifacts
+from engine.utils.workflow_compiler import compile_workflow
 from commons.logs import get_logger
 logger = get_logger(__name__)
 from commons.get_config import get_config
@@ -19,23 +25,65 @@ if not os.path.exists(LIFETIME_DIR):
 
 def discover_recoverable_runs():
     runs = []
-    for fname in os.listdir(LIFETIME_DIR):
-        if not fname.endswith(".yaml"):
-            continue
-        if fname.startswith("~") or fname in ["completed"]:
-            continue
-        full_path = os.path.join(LIFETIME_DIR, fname)
-        with open(full_path, "r") as f:
-            lifetime_map = yaml.safe_load(f)
+    for uid in lifetime_manager.list_active():
+        # Snapshot plus journal tail
+        lifetime_map = lifetime_manager.load(uid, completed=False)
+        if lifetime_map:
             runs.append(lifetime_map)
     return runs
 
-def resume_workflow_from_lifetime(lifetime_map, approval_manager):
+def restore_parked_run(lifetime_map, approval_manager):
+    """Re-index a parked run and re-open its approval route, without building an engine."""
+    from engine.we import approval_link_for
+
+    if not parking_lot.restore(lifetime_map):
+        return False
+    uid = lifetime_map["uid"]
+    step_id = lifetime_map["parked"]["step_id"]
+    workflow = workflow_of(lifetime_map)
+    run_registry.parked(uid, resolve_lane(workflow or {}))
+    if workflow and lifetime_map.get("concurrency_key"):
+        # Take back the slot it held before the restart, if still free; otherwise it waits for one on resume
+        concurrency_manager.readmit(lifetime_map["concurrency_key"], workflow.get("concurrency") or {}, uid)
+    step = compile_workflow(workflow).step_index.get(step_id) if workflow else None
+    if step and step.get("type") in ["approval", "webform"]:
+        timeout = min(int(step.get("timeout_minutes", 30)), 1440)
+        parked = lifetime_map["parked"]
+        # Keep the original deadline; parks written before it was recorded count from parked_at
+        expires_at = (parked.get("detail") or {}).get("expires_at") or \
+            (datetime.fromisoformat(parked["parked_at"]) + timedelta(minutes=timeout)).isoformat()
+        approval_manager.request_approval(
+            uid=uid,
+            step_id=step_id,
+            message=f"Recovered approval: {step_id}",
+            timeout_minutes=timeout,
+            approval_link=approval_link_for(uid, step),
+            expires_at=expires_at,
+            wait=False
+        )
+    return True
+
+def resume_workflow_from_lifetime(lifetime_map, approval_manager, block=False, priority=None):
     from engine.we import WorkflowEngine
 
-    workflow_dict = {"workflow": lifetime_map["workflow"]}
-    context = lifetime_map.get("context", {})
     uid = lifetime_map["uid"]
+    if lifetime_map.get("reason") == "completed":
+        # Finished but not yet archived when the process stopped: archive it, nothing to run
+        logger.info(f"[RECOVERY] Workflow {uid} already completed, archiving")
+        lifetime_manager.mark_complete(uid)
+        return
+
+    # Parked and still waiting: nothing to run until it is resolved
+    if restore_parked_run(lifetime_map, approval_manager):
+        return
+
+    # The exact definition the run started with, whatever the workflow file holds now
+    workflow = workflow_of(lifetime_map)
+    if workflow is None:
+        logger.error(f"[RECOVERY] Cannot resume {uid}: workflow definition {lifetime_map.get('workflow_hash')} is missing")
+        return
+    workflow_dict = {"workflow": workflow}
+    context = revive_artifacts(lifetime_map.get("context", {}))
     workflow_dict["uid"] = uid
 
     engine = WorkflowEngine(
@@ -44,22 +92,13 @@ def resume_workflow_from_lifetime(lifetime_map, approval_manager):
         payload={},
         modules_base_path=MODULES_BASE,
         skip_payload_parse=True,
-        injected_context=context
+        injected_context=context,
+        lifetime_map=lifetime_map
     )
-
-    engine.workflow_uid = uid
-    engine.lifetime_map = lifetime_map
     engine.context.update(context)
 
-
-    if lifetime_map.get("reason") == "completed":
-        logger.info(f"[RECOVERY] Workflow {uid} already completed, skipping")
-        engine._archive_completed_workflow()  # This should move it to `completed/`
-        return
-
     current_step = lifetime_map.get("current_step")
     if current_step:
         logger.info(f"[RECOVERY] Resuming workflow {uid} from step '{current_step}'")
-        engine.rehydrate_pending_approval(current_step)
 
-    threading.Thread(target=engine.run, daemon=True).start()
+    submit_engine(engine, block=block, priority=priority)
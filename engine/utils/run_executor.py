@@ -0,0 +1,422 @@
+# engine/utils/run_executor.py
+
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from engine.utils.concurrency_manager import concurrency_manager
+from engine.utils.parking import parking_lot
+from commons.logs import get_logger
+from commons.get_config import get_config
+
+logger = get_logger(__name__)
+config = get_config()
+
+MODULES_BASE = config["directories"]["modules"]
+EXECUTOR_CONFIG = config.get("engine", {}).get("executor", {}) or {}
+DEFAULT_WORKERS = 16
+DEFAULT_QUEUE_SIZE = 256
+DEFAULT_RETRY_AFTER_SECONDS = 5
+WAIT_SAMPLES = 256
+PRIORITY_LANES = ["interactive", "batch"]  # served in this order
+DEFAULT_LANE = "interactive"
+DEFAULT_LANES = {"interactive": {"reserved": 4}, "batch": {"reserved": 2}}
+BATCH_TRIGGER_TYPES = ["scheduled", "gitops"]
+
+
+class RunQueueFull(Exception):
+    """Raised when a run is submitted while the pending queue is at capacity."""
+
+    def __init__(self, depth, retry_after):
+        super().__init__(f"Run queue is full ({depth} pending)")
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+class RunDropped(Exception):
+    """Raised when a workflow's concurrency policy refuses a new run."""
+
+    def __init__(self, key):
+        super().__init__(f"Run dropped: concurrency key '{key}' is at its limit")
+        self.key = key
+
+
+class RunRegistry:
+    """
+    Live view of every run the executor knows about: held, queued, running
+    and parked runs (running ones with their engines), plus lifetime totals
+    of finished runs. A parked run stays registered until it resumes and
+    really ends; control commands sent to it meanwhile are applied once it
+    has an engine again.
+    """
+
+    def __init__(self):
+        self._runs = {}  # uid → {"state", "engine", "submitted_at", "started_at"}
+        self._lock = threading.Lock()
+        self._pending_commands = {}  # uid → [command, ...] for runs without an engine
+        self.totals = {"submitted": 0, "rejected": 0, "completed": 0, "failed": 0}
+
+    def held(self, uid):
+        """Accepted but waiting on its workflow's concurrency limit, outside the executor queue."""
+        with self._lock:
+            self._runs[uid] = {"state": "held", "engine": None, "submitted_at": time.time(), "started_at": None}
+
+    def discard(self, uid):
+        with self._lock:
+            self._runs.pop(uid, None)
+
+    def queued(self, uid, lane=None):
+        with self._lock:
+            previous = self._runs.get(uid)
+            if previous and previous["state"] == "parked":
+                # A resume, not a new submission
+                previous.update(state="queued", lane=lane)
+                return
+            self._runs[uid] = {"state": "queued", "lane": lane, "engine": None, "submitted_at": time.time(), "started_at": None}
+            self.totals["submitted"] += 1
+
+    def rejected(self, uid):
+        with self._lock:
+            run = self._runs.get(uid)
+            if run and run.get("parked_at"):
+                # A resume that did not fit the queue; the run is still parked
+                run["state"] = "parked"
+                return
+            self._runs.pop(uid, None)
+            self.totals["submitted"] -= 1
+            self.totals["rejected"] += 1
+
+    def parked(self, uid, lane=None):
+        """The run released its worker while waiting on something outside the engine."""
+        with self._lock:
+            run = self._runs.setdefault(uid, {"state": "parked", "lane": lane, "engine": None, "submitted_at": time.time(), "started_at": None})
+            run.update(state="parked", engine=None, parked_at=time.time())
+
+    def started(self, uid):
+        with self._lock:
+            run = self._runs.setdefault(uid, {"state": "queued", "engine": None, "submitted_at": time.time()})
+            run["state"] = "running"
+            run["started_at"] = time.time()
+
+    def attach(self, uid, engine):
+        with self._lock:
+            if uid in self._runs:
+                self._runs[uid]["engine"] = engine
+            commands = self._pending_commands.pop(uid, [])
+        for command in commands:
+            engine.control_channel.send(command)
+
+    def send(self, uid, command):
+        """
+        Send a control command to a run: at once if it is running, otherwise
+        as soon as its engine is attached. A parked run is woken to take a
+        cancel, so it ends and frees its concurrency slot. Returns False for
+        an unknown run.
+        """
+        with self._lock:
+            run = self._runs.get(uid)
+            if run is None:
+                return False
+            engine = run["engine"]
+            if engine is None:
+                self._pending_commands.setdefault(uid, []).append(command)
+            wake = run["state"] == "parked" and command.get("type") == "cancel"
+        if engine is not None:
+            engine.control_channel.send(command)
+        elif wake:
+            parking_lot.cancel(uid)
+        return True
+
+    def request_cancel(self, uid):
+        """Cancel a run through its control channel, or as soon as its engine is attached."""
+        self.send(uid, {"type": "cancel"})
+
+    def finished(self, uid, failed=False):
+        with self._lock:
+            self._runs.pop(uid, None)
+            self._pending_commands.pop(uid, None)
+            self.totals["failed" if failed else "completed"] += 1
+
+    def get_engine(self, uid):
+        run = self._runs.get(uid)
+        return run["engine"] if run else None
+
+    def state(self, uid):
+        run = self._runs.get(uid)
+        return run["state"] if run else None
+
+    def count(self, state=None):
+        with self._lock:
+            return sum(1 for run in self._runs.values() if state is None or run["state"] == state)
+
+    def list_runs(self):
+        with self._lock:
+            return [
+                {
+                    "uid": uid,
+                    "state": run["state"],
+                    "priority": run.get("lane"),
+                    "workflow": run["engine"].workflow.get("name") if run["engine"] else None,
+                    "submitted_at": datetime.utcfromtimestamp(run["submitted_at"]).isoformat(),
+                    "started_at": datetime.utcfromtimestamp(run["started_at"]).isoformat() if run["started_at"] else None
+                }
+                for uid, run in self._runs.items()
+            ]
+
+    def stats(self):
+        with self._lock:
+            counts = {"held": 0, "queued": 0, "running": 0, "parked": 0}
+            for run in self._runs.values():
+                counts[run["state"]] = counts.get(run["state"], 0) + 1
+            return {**counts, **self.totals}
+
+
+class RunExecutor:
+    """
+    Fixed pool of run workers fed by bounded per-lane pending queues.
+    Lanes are served in priority order (PRIORITY_LANES); each lane owns
+    `reserved` workers that only ever take its runs, and the remaining
+    shared workers take the highest-priority run waiting. Submissions beyond
+    a lane's queue capacity are rejected with RunQueueFull instead of
+    spawning more threads. Pausing stops workers from dequeuing new runs;
+    runs already executing are not affected.
+    """
+
+    def __init__(self, registry, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE,
+                 retry_after_seconds=DEFAULT_RETRY_AFTER_SECONDS, lanes=None):
+        self.registry = registry
+        self.workers = max(int(workers), 1)
+        self.queue_size = max(int(queue_size), 1)
+        self.retry_after_seconds = int(retry_after_seconds)
+
+        lanes = lanes or DEFAULT_LANES
+        self.reserved = {}
+        available = self.workers
+        for lane in PRIORITY_LANES:
+            self.reserved[lane] = min(max(int((lanes.get(lane) or {}).get("reserved", 0)), 0), available)
+            available -= self.reserved[lane]
+        self.shared = available
+
+        self._pending = {lane: deque() for lane in PRIORITY_LANES}  # lane → deque[(uid, target, queued_at)]
+        self._cond = threading.Condition()
+        self._paused = False
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._busy = {lane: 0 for lane in PRIORITY_LANES}
+        self._waits = {lane: deque(maxlen=WAIT_SAMPLES) for lane in PRIORITY_LANES}
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            assignments = [lane for lane in PRIORITY_LANES for _ in range(self.reserved[lane])]
+            assignments += [None] * self.shared
+            for i, lane in enumerate(assignments):
+                thread = threading.Thread(target=self._worker, args=(lane,), name=f"run-worker-{lane or 'shared'}-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            logger.info(f"[EXECUTOR] Started {self.workers} run workers (reserved {self.reserved}, shared {self.shared}, queue size {self.queue_size} per lane)")
+
+    def submit(self, uid, target, block=False, lane=DEFAULT_LANE):
+        """
+        Queue `target()` as run `uid` on `lane`; it returns "completed",
+        "failed" or "parked". Raises RunQueueFull when the lane is full and
+        `block` is False.
+        """
+        if lane not in self._pending:
+            raise ValueError(f"Unknown priority lane '{lane}'")
+        self._ensure_started()
+        self.registry.queued(uid, lane)
+        with self._cond:
+            while len(self._pending[lane]) >= self.queue_size:
+                if not block:
+                    self.registry.rejected(uid)
+                    logger.warning(f"[EXECUTOR] Rejected run {uid}: {lane} queue full ({self.queue_size} pending)")
+                    raise RunQueueFull(self.queue_size, self.retry_after_seconds)
+                self._cond.wait()
+            self._pending[lane].append((uid, target, time.time()))
+            depth = len(self._pending[lane])
+            self._cond.notify_all()
+        logger.info(f"[EXECUTOR] Queued run {uid} on {lane} lane (depth {depth})")
+        return uid
+
+    def _take(self, worker_lane):
+        """Next (lane, job) this worker may run, or None. Caller holds the condition."""
+        if self._paused:
+            return None
+        for lane in ([worker_lane] if worker_lane else PRIORITY_LANES):
+            if self._pending[lane]:
+                return lane, self._pending[lane].popleft()
+        return None
+
+    def _worker(self, worker_lane):
+        while True:
+            with self._cond:
+                taken = self._take(worker_lane)
+                while taken is None:
+                    self._cond.wait()
+                    taken = self._take(worker_lane)
+                lane, (uid, target, queued_at) = taken
+                self._busy[lane] += 1
+                self._cond.notify_all()  # room for blocked submitters
+
+            self._waits[lane].append(time.time() - queued_at)
+            self.registry.started(uid)
+            outcome = "failed"
+            try:
+                outcome = target()
+            except Exception as e:
+                logger.exception(f"[EXECUTOR] Run {uid} crashed: {e}")
+            finally:
+                with self._cond:
+                    self._busy[lane] -= 1
+                if outcome == "parked":
+                    self.registry.parked(uid, lane)
+                else:
+                    self.registry.finished(uid, failed=outcome == "failed")
+
+    def pause(self):
+        with self._cond:
+            self._paused = True
+        logger.info("[EXECUTOR] Paused; queued runs will wait")
+
+    def resume(self):
+        with self._cond:
+            self._paused = False
+            self._cond.notify_all()
+        logger.info("[EXECUTOR] Resumed")
+
+    @property
+    def paused(self):
+        return self._paused
+
+    def stats(self):
+        with self._cond:
+            lanes = {}
+            for lane in PRIORITY_LANES:
+                waits = list(self._waits[lane])
+                pending = self._pending[lane]
+                lanes[lane] = {
+                    "reserved_workers": self.reserved[lane],
+                    "busy_workers": self._busy[lane],
+                    "queue_depth": len(pending),
+                    "oldest_wait_seconds": round(time.time() - pending[0][2], 3) if pending else 0.0,
+                    "avg_wait_seconds": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                    "max_wait_seconds": round(max(waits), 3) if waits else 0.0
+                }
+            return {
+                "workers": self.workers,
+                "shared_workers": self.shared,
+                "busy_workers": sum(self._busy.values()),
+                "queue_depth": sum(len(p) for p in self._pending.values()),
+                "queue_size": self.queue_size,
+                "paused": self._paused,
+                "lanes": lanes
+            }
+
+
+def resolve_lane(workflow, override=None):
+    """Priority lane for a run: explicit override, then the workflow's `priority`, then its trigger type."""
+    for lane in [override, workflow.get("priority")]:
+        if lane:
+            if lane not in PRIORITY_LANES:
+                raise ValueError(f"Unknown priority '{lane}'. Must be one of {PRIORITY_LANES}")
+            return lane
+    trigger_type = (workflow.get("trigger") or {}).get("type")
+    return "batch" if trigger_type in BATCH_TRIGGER_TYPES else DEFAULT_LANE
+
+
+# Singletons
+run_registry = RunRegistry()
+run_executor = RunExecutor(
+    run_registry,
+    workers=EXECUTOR_CONFIG.get("workers", DEFAULT_WORKERS),
+    queue_size=EXECUTOR_CONFIG.get("queue_size", DEFAULT_QUEUE_SIZE),
+    retry_after_seconds=EXECUTOR_CONFIG.get("retry_after_seconds", DEFAULT_RETRY_AFTER_SECONDS),
+    lanes=EXECUTOR_CONFIG.get("lanes")
+)
+
+
+def run_outcome(engine):
+    """How engine.run() returned: "parked", "failed" or "completed"."""
+    if engine.parked:
+        return "parked"
+    return "failed" if engine.context.get("workflow_failed") else "completed"
+
+
+def _engine_target(uid, make_engine, key):
+    """Executor target running one engine. A run under a concurrency key frees its slot only when it really ends, not when it parks."""
+    def run():
+        outcome = "failed"
+        try:
+            engine = make_engine()
+            run_registry.attach(uid, engine)
+            engine.run()
+            outcome = run_outcome(engine)
+            return outcome
+        finally:
+            if key is not None and outcome != "parked":
+                concurrency_manager.release(key, uid)
+    return run
+
+
+def submit_workflow(workflow_dict, payload, approval_manager, modules_base_path=MODULES_BASE, block=False, priority=None):
+    """
+    Queue a new run of `workflow_dict` on the shared executor and return its uid.
+    Workflows with a `concurrency` block are admitted through the concurrency
+    manager first; raises RunDropped when its policy refuses the run.
+    `priority` overrides the lane chosen by resolve_lane().
+    """
+    workflow_dict = dict(workflow_dict)
+    uid = workflow_dict.setdefault("uid", str(uuid.uuid4()))
+    workflow = workflow_dict.get("workflow", {})
+    lane = resolve_lane(workflow, priority)
+    # Kept in the lifetime, so a run woken by a timer goes back to the lane it was submitted on
+    workflow_dict["lane"] = lane
+    key = concurrency_manager.key_for(workflow, payload)
+    if key is not None:
+        # Kept in the lifetime, so a resumed run is re-admitted under the same key
+        workflow_dict["concurrency_key"] = key
+
+    def make_engine():
+        from engine.we import WorkflowEngine
+        return WorkflowEngine(approval_manager, workflow_dict, payload, modules_base_path=modules_base_path)
+
+    run = _engine_target(uid, make_engine, key)
+    if key is None:
+        return run_executor.submit(uid, run, block=block, lane=lane)
+
+    def start(block=block):
+        run_executor.submit(uid, run, block=block, lane=lane)
+
+    run_registry.held(uid)
+    decision = concurrency_manager.admit(key, workflow["concurrency"], uid, start, run_registry.request_cancel, run_registry.discard)
+    if decision == "dropped":
+        run_registry.discard(uid)
+        raise RunDropped(key)
+    return uid
+
+
+def submit_engine(engine, block=False, priority=None):
+    """
+    Queue an already constructed engine (e.g. one rebuilt from its lifetime)
+    on the shared executor, on `priority` or else the lane it was first
+    submitted on. A run with a concurrency key goes back through
+    admission: it starts at once if it still holds its slot, otherwise it
+    waits for one like a new run.
+    """
+    uid = engine.workflow_uid
+    lane = resolve_lane(engine.workflow, priority or engine.lifetime_map.get("lane"))
+    key = engine.lifetime_map.get("concurrency_key")
+    run = _engine_target(uid, lambda: engine, key)
+    if key is None:
+        return run_executor.submit(uid, run, block=block, lane=lane)
+
+    def start(block=block):
+        run_executor.submit(uid, run, block=block, lane=lane)
+
+    concurrency_manager.readmit(key, engine.workflow.get("concurrency") or {}, uid, start)
+    return uid
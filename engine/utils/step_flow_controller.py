@@ -1,85 +1,74 @@
 # step_fllow_controller.py
 
-from jinja2 import Template
-from engine.utils.match_engine import evaluate_operator, extract_json_path, safe_eval_logic_expr
+from engine.utils.workflow_compiler import compile_workflow
 from commons.logs import get_logger
 logger = get_logger(__name__)
 
 
 class StepFlowController:
-    def __init__(self, workflow_dict, context):
-        logger.debug(f"[SFC] Initializing StepFlowController with workflow_dict: {workflow_dict}")
+    def __init__(self, workflow_dict, context, plan=None):
         self.workflow = workflow_dict
         self.context = context
-        self.steps = {step["id"]: step for step in self.workflow.get("steps", [])}
+        self.plan = plan or compile_workflow(workflow_dict)
+        self.steps = self.plan.steps
         self.execution_log = {}  # Tracks outputs and statuses
 
 
     def should_run_step(self, step_id):
-        step = self.steps.get(step_id)
-        if not step:
+        if step_id not in self.plan.step_index:
             raise ValueError(f"Step '{step_id}' not found")
 
-        terms_block = step.get("terms")
-
-        # No terms defined → default to True
-        if not terms_block:
+        # No terms defined (or no rules/logic) → default to True
+        terms = self.plan.terms.get(step_id)
+        if terms is None:
             return True
 
-        # Structured terms: expect 'rules' and 'logic'
-        if isinstance(terms_block, dict) and "rules" in terms_block and "logic" in terms_block:
-            rules = terms_block.get("rules", [])
-            logic = terms_block.get("logic", "")
-
-            if not rules or not logic:
-                return True
-
-            rule_results = {}
+        return terms.evaluate({"context": self.context.get_all(), "step_results": self.execution_log})
 
-            for rule in rules:
-                rid = rule["id"]
-                path = rule["path"]
-                operator = rule["operator"]
-                expected = rule.get("value")
 
-                actual = extract_json_path(
-                    {"context": self.context.get_all(), "step_results": self.execution_log},
-                    path
-                )
-                result = evaluate_operator(operator, actual, expected)
-                rule_results[rid] = result
 
-            # Replace ids with True/False in logic string
-            logic_expr = logic
-            for rid, val in rule_results.items():
-                logic_expr = logic_expr.replace(rid, str(val))
-
-            return safe_eval_logic_expr(logic_expr)
+    def should_run_item(self, step_id, scope):
+        """Per-item terms of a foreach step; `scope` adds the item variables to the lookup root."""
+        terms = self.plan.item_terms.get(step_id)
+        if terms is None:
+            return True
 
-        # Fallback: no terms/rules
-        return True
+        data = {"context": self.context.get_all(), "step_results": self.execution_log}
+        data.update(scope)
+        return terms.evaluate(data)
 
 
 
     def register_step_result(self, step_id, result):
         logger.info(f"[SFC] Step '{step_id}' result registered: {result}")
         self.execution_log[step_id] = result
-        # Set under context.step_results.<step_id>
-        all_results = self.context.get("step_results", {})
-        all_results[step_id] = result
-        self.context.set("step_results", all_results)
+        # Set under context.step_results.<step_id>; earlier context versions keep their own step_results
+        self.context.set_in("step_results", step_id, result)
 
 
     def get_next_step(self, current_step_id):
-        keys = list(self.steps.keys())
-        try:
-            current_index = keys.index(current_step_id)
-            next_step = keys[current_index + 1] if current_index + 1 < len(keys) else None
-            logger.info(f"[SFC] Next step after '{current_step_id}' is '{next_step}'")
-            return next_step
-        except ValueError:
+        if current_step_id not in self.plan.successors:
             logger.error(f"[SFC] Current step '{current_step_id}' not found in steps")
             return None
+        next_step = self.plan.next_step(current_step_id)
+        logger.info(f"[SFC] Next step after '{current_step_id}' is '{next_step}'")
+        return next_step
+
+
+    def ready_steps(self, completed, started):
+        """DAG mode: steps not yet started whose dependencies are all completed, in declaration order."""
+        return [
+            step_id for step_id in self.plan.step_order
+            if step_id not in started and all(dep in completed for dep in self.plan.dependencies[step_id])
+        ]
+
+
+    def newly_ready(self, step_id, completed, started):
+        """DAG mode: dependents of a just-completed step that became ready."""
+        return [
+            dependent for dependent in self.plan.dependents.get(step_id, ())
+            if dependent not in started and all(dep in completed for dep in self.plan.dependencies[dependent])
+        ]
 
 
     def get_step(self, step_id):
@@ -0,0 +1,90 @@
+# engine/utils/template_cache.py
+
+import threading
+from collections import OrderedDict
+from jinja2 import Environment, meta
+from engine.state.artifact_store import ArtifactRef, artifact_content_default
+from commons.logs import get_logger
+from commons.get_config import get_config
+
+logger = get_logger(__name__)
+config = get_config()
+
+DEFAULT_CACHE_SIZE = 2048
+
+
+class TemplateCache:
+    """
+    Engine-wide cache of compiled Jinja templates keyed by source text.
+    Templates are compiled once against a shared Environment and kept in a
+    bounded LRU, so repeated step inputs skip parsing entirely.
+    """
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE):
+        self.env = Environment()
+        # Spilled step outputs (ArtifactRef) behave as the strings they stand for
+        self.env.policies["json.dumps_kwargs"] = {"sort_keys": True, "default": artifact_content_default}
+        self.env.tests["string"] = lambda value: isinstance(value, (str, ArtifactRef))
+        self.max_size = max(int(max_size), 1)
+        self._templates = OrderedDict()  # (kind, source) → (compiled, undeclared variables)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, source, kind="template"):
+        key = (kind, source)
+        with self._lock:
+            entry = self._templates.get(key)
+            if entry is not None:
+                self._templates.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        # Compile outside the lock; a concurrent miss on the same source just compiles twice
+        if kind == "expression":
+            entry = (self.env.compile_expression(source), None)
+        else:
+            template = self.env.from_string(source)
+            variables = frozenset(meta.find_undeclared_variables(self.env.parse(source)))
+            entry = (template, variables)
+
+        with self._lock:
+            self.misses += 1
+            self._templates[key] = entry
+            self._templates.move_to_end(key)
+            while len(self._templates) > self.max_size:
+                self._templates.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def get(self, source):
+        return self._lookup(source)[0]
+
+    def render(self, source, **variables):
+        return self._lookup(source)[0].render(**variables)
+
+    def undeclared_variables(self, source):
+        return self._lookup(source)[1]
+
+    def evaluate(self, expression, **variables):
+        """Evaluate a bare Jinja expression (e.g. `context.items | list`) to a Python value."""
+        return self._lookup(expression, kind="expression")[0](**variables)
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._templates),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+
+# Singleton
+template_cache = TemplateCache(config.get("engine", {}).get("template_cache_size", DEFAULT_CACHE_SIZE))
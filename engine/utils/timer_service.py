@@ -0,0 +1,192 @@
+# engine/utils/timer_service.py
+
+import os
+import json
+import heapq
+import threading
+import time
+from datetime import datetime
+from commons.logs import get_logger
+from commons.get_config import get_config
+
+logger = get_logger(__name__)
+config = get_config()
+
+TIMER_INDEX_PATH = os.path.join(config["directories"]["lifetimes"], "timers.jsonl")
+COMPACT_MIN_RECORDS = 1000
+
+
+def to_epoch(when):
+    """Accept epoch seconds, a naive UTC datetime or an ISO-8601 string."""
+    if isinstance(when, (int, float)):
+        return float(when)
+    if isinstance(when, str):
+        when = datetime.fromisoformat(when)
+    if when.tzinfo is None:
+        return (when - datetime(1970, 1, 1)).total_seconds()
+    return when.timestamp()
+
+
+class TimerService:
+    """
+    One thread firing every delayed wakeup in the engine: approval expiry,
+    defer steps, poll backoffs. Timers sit in a min-heap keyed by due time
+    (O(log n) schedule, lazy O(1) cancel) and every change is appended to a
+    JSONL index, so pending timers are restored on boot. Handlers are
+    registered per timer kind and run on the timer thread, so they must hand
+    off real work rather than block.
+    """
+
+    def __init__(self, index_path=TIMER_INDEX_PATH):
+        self.index_path = index_path
+        self._heap = []     # (due, seq, timer_id)
+        self._timers = {}   # timer_id → {"id", "due", "kind", "payload", "seq"}
+        self._handlers = {}
+        self._seq = 0
+        self._records = 0
+        self._fired = 0
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def register(self, kind, handler):
+        """handler(payload) is called when a timer of `kind` falls due."""
+        self._handlers[kind] = handler
+
+    def start(self):
+        """Restore persisted timers and start the firing thread (idempotent)."""
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._restore()
+            self._thread = threading.Thread(target=self._loop, name="timer-service", daemon=True)
+            self._thread.start()
+        logger.info(f"[TIMER] Timer service started with {len(self._timers)} pending timers")
+
+    def schedule(self, timer_id, when, kind, payload=None, replace=True):
+        """
+        Fire `kind` with `payload` at `when`. A timer with the same id is
+        replaced, unless replace=False, in which case the existing one is kept
+        (used when re-registering a wait whose deadline survived a restart).
+        """
+        self.start()
+        due = to_epoch(when)
+        with self._cond:
+            if timer_id in self._timers and not replace:
+                return self._timers[timer_id]["due"]
+            self._seq += 1
+            timer = {"id": timer_id, "due": due, "kind": kind, "payload": payload or {}, "seq": self._seq}
+            self._timers[timer_id] = timer
+            heapq.heappush(self._heap, (due, self._seq, timer_id))
+            self._append({"op": "add", **timer})
+            if self._heap[0][2] == timer_id:
+                self._cond.notify()
+        logger.debug(f"[TIMER] Scheduled {timer_id} ({kind}) in {max(due - time.time(), 0):.2f}s")
+        return due
+
+    def cancel(self, timer_id):
+        """Drop a pending timer; its heap entry is skipped when it surfaces. Returns False if none was pending."""
+        with self._cond:
+            if self._timers.pop(timer_id, None) is None:
+                return False
+            self._append({"op": "cancel", "id": timer_id})
+        logger.debug(f"[TIMER] Cancelled {timer_id}")
+        return True
+
+    def pending(self, timer_id):
+        return timer_id in self._timers
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                due_timers = []
+                while not due_timers:
+                    now = time.time()
+                    while self._heap and self._heap[0][0] <= now:
+                        _, seq, timer_id = heapq.heappop(self._heap)
+                        timer = self._timers.get(timer_id)
+                        # Stale entries left behind by cancel() or a replacing schedule()
+                        if timer and timer["seq"] == seq:
+                            self._timers.pop(timer_id)
+                            self._append({"op": "fire", "id": timer_id})
+                            due_timers.append(timer)
+                    if not due_timers:
+                        self._cond.wait(self._heap[0][0] - now if self._heap else None)
+                self._maybe_compact()
+
+            for timer in due_timers:
+                self._fire(timer)
+
+    def _fire(self, timer):
+        handler = self._handlers.get(timer["kind"])
+        if handler is None:
+            logger.error(f"[TIMER] No handler for timer kind '{timer['kind']}'; dropping {timer['id']}")
+            return
+        self._fired += 1
+        try:
+            handler(timer["payload"])
+        except Exception as e:
+            logger.exception(f"[TIMER] Handler for {timer['id']} failed: {e}")
+
+    def _append(self, record):
+        self._records += 1
+        try:
+            with open(self.index_path, "a") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+        except Exception as e:
+            logger.error(f"[TIMER] Failed to persist timer record {record.get('id')}: {e}")
+
+    def _restore(self):
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-append
+                    continue
+                self._records += 1
+                if record["op"] == "add":
+                    self._seq += 1
+                    record.pop("op")
+                    record["seq"] = self._seq
+                    self._timers[record["id"]] = record
+                else:
+                    self._timers.pop(record["id"], None)
+        self._heap = [(t["due"], t["seq"], t["id"]) for t in self._timers.values()]
+        heapq.heapify(self._heap)
+        self._compact()
+
+    def _maybe_compact(self):
+        if self._records > max(COMPACT_MIN_RECORDS, 4 * len(self._timers)):
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the index with only the pending timers (caller holds the lock)."""
+        tmp_path = f"{self.index_path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                for timer in sorted(self._timers.values(), key=lambda t: t["seq"]):
+                    f.write(json.dumps({"op": "add", **timer}, default=str) + "\n")
+            os.replace(tmp_path, self.index_path)
+            self._records = len(self._timers)
+        except Exception as e:
+            logger.error(f"[TIMER] Failed to compact timer index: {e}")
+
+    def stats(self):
+        with self._cond:
+            next_due = self._heap[0][0] if self._heap else None
+            by_kind = {}
+            for timer in self._timers.values():
+                by_kind[timer["kind"]] = by_kind.get(timer["kind"], 0) + 1
+            return {
+                "running": self._thread is not None,
+                "pending": len(self._timers),
+                "by_kind": by_kind,
+                "fired": self._fired,
+                "next_due_in_seconds": round(max(next_due - time.time(), 0), 3) if next_due else None
+            }
+
+
+# Singleton
+timer_service = TimerService()
@@ -1,15 +1,11 @@
 import os
 import threading
-import yaml
 import time
-import tempfile
-import shutil
-import hashlib
-import requests
-from datetime import datetime
-from croniter import croniter
-from git import Repo
-from engine.we import WorkflowEngine
+from engine.utils.run_executor import submit_workflow, RunDropped
+from engine.utils.cron_scheduler import cron_scheduler
+from engine.utils.git_mirror import git_mirrors
+from engine.utils.push_index import push_index
+from engine.utils.workflow_catalog import workflow_catalog
 from commons.logs import get_logger
 from commons.get_config import get_config
 from engine.utils.github_webhook_helper import install_webhook
@@ -23,8 +19,15 @@ BASE_URL = config["app"]["base_url"]
 
 
 TRIGGER_THREADS = []
-_cron_state = {}
+SETUP_TRIGGER_TYPES = ["scheduled", "gitops"]
 _git_hash_cache = {}
+_installed_webhooks = set()
+
+
+def _trigger_id(wf_path):
+    """Key of a file's cron entry, push route and poll baseline: its path under the workflows directory.
+    Workflow names are not unique across files, so two files sharing one must not share these entries."""
+    return os.path.relpath(wf_path, workflow_catalog.base_path)
 
 
 def inject_token_into_url(url, token):
@@ -41,154 +44,187 @@ def inject_token_into_url(url, token):
 
 def initialize_triggers(workflows_base_path, approval_manager):
     logger.info("[TRIGGER] Initializing trigger-based workflows")
-    ignored_dirs = set(config["app"].get("ignored_workflow_dirs", []))
-    for root, _, files in os.walk(workflows_base_path):
-        if any(ignored in root.split(os.sep) for ignored in ignored_dirs):
-            continue
-        for file in files:
-            if not file.endswith(".yaml"):
-                continue
-            wf_path = os.path.join(root, file)
+    trigger_registry.configure(workflows_base_path, approval_manager)
+    trigger_registry.rescan()
+
+    watch_interval = config["app"].get("workflow_watch_interval_seconds", 0)
+    if watch_interval:
+        trigger_registry.watch(watch_interval)
+
+
+def _register_triggers(wf_path, workflow_dict, approval_manager):
+    """Start what the workflow's trigger needs; returns a callable that stops it again, or None."""
+    trigger = workflow_dict.get("workflow", {}).get("trigger")
+
+    if not trigger:
+        return None
+    trigger_type = trigger.get("type")
+    if trigger_type == "scheduled":
+        logger.info(f"[DEBUG] Registering scheduled trigger: {wf_path}")
+        wf_id = _register_scheduled_trigger(wf_path, workflow_dict, trigger, approval_manager)
+        if wf_id:
+            return lambda: cron_scheduler.unregister(wf_id)
+    elif trigger_type == "gitops":
+        logger.info(f"[DEBUG] Registering git trigger: {wf_path}")
+        trigger_method = trigger.get("method", "poll")
+        stop_polling = _register_git_trigger(wf_path, workflow_dict, trigger, approval_manager)
+
+        if trigger_method == "webhook":
+            wf_id = _register_push_trigger(wf_path, workflow_dict, trigger, approval_manager)
+            if wf_id:
+                return lambda: push_index.remove(wf_id)
+        return stop_polling
+    elif trigger_type == "api":
+        # API trigger handling
+        logger.info(f"[TRIGGER] API trigger for {wf_path} is handled via endpoint")
+        # aigent trigger handling
+    elif trigger_type == "aiagent":
+        logger.info(f"[TRIGGER] AI Agent workflow {wf_path} is handled externally via API")
+
+    else:
+        logger.warning(f"[TRIGGER] Unknown trigger type: {trigger_type}")
+    return None
+
+
+class TriggerRegistry:
+    """
+    Workflow file → the triggers it started. Files are diffed one at a time
+    against the workflow catalog's content hash, so an upload, a sync or the
+    optional watcher only restarts the cron entries, pollers and push routes
+    of the files that actually changed. Files whose trigger needs no setup
+    are never parsed here.
+    """
+
+    def __init__(self):
+        self._files = {}  # wf_path → {"digest", "stop"}
+        self._lock = threading.RLock()
+        self.base_path = None
+        self.approval_manager = None
+        self._watcher = None
+
+    def configure(self, base_path, approval_manager):
+        self.base_path = base_path
+        self.approval_manager = approval_manager
+
+    def sync_file(self, wf_path):
+        """Bring the triggers of one workflow file in line with its content. Returns what changed."""
+        if self.approval_manager is None:
+            logger.debug(f"[TRIGGER] Registry not initialized; skipping {wf_path}")
+            return "skipped"
+        workflow_catalog.refresh_file(wf_path)
+        return self._apply(wf_path, workflow_catalog.entry(wf_path))
+
+    def _apply(self, wf_path, entry):
+        if entry is None:
+            return self.remove_file(wf_path)
+
+        with self._lock:
+            known = self._files.get(wf_path)
+            if known and known["digest"] == entry["hash"]:
+                return "unchanged"
+
+            self._stop(wf_path)
+            record = {"digest": entry["hash"], "stop": None}
+            self._files[wf_path] = record
+            if entry["error"]:
+                logger.warning(f"[TRIGGER] Skipping {wf_path} — {entry['error']}")
+            elif entry.get("trigger_type") in SETUP_TRIGGER_TYPES:
+                workflow_dict = workflow_catalog.load(wf_path)
+                if workflow_dict:
+                    try:
+                        record["stop"] = _register_triggers(wf_path, workflow_dict, self.approval_manager)
+                    except Exception as e:
+                        logger.warning(f"[TRIGGER] Failed to process {wf_path}: {e}")
+            return "updated" if known else "added"
+
+    def remove_file(self, wf_path):
+        with self._lock:
+            if wf_path not in self._files:
+                return "unchanged"
+            self._stop(wf_path)
+            self._files.pop(wf_path)
+        logger.info(f"[TRIGGER] Unregistered triggers of {wf_path}")
+        return "removed"
+
+    def _stop(self, wf_path):
+        entry = self._files.get(wf_path)
+        if entry and entry["stop"]:
             try:
-                with open(wf_path, "r") as f:
-                    workflow_dict = yaml.safe_load(f)
-                    
-                if not workflow_dict or not isinstance(workflow_dict, dict):
-                    logger.warning(f"[TRIGGER] Skipping {wf_path} — YAML is empty or malformed")
-                    continue
-
-                trigger = workflow_dict.get("workflow", {}).get("trigger")
-
-                if not trigger:
-                    continue
-                trigger_type = trigger.get("type")
-                if trigger_type == "scheduled":
-                    logger.info(f"[DEBUG] Registering scheduled trigger: {wf_path}")
-                    _register_scheduled_trigger(wf_path, workflow_dict, trigger, approval_manager)
-                elif trigger_type == "gitops":
-                    logger.info(f"[DEBUG] Registering git trigger: {wf_path}")
-                    trigger_method = trigger.get("method", "poll")
-                    _register_git_trigger(wf_path, workflow_dict, trigger, approval_manager)
-
-                    if trigger_method == "webhook":
-                        token = trigger.get("token")
-                        if not token:
-                            logger.warning("[GITOPS] Webhook method requires a token")
-                        else:
-                            install_webhook(
-                                repo_url=trigger.get("repo"),
-                                token=token,
-                                sawe_url=BASE_URL,
-                                repo_name=os.path.relpath(wf_path, config["directories"]["workflows"]).split(os.sep)[0],
-                                workflow_name=os.path.splitext(os.path.basename(wf_path))[0]
-                            )
-                elif trigger_type == "api":
-                    # API trigger handling
-                    logger.info(f"[TRIGGER] API trigger for {wf_path} is handled via endpoint")
-                    # aigent trigger handling
-                elif trigger_type == "aiagent":
-                    logger.info(f"[TRIGGER] AI Agent workflow {wf_path} is handled externally via API")
-    
-                else:
-                    logger.warning(f"[TRIGGER] Unknown trigger type: {trigger_type}")
+                entry["stop"]()
             except Exception as e:
-                logger.warning(f"[TRIGGER] Failed to process {wf_path}: {e}")
-
-    if _cron_state:
-        thread = threading.Thread(target=_schedule_loop, daemon=True)
-        thread.start()
-        TRIGGER_THREADS.append(thread)
-
-def _register_scheduled_trigger(wf_path, workflow_dict, trigger, approval_manager):
-    cron_expr = trigger.get("cron")
-    wf_meta = workflow_dict.get("workflow", {})
-    if not cron_expr:
-        logger.warning(f"[TRIGGER] No cron expression in scheduled trigger")
-        return
-
-    wf_id = wf_meta.get("name", wf_path)
-    repo = wf_path.split("/workflows/")[1].split("/")[0]
-    workflow_name = os.path.splitext(os.path.basename(wf_path))[0]
-
-    _cron_state[wf_id] = {
-        "cron": cron_expr,
-        "last_run": None,
-        "repo": os.path.relpath(wf_path, config["directories"]["workflows"]).split(os.sep)[0],
-        "workflow": os.path.splitext(os.path.basename(wf_path))[0],
-        "wf_path": wf_path,
-        "workflow_dict": workflow_dict,
-        "approval_manager": approval_manager
-    }
-    logger.info(f"[SCHED] Registered scheduled trigger for {wf_id} with cron: {cron_expr}")
-
-
-
-
-def trigger_scheduled_workflow(repo, workflow):
-    payload = {"mode": "scheduled"}  # or custom, if needed
-    url = f"{own_url}/api/{repo}/{workflow}"
-    try:
-        res = requests.post(url, json=payload)
-        if res.status_code != 202:
-            logger.warning(f"[SCHED] Trigger failed: {res.status_code} — {res.text}")
-        else:
-            logger.info(f"[SCHED] Successfully triggered {workflow}")
-    except Exception as e:
-        logger.exception(f"[SCHED] Error triggering {workflow}: {e}")
-
-
-def _schedule_loop():
-    logger.info("[TRIGGER] Scheduler thread started")
+                logger.warning(f"[TRIGGER] Failed to stop triggers of {wf_path}: {e}")
+            entry["stop"] = None
+
+    def rescan(self):
+        """Refresh the catalog (stat only for unchanged files) and apply the files whose hash moved."""
+        changes = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        if self.approval_manager is None:
+            logger.debug("[TRIGGER] Registry not initialized; skipping rescan")
+            return changes
+        workflow_catalog.refresh()
+        seen = set()
+        for wf_path, entry in workflow_catalog.entries():
+            seen.add(wf_path)
+            changes[self._apply(wf_path, entry)] += 1
+        for wf_path in set(self._files) - seen:
+            changes[self.remove_file(wf_path)] += 1
+        if changes["added"] or changes["updated"] or changes["removed"]:
+            logger.info(f"[TRIGGER] Rescan of {workflow_catalog.base_path}: {changes}")
+        return changes
+
+    def watch(self, interval):
+        """Poll the workflows tree every `interval` seconds (stat only, unless a file changed)."""
+        if self._watcher:
+            return
 
-    # Prepopulate next_run if missing
-    for wf_id, entry in _cron_state.items():
-        cron_expr = entry["cron"]
-        now = datetime.utcnow()
-        if not entry.get("next_run"):
-            entry["next_run"] = croniter(cron_expr, now).get_next(datetime)
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.rescan()
+                except Exception as e:
+                    logger.error(f"[TRIGGER] Workflow watcher error: {e}")
 
-    while True:
-        now = datetime.utcnow()
+        self._watcher = threading.Thread(target=loop, name="workflow-watcher", daemon=True)
+        self._watcher.start()
+        logger.info(f"[TRIGGER] Watching {workflow_catalog.base_path} for workflow changes every {interval}s")
 
-        for wf_id, entry in _cron_state.items():
-            next_run = entry.get("next_run")
+    def stats(self):
+        with self._lock:
+            return {
+                "files": len(self._files),
+                "with_triggers": sum(1 for entry in self._files.values() if entry["stop"]),
+                "watching": self._watcher is not None
+            }
 
-            if not next_run:
-                # Defensive fallback — recalculate
-                entry["next_run"] = croniter(entry["cron"], now).get_next(datetime)
-                continue
 
-            if now >= next_run:
-                repo = entry["repo"]
-                workflow = entry["workflow"]
-                logger.info(f"[SCHED] Triggering scheduled workflow {repo}/{workflow} at {now.isoformat()}")
+def _register_scheduled_trigger(wf_path, workflow_dict, trigger, approval_manager):
+    if not trigger.get("cron"):
+        logger.warning(f"[TRIGGER] No cron expression in scheduled trigger")
+        return
 
-                try:
-                    url = f"{BASE_URL}/api/{repo}/{workflow}"
-                    payload = {"mode": "scheduled"}
-                    res = requests.post(url, json=payload)
-                    logger.info(f"[SCHED] Triggered {workflow}: {res.status_code} — {res.text}")
-                except Exception as e:
-                    logger.exception(f"[SCHED] Error triggering {workflow}: {e}")
+    wf_id = _trigger_id(wf_path)
+    cron_scheduler.register(wf_id, workflow_dict, trigger, approval_manager)
+    return wf_id
 
-                # Update timestamps
-                entry["last_run"] = now
-                entry["next_run"] = croniter(entry["cron"], now).get_next(datetime)
 
-        time.sleep(5)
 
+def _register_push_trigger(wf_path, workflow_dict, trigger, approval_manager):
+    if not trigger.get("repo"):
+        logger.warning(f"[GITOPS] Webhook trigger in {wf_path} has no repo")
+        return
+    wf_id = _trigger_id(wf_path)
+    push_index.add(wf_id, workflow_dict, trigger, approval_manager)
 
+    # One hook per repository feeds every workflow watching it
+    token = trigger.get("token")
+    if not token:
+        logger.warning("[GITOPS] Webhook method requires a token")
+    elif trigger["repo"] not in _installed_webhooks:
+        if install_webhook(repo_url=trigger["repo"], token=token, sawe_url=BASE_URL):
+            _installed_webhooks.add(trigger["repo"])
+    return wf_id
 
-def md5_of_paths(base_dir, file_paths):
-    """Compute a combined MD5 hash of a list of specific files."""
-    hash_md5 = hashlib.md5()
-    for rel_path in sorted(file_paths):
-        full_path = os.path.join(base_dir, rel_path)
-        if os.path.exists(full_path) and os.path.isfile(full_path):
-            with open(full_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
-    return hash_md5.hexdigest()
 
 def _register_git_trigger(wf_path, workflow_dict, trigger, approval_manager):
     raw_repo_url = trigger.get("repo")
@@ -198,6 +234,7 @@ def _register_git_trigger(wf_path, workflow_dict, trigger, approval_manager):
     files = [f.get("path") for f in trigger.get("files", [])]
     interval = int(trigger.get("poll_interval_seconds", 60))
     wf_name = workflow_dict["workflow"].get("name", wf_path)
+    wf_id = _trigger_id(wf_path)
 
     if method == "poll":
         if not raw_repo_url or not files:
@@ -206,44 +243,57 @@ def _register_git_trigger(wf_path, workflow_dict, trigger, approval_manager):
 
 
 
+        if github_token:
+            auth_url = raw_repo_url.replace("https://", f"https://{github_token}:x-oauth-basic@")
+        else:
+            auth_url = raw_repo_url
+
+        stopped = threading.Event()
+
         def poller():
             logger.info(f"[GIT-TRIGGER] Starting polling for: {raw_repo_url} ({wf_name}) every {interval}s")
-            temp_dir = tempfile.mkdtemp()
 
-            while True:
+            while not stopped.is_set():
                 try:
-                    if os.path.exists(temp_dir):
-                        shutil.rmtree(temp_dir)
-                    os.makedirs(temp_dir, exist_ok=True)
-
-                    if github_token:
-                        clone_url = raw_repo_url.replace("https://", f"https://{github_token}:x-oauth-basic@")
-                    else: 
-                        clone_url = raw_repo_url
-                        
-                    Repo.clone_from(clone_url, temp_dir, branch=branch, depth=1)
-                    logger.info(f"Constructed URL is {clone_url}")
-                    current_md5 = md5_of_paths(temp_dir, files)
-
-                    if wf_name not in _git_hash_cache:
-                        _git_hash_cache[wf_name] = current_md5
-                        logger.info(f"[GIT-TRIGGER] Initial hash cached for {wf_name}: {current_md5}")
-                    elif _git_hash_cache[wf_name] != current_md5:
+                    # Shared bare mirror: ls-remote while the head is unchanged, incremental fetch when it moves
+                    current_hash = git_mirrors.watched_hash(raw_repo_url, branch, files, auth_url=auth_url)
+                    if stopped.is_set():
+                        break
+
+                    if wf_id not in _git_hash_cache:
+                        _git_hash_cache[wf_id] = current_hash
+                        logger.info(f"[GIT-TRIGGER] Initial hash cached for {wf_name}: {current_hash}")
+                    elif _git_hash_cache[wf_id] != current_hash:
                         logger.info(f"[GIT-TRIGGER] Change detected in {wf_name}, triggering workflow...")
-                        engine = WorkflowEngine(approval_manager, workflow_dict, {}, repo_base_path=config["directories"]["modules"])
-                        threading.Thread(target=engine.run, daemon=True).start()
-                        _git_hash_cache[wf_name] = current_md5
+                        try:
+                            submit_workflow(workflow_dict, {}, approval_manager, block=True)
+                        except RunDropped as e:
+                            logger.info(f"[GIT-TRIGGER] {wf_name}: {e}")
+                        _git_hash_cache[wf_id] = current_hash
                     else:
                         logger.debug(f"[GIT-TRIGGER] No change for {wf_name}")
 
                 except Exception as e:
                     logger.error(f"[GIT-TRIGGER] Polling error for {wf_name}: {e}")
 
-                time.sleep(interval)
+                stopped.wait(interval)
+            logger.info(f"[GIT-TRIGGER] Stopped polling for {wf_name}")
 
         thread = threading.Thread(target=poller, daemon=True)
         thread.start()
         TRIGGER_THREADS.append(thread)
 
+        def stop():
+            stopped.set()
+            TRIGGER_THREADS.remove(thread)
+            # A re-registered trigger may watch other files; it takes a fresh baseline
+            _git_hash_cache.pop(wf_id, None)
+
+        return stop
+
     else:
         logger.debug(f"[GIT-TRIGGER] Skipping polling for {wf_name} — method is '{method}'")
+
+
+# Singleton
+trigger_registry = TriggerRegistry()
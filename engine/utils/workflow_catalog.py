@@ -0,0 +1,245 @@
+# engine/utils/workflow_catalog.py
+
+import os
+import json
+import time
+import hashlib
+import threading
+import yaml
+from engine.utils.workflow_compiler import workflow_hash
+from commons.logs import get_logger
+from commons.get_config import get_config
+
+logger = get_logger(__name__)
+config = get_config()
+
+WORKFLOWS_BASE = config["directories"]["workflows"]
+CATALOG_PATH = os.path.join(config["directories"]["workdir"], "workflow_catalog.json")
+CATALOG_MAX_AGE_SECONDS = 30
+# File hashes use the same algorithm as plan hashes and stored definitions
+CATALOG_HASH = "sha256"
+
+
+class WorkflowCatalog:
+    """
+    Index of every workflow file under the workflows directory: path, mtime,
+    size, content hash, trigger type and a few parsed fields, plus the
+    plan hash its ExecutionPlan is cached under. Persisted as JSON and
+    loaded at boot, so only files whose mtime or size moved are re-read.
+    Parsed definitions are kept in memory for dispatch, re-parsed only when
+    the file changes.
+    """
+
+    def __init__(self, base_path=WORKFLOWS_BASE, catalog_path=CATALOG_PATH):
+        self.base_path = base_path
+        self.catalog_path = catalog_path
+        self._entries = self._load()   # relative path → entry
+        self._parsed = {}              # relative path → (mtime, size, workflow_dict)
+        self._lock = threading.RLock()
+        self._refreshed_at = 0
+        self._dirty = False
+        self.parses = 0
+
+    def _rel(self, wf_path):
+        return os.path.relpath(wf_path, self.base_path)
+
+    def _ignored(self, rel_path):
+        ignored_dirs = set(config["app"].get("ignored_workflow_dirs", []))
+        return any(part in ignored_dirs for part in os.path.dirname(rel_path).split(os.sep))
+
+    def refresh(self):
+        """Stat the whole tree and re-index only new or modified files. Returns {"added", "updated", "removed"} path lists."""
+        changes = {"added": [], "updated": [], "removed": []}
+        with self._lock:
+            seen = set()
+            for root, _, files in os.walk(self.base_path):
+                for file in files:
+                    if not file.endswith(".yaml"):
+                        continue
+                    wf_path = os.path.join(root, file)
+                    rel = self._rel(wf_path)
+                    if self._ignored(rel):
+                        continue
+                    seen.add(rel)
+                    change = self._refresh(rel, wf_path)
+                    if change != "unchanged":
+                        changes[change].append(wf_path)
+            for rel in set(self._entries) - seen:
+                self._drop(rel)
+                changes["removed"].append(os.path.join(self.base_path, rel))
+            self._refreshed_at = time.monotonic()
+            if any(changes.values()) or self._dirty:
+                self._save()
+            if any(changes.values()):
+                logger.info(f"[CATALOG] Refreshed: {', '.join(f'{len(v)} {k}' for k, v in changes.items())}")
+        return changes
+
+    def refresh_file(self, wf_path):
+        """Re-index one file. Returns "added", "updated", "removed" or "unchanged"."""
+        rel = self._rel(wf_path)
+        with self._lock:
+            if not os.path.isfile(wf_path) or self._ignored(rel):
+                if rel not in self._entries:
+                    return "unchanged"
+                self._drop(rel)
+                change = "removed"
+            else:
+                change = self._refresh(rel, wf_path)
+            if change != "unchanged" or self._dirty:
+                self._save()
+        return change
+
+    def _refresh(self, rel, wf_path):
+        stat = os.stat(wf_path)
+        known = self._entries.get(rel)
+        if known and known["mtime"] == stat.st_mtime and known["size"] == stat.st_size:
+            return "unchanged"
+
+        with open(wf_path, "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        if known and known["hash"] == digest:
+            # Touched but identical (e.g. re-synced from git)
+            known["mtime"], known["size"] = stat.st_mtime, stat.st_size
+            if rel in self._parsed:
+                self._parsed[rel] = (stat.st_mtime, stat.st_size, self._parsed[rel][2])
+            self._dirty = True
+            return "unchanged"
+
+        entry = {
+            "path": rel,
+            "repo": rel.split(os.sep)[0],
+            "file": os.path.basename(rel),
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "hash": digest,
+            "error": None
+        }
+        try:
+            workflow_dict = self._parse(raw)
+            workflow = workflow_dict.get("workflow", {})
+            trigger = workflow.get("trigger") or {}
+            entry.update({
+                "name": workflow.get("name"),
+                "description": workflow.get("description"),
+                "trigger_type": trigger.get("type"),
+                "trigger_method": trigger.get("method"),
+                "steps": len(workflow.get("steps") or []),
+                "plan_hash": workflow_hash(workflow)
+            })
+            self._parsed[rel] = (stat.st_mtime, stat.st_size, workflow_dict)
+        except Exception as e:
+            entry["error"] = str(e)
+            self._parsed.pop(rel, None)
+        self._entries[rel] = entry
+        return "updated" if known else "added"
+
+    def _parse(self, raw):
+        self.parses += 1
+        workflow_dict = yaml.safe_load(raw)
+        if not workflow_dict or not isinstance(workflow_dict, dict):
+            raise ValueError("YAML is empty or malformed")
+        return workflow_dict
+
+    def _drop(self, rel):
+        self._entries.pop(rel, None)
+        self._parsed.pop(rel, None)
+
+    def entry(self, wf_path):
+        return self._entries.get(self._rel(wf_path))
+
+    def entries(self):
+        """(absolute path, entry) for every indexed workflow."""
+        with self._lock:
+            return [(os.path.join(self.base_path, rel), entry) for rel, entry in self._entries.items()]
+
+    def load(self, wf_path):
+        """
+        Parsed definition of a workflow file, or None if it is missing or
+        unparseable. Costs one stat while the file is unchanged. Callers get
+        a shallow copy and must not mutate the nested definition.
+        """
+        rel = self._rel(wf_path)
+        try:
+            stat = os.stat(wf_path)
+        except FileNotFoundError:
+            self.refresh_file(wf_path)
+            return None
+
+        with self._lock:
+            cached = self._parsed.get(rel)
+            if cached and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+                return dict(cached[2])
+            known = self._entries.get(rel)
+            if not known or known["mtime"] != stat.st_mtime or known["size"] != stat.st_size:
+                self.refresh_file(wf_path)
+                cached = self._parsed.get(rel)
+                if cached:
+                    return dict(cached[2])
+                known = self._entries.get(rel)
+            if not known or known["error"]:
+                return None
+            # Indexed at an earlier boot, or touched with identical content; parse on first use
+            with open(wf_path, "rb") as f:
+                workflow_dict = self._parse(f.read())
+            self._parsed[rel] = (stat.st_mtime, stat.st_size, workflow_dict)
+            return dict(workflow_dict)
+
+    def listing(self):
+        """
+        {relative dir: [file, ...]} as served to the UI; refreshed when older
+        than CATALOG_MAX_AGE_SECONDS. The UI fetches a workflow as
+        /workflows/<dir>/<file>, so files directly in the workflows root are
+        not listed (they have no <dir>).
+        """
+        if time.monotonic() - self._refreshed_at > CATALOG_MAX_AGE_SECONDS:
+            self.refresh()
+        result = {}
+        with self._lock:
+            for rel in sorted(self._entries):
+                directory = os.path.dirname(rel)
+                if directory:
+                    result.setdefault(directory, []).append(os.path.basename(rel))
+        return result
+
+    def _load(self):
+        if not os.path.exists(self.catalog_path):
+            return {}
+        try:
+            with open(self.catalog_path, "r") as f:
+                data = json.load(f)
+            if data.get("base_path") != self.base_path or data.get("hash") != CATALOG_HASH:
+                # Indexed elsewhere or hashed with another algorithm: every file is re-read once
+                return {}
+            return data.get("entries", {})
+        except Exception as e:
+            logger.warning(f"[CATALOG] Ignoring unreadable catalog {self.catalog_path}: {e}")
+            return {}
+
+    def _save(self):
+        tmp_path = f"{self.catalog_path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"base_path": self.base_path, "hash": CATALOG_HASH, "entries": self._entries}, f)
+            os.replace(tmp_path, self.catalog_path)
+            self._dirty = False
+        except Exception as e:
+            logger.error(f"[CATALOG] Failed to persist catalog: {e}")
+
+    def stats(self):
+        with self._lock:
+            by_trigger = {}
+            for entry in self._entries.values():
+                trigger_type = entry.get("trigger_type") or "none"
+                by_trigger[trigger_type] = by_trigger.get(trigger_type, 0) + 1
+            return {
+                "workflows": len(self._entries),
+                "parsed_in_memory": len(self._parsed),
+                "errors": sum(1 for entry in self._entries.values() if entry["error"]),
+                "by_trigger": by_trigger,
+                "parses": self.parses
+            }
+
+
+# Singleton
+workflow_catalog = WorkflowCatalog()
@@ -0,0 +1,248 @@
+# engine/utils/workflow_compiler.py
+
+import ast
+import copy
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from inspect import signature
+from types import MappingProxyType
+from engine.utils.match_engine import evaluate_operator, extract_json_path, safe_eval_logic_expr
+from engine.utils.template_cache import template_cache
+from commons.logs import get_logger
+from commons.get_config import get_config
+
+logger = get_logger(__name__)
+config = get_config()
+
+PLAN_CACHE_SIZE = 256
+
+_ALLOWED_LOGIC_NODES = (
+    ast.Expression, ast.BoolOp, ast.UnaryOp, ast.Name, ast.Load, ast.And, ast.Or,
+    ast.Not, ast.Compare, ast.Eq, ast.NotEq, ast.Constant
+)
+
+
+def find_dependency_cycle(dependencies):
+    """Return the step ids left on a cycle of a {step_id: deps} graph (Kahn's algorithm), or []."""
+    indegree = {step_id: len(deps) for step_id, deps in dependencies.items()}
+    dependents = {step_id: [] for step_id in dependencies}
+    for step_id, deps in dependencies.items():
+        for dep in deps:
+            dependents[dep].append(step_id)
+
+    queue = [step_id for step_id, degree in indegree.items() if degree == 0]
+    while queue:
+        for dependent in dependents[queue.pop()]:
+            indegree[dependent] -= 1
+            if indegree[dependent] == 0:
+                queue.append(dependent)
+    return [step_id for step_id, degree in indegree.items() if degree > 0]
+
+
+def workflow_hash(workflow):
+    """Stable content hash of a workflow definition (the dict under 'workflow')."""
+    canonical = json.dumps(workflow, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class CompiledTerms:
+    """A step's `terms` block with its logic string parsed once."""
+
+    def __init__(self, rules, logic):
+        self.rules = tuple(
+            (rule["id"], rule["path"], rule["operator"], rule.get("value"))
+            for rule in rules
+        )
+        self.logic = logic
+        self._code = self._compile_logic(logic, {rid for rid, _, _, _ in self.rules})
+
+    @staticmethod
+    def _compile_logic(logic, rule_ids):
+        try:
+            tree = ast.parse(logic, mode="eval")
+        except SyntaxError:
+            return None
+        for node in ast.walk(tree):
+            if not isinstance(node, _ALLOWED_LOGIC_NODES):
+                return None
+            if isinstance(node, ast.Name) and node.id not in rule_ids:
+                return None
+        return compile(tree, filename="<terms>", mode="eval")
+
+    def evaluate(self, data):
+        results = {
+            rid: evaluate_operator(operator, extract_json_path(data, path), expected)
+            for rid, path, operator, expected in self.rules
+        }
+        if self._code is None:
+            # Ids that are not plain identifiers keep the textual substitution semantics
+            logic_expr = self.logic
+            for rid, val in results.items():
+                logic_expr = logic_expr.replace(rid, str(val))
+            return safe_eval_logic_expr(logic_expr)
+        try:
+            return bool(eval(self._code, {"__builtins__": {}}, results))
+        except Exception as e:
+            logger.error(f"Failed to evaluate terms logic '{self.logic}': {e}")
+            return False
+
+
+class ExecutionPlan:
+    """
+    Immutable, run-independent view of a workflow: step index, successor map
+    and dependency graph, pre-parsed input templates, resolved module
+    defaults, compiled `terms` predicates and memoized call adapters. Plans
+    are shared between runs and must not be mutated.
+    """
+
+    def __init__(self, workflow, content_hash):
+        self.content_hash = content_hash
+        self.name = workflow.get("name")
+        steps = [copy.deepcopy(step) for step in workflow.get("steps", [])]
+
+        self.step_order = tuple(step["id"] for step in steps)
+        self.steps = MappingProxyType({step["id"]: step for step in steps})
+        # Every schedulable step, including the children of parallel groups
+        self.step_index = MappingProxyType(dict(self._schedulable_steps(steps)))
+        self.successors = MappingProxyType({
+            step_id: (self.step_order[i + 1] if i + 1 < len(self.step_order) else None)
+            for i, step_id in enumerate(self.step_order)
+        })
+
+        # DAG mode: a step without depends_on waits for the step declared before it
+        self.dag_mode = any("depends_on" in step for step in steps)
+        dependencies = {}
+        for i, step in enumerate(steps):
+            if "depends_on" in step:
+                deps = tuple(step.get("depends_on") or [])
+            else:
+                deps = (self.step_order[i - 1],) if i > 0 else ()
+            unknown = [dep for dep in deps if dep not in self.steps]
+            if unknown:
+                raise ValueError(f"Step '{step['id']}' depends on unknown steps: {unknown}")
+            dependencies[step["id"]] = deps
+        if self.dag_mode:
+            cycle = find_dependency_cycle(dependencies)
+            if cycle:
+                raise ValueError(f"Dependency cycle between steps: {cycle}")
+        dependents = {step_id: [] for step_id in self.step_order}
+        for step_id in self.step_order:
+            for dep in dependencies[step_id]:
+                dependents[dep].append(step_id)
+        self.dependencies = MappingProxyType(dependencies)
+        self.dependents = MappingProxyType({k: tuple(v) for k, v in dependents.items()})
+
+        templates = {}
+        module_defaults = {}
+        terms = {}
+        item_terms = {}
+        for step in self._walk_steps(workflow):
+            for source in self._input_sources(step.get("input", {})):
+                if source not in templates:
+                    templates[source] = template_cache.get(source)
+
+            action = step.get("action")
+            if action and not action.startswith("context."):
+                module_name = action.split(".")[0]
+                module_defaults[module_name] = MappingProxyType(
+                    config.get("module_defaults", {}).get(module_name, {}) or {}
+                )
+
+            terms_block = step.get("terms")
+            if isinstance(terms_block, dict) and terms_block.get("rules") and terms_block.get("logic"):
+                terms[step["id"]] = CompiledTerms(terms_block["rules"], terms_block["logic"])
+
+            # foreach: the item step's terms are evaluated once per item
+            item_block = (step.get("step") or {}).get("terms") if step.get("type") == "foreach" else None
+            if isinstance(item_block, dict) and item_block.get("rules") and item_block.get("logic"):
+                item_terms[step["id"]] = CompiledTerms(item_block["rules"], item_block["logic"])
+
+        self.templates = MappingProxyType(templates)
+        self.module_defaults = MappingProxyType(module_defaults)
+        self.terms = MappingProxyType(terms)
+        self.item_terms = MappingProxyType(item_terms)
+        self._adapters = {}
+        self._adapters_lock = threading.Lock()
+
+    @staticmethod
+    def _walk_steps(workflow):
+        pending = list(workflow.get("steps", []))
+        for key in ["on_failure", "on_success"]:
+            pending.extend((workflow.get(key) or {}).get("steps", []))
+        if isinstance(workflow.get("global_failure_handler"), dict):
+            pending.append(workflow["global_failure_handler"])
+        while pending:
+            step = pending.pop(0)
+            if not isinstance(step, dict):
+                continue
+            yield step
+            for key in ["delivery_step", "step_failure_handler"]:
+                if isinstance(step.get(key), dict):
+                    pending.append(step[key])
+            if step.get("type") == "parallel":
+                pending.extend(step.get("steps", []))
+            elif step.get("type") == "foreach" and isinstance(step.get("step"), dict):
+                pending.append(step["step"])
+
+    @classmethod
+    def _schedulable_steps(cls, steps):
+        for step in steps:
+            yield step["id"], step
+            if step.get("type") == "parallel":
+                yield from cls._schedulable_steps(step.get("steps", []))
+
+    @staticmethod
+    def _input_sources(input_dict):
+        for value in input_dict.values():
+            if isinstance(value, str):
+                yield value
+            elif isinstance(value, list):
+                for item in value:
+                    yield str(item)
+
+    def template(self, source):
+        return self.templates.get(source) or template_cache.get(source)
+
+    def defaults_for(self, module_name):
+        defaults = self.module_defaults.get(module_name)
+        if defaults is None:
+            return config.get("module_defaults", {}).get(module_name, {})
+        return dict(defaults)
+
+    def accepted_args(self, instance, method_name):
+        """Names a module method accepts, resolved once per (class, method)."""
+        key = (type(instance), method_name)
+        accepted = self._adapters.get(key)
+        if accepted is None:
+            accepted = frozenset(signature(getattr(instance, method_name)).parameters.keys())
+            with self._adapters_lock:
+                self._adapters[key] = accepted
+        return accepted
+
+    def next_step(self, step_id):
+        return self.successors.get(step_id)
+
+
+_plans = OrderedDict()
+_plans_lock = threading.Lock()
+
+
+def compile_workflow(workflow):
+    """Return the ExecutionPlan for a workflow definition, compiling it at most once per content hash."""
+    content_hash = workflow_hash(workflow)
+    with _plans_lock:
+        plan = _plans.get(content_hash)
+        if plan is not None:
+            _plans.move_to_end(content_hash)
+            return plan
+
+    plan = ExecutionPlan(workflow, content_hash)
+    logger.info(f"[PLAN] Compiled workflow '{plan.name}' ({content_hash[:12]}) with {len(plan.step_order)} steps")
+
+    with _plans_lock:
+        _plans[content_hash] = plan
+        while len(_plans) > PLAN_CACHE_SIZE:
+            _plans.popitem(last=False)
+    return plan
@@ -1,19 +1,26 @@
 # we.py
 
-import importlib.util
 import os
 import sys
+import asyncio
 import inspect
 import uuid
-from jinja2 import Template, Environment
-from time import time
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+import time
+from datetime import datetime, timedelta
 import yaml
 from engine.utils.context_manager import ContextManager
 from engine.utils.step_flow_controller import StepFlowController
 from engine.utils.preflight_module.preflight import Preflight
 from engine.state.lifetime_manager import lifetime_manager
+from engine.state.definition_store import definition_store
+from engine.state.artifact_store import artifact_store
 from engine.utils.config_merge import merge_module_config
+from engine.utils.template_cache import template_cache
+from engine.utils.module_loader import module_registry
+from engine.utils.workflow_compiler import compile_workflow
+from engine.utils.async_runtime import async_runtime
+from engine.utils.parking import RunParked, parkable, parking_enabled, parking_lot, executing_step
 from commons.logs import get_logger
 from engine.builtin.defer_step import resolve_defer_time
 
@@ -26,6 +33,11 @@ logger.debug(f"[DEBUG] Workflow Engine initialized with config: {config}")
 REPO_BASE = config["directories"]["modules"]
 WORKFLOWS_BASE = config["directories"]["workflows"]
 BASE_URL = config["app"]["base_url"]
+PARALLEL_MAX_WORKERS = int(config.get("engine", {}).get("parallel_max_workers", 16))
+ASYNC_MAX_INFLIGHT = int(config.get("engine", {}).get("async_max_inflight", 1000))
+DAG_MAX_WIDTH = int(config.get("engine", {}).get("dag_max_width", 4))
+PARALLEL_JOIN_POLICIES = ["all", "any", "first_success"]
+FOREACH_FAIL_POLICIES = ["never", "any", "all"]
 
 # Add the repo base path to sys.path if not already present
 if REPO_BASE not in sys.path:
@@ -33,8 +45,16 @@ if REPO_BASE not in sys.path:
     
 logger.info(f"[DEBUG] Added {REPO_BASE} to sys.path")
 
+
+def approval_link_for(uid, step):
+    """Link a human follows to resolve an approval or webform step."""
+    if step["type"] == "webform":
+        config_file = step.get("config_file", "configs/reference_config.js")
+        return f"{BASE_URL}/{step.get('module')}/{uid}/{step['id']}/t.webform.html?config_file={config_file}"
+    return f"{BASE_URL}/api/approve/{uid}/{step['id']}"
+
 class WorkflowEngine:
-    def __init__(self, approval_manager, workflow_dict, payload, modules_base_path=REPO_BASE, skip_payload_parse=False, injected_context=None):
+    def __init__(self, approval_manager, workflow_dict, payload, modules_base_path=REPO_BASE, skip_payload_parse=False, injected_context=None, lifetime_map=None):
         self.approval_manager = approval_manager
         from engine.utils.control_channel import WorkflowControlChannel
         self.control_channel = WorkflowControlChannel()
@@ -47,20 +67,33 @@ class WorkflowEngine:
         self.context.set("workflow_failed", False)
         self.context.set("failed_step_id", None)
         self.context.set("failed_reason", None)
-        self.module_cache = {}
 
         self.workflow_uid = workflow_dict.get("uid", str(uuid.uuid4()))
-        self.lifetime_map = {
-            "uid": self.workflow_uid,
-            "workflow": self.workflow,
-            "current_step": None,
-            "context": {},
-            "started_at": datetime.utcnow().isoformat()
-        }
+        self.context.set("workflow_uid", self.workflow_uid)
+        self.parked = None
+        self._resume_results = {}  # step_id → result delivered while the run was parked
+        if lifetime_map is not None:
+            # A resumed run keeps its stored lifetime; nothing is written over it until the run moves on
+            self.lifetime_map = lifetime_map
+            # Lifetimes written before definitions were stored separately switch to a reference here
+            lifetime_map.pop("workflow", None)
+            lifetime_map.setdefault("workflow_name", self.workflow.get("name"))
+        else:
+            self.lifetime_map = {
+                "uid": self.workflow_uid,
+                "workflow_name": self.workflow.get("name"),
+                "current_step": None,
+                "context": {},
+                "started_at": datetime.utcnow().isoformat()
+            }
 
         # Inject access_key if present
         if "access_key" in workflow_dict:
             self.lifetime_map["access_key"] = workflow_dict["access_key"]
+        if "concurrency_key" in workflow_dict:
+            self.lifetime_map["concurrency_key"] = workflow_dict["concurrency_key"]
+        if "lane" in workflow_dict:
+            self.lifetime_map["lane"] = workflow_dict["lane"]
 
         if injected_context:
             self.context.update(injected_context)  # Injected from lifetime
@@ -70,10 +103,15 @@ class WorkflowEngine:
             self._parse_payload()
         self._validate_modules()
 
-        self.controller = StepFlowController(self.workflow, self.context)
+        # Compiled once per workflow content hash and shared by every run of it
+        self.plan = compile_workflow(self.workflow)
+        # The lifetime references the definition by that hash instead of embedding it
+        self.lifetime_map["workflow_hash"] = definition_store.put(self.workflow, self.plan.content_hash)
+        self.controller = StepFlowController(self.workflow, self.context, plan=self.plan)
         self._load_context_modules()
 
-        self._persist_lifetime("initialized")
+        if lifetime_map is None:
+            self._persist_lifetime("initialized")
 
         
     def _load_context_modules(self):
@@ -119,7 +157,13 @@ class WorkflowEngine:
 
     def _validate_modules(self):
         preflight = Preflight(self.context.get_all())
-        for step in self.workflow.get("steps", []):
+        steps = list(self.workflow.get("steps", []))
+        while steps:
+            step = steps.pop(0)
+            if step.get("type") == "parallel":
+                steps.extend(step.get("steps", []))
+            elif step.get("type") == "foreach" and step.get("step"):
+                steps.append(step["step"])
             action = step.get("action")
             if not action or action.startswith("context."):
                 continue  # skip context modules
@@ -138,96 +182,211 @@ class WorkflowEngine:
             if not self.controller.steps:
                 raise RuntimeError(f"No steps defined in workflow '{self.workflow_uid}'")
 
-            step_id = self.lifetime_map.get("current_step") or list(self.controller.steps.keys())[0]
-        
+            step_id = self.lifetime_map.get("current_step") or self.plan.step_order[0]
+
+            # Resuming a parked run: hand the delivered result to the step it parked at
+            parked = self.lifetime_map.pop("parked", None)
+            if parked and "result" in parked:
+                self._resume_results[parked["step_id"]] = parked["result"]
+                logger.info(f"[WF] Workflow {self.workflow_uid} resumed at '{parked['step_id']}' ({parked['reason']})")
+
             try:
-                while step_id:
-                    self.control_channel.fetch_and_apply()
+                with parking_enabled():
+                    if self.plan.dag_mode:
+                        self._run_dag()
+                    else:
+                        self._run_sequential(step_id)
 
-                    if self.control_channel.status["cancelled"]:
-                        logger.warning(f"[CONTROL] Workflow {self.workflow_uid} was cancelled.")
-                        break
+            except RunParked as e:
+                self._park(e)
 
-                    if self.control_channel.status["paused"]:
-                        logger.info(f"[CONTROL] Workflow {self.workflow_uid} paused.")
-                        time.sleep(1)
-                        continue
+            finally:
+                if not self.parked:
+                    self._finish_run()
+
+        except Exception as e:
+            logger.exception(f"[WF] Workflow {self.workflow_uid} crashed during run(): {e}")
+
+    def _park(self, parked):
+        """Persist the run at the step it waits on and release this thread."""
+        self.parked = parked
+        self.lifetime_map["current_step"] = parked.step_id
+        self.lifetime_map["parked"] = {
+            "step_id": parked.step_id,
+            "reason": parked.reason,
+            "detail": parked.detail,
+            "parked_at": datetime.utcnow().isoformat()
+        }
+        self._persist_lifetime("parked")
+        lifetime_manager.flush(self.workflow_uid)
+        parking_lot.park(self.workflow_uid, parked.step_id, parked.reason, wake_at=parked.detail.get("wake_at"))
+        logger.info(f"[WF] Workflow {self.workflow_uid} parked at '{parked.step_id}' ({parked.reason})")
+
+    def _finish_run(self):
+        """Failure handlers, final lifetime write and archival once the run has ended (not parked)."""
+        if self.context.get("workflow_failed"):
+            global_handler = self.workflow.get("global_failure_handler")
+            if global_handler:
+                logger.info("[WF FAIL] Running global_failure_handler")
+                try:
+                    if isinstance(global_handler, list):
+                        for handler_step_id in global_handler:
+                            step_def = self.controller.get_step(handler_step_id)
+                            self._run_inline_step(step_def)
+                    elif isinstance(global_handler, dict):
+                        self._run_inline_step(global_handler)
+                    else:
+                        logger.warning("[WF FAIL] global_failure_handler has invalid format")
+                except Exception as e:
+                    logger.exception("[WF FAIL] Global failure handler failed")
+
+        self._persist_lifetime("completed")
+        lifetime_manager.mark_complete(self.workflow_uid)
+
+        if self.context.get("workflow_failed"):
+            self.lifetime_map["failure"] = {
+                "step_id": self.context.get("failed_step_id"),
+                "reason": self.context.get("failed_reason")
+            }
+            logger.info(f"[WF] Workflow {self.workflow_uid} completed WITH FAILURE.")
+        else:
+            logger.info(f"[WF] Workflow {self.workflow_uid} completed SUCCESSFULLY.")
+
+    def _run_sequential(self, step_id):
+        while step_id:
+            self.control_channel.fetch_and_apply()
+
+            if self.control_channel.status["cancelled"]:
+                logger.warning(f"[CONTROL] Workflow {self.workflow_uid} was cancelled.")
+                break
+
+            if self.control_channel.status["paused"]:
+                logger.info(f"[CONTROL] Workflow {self.workflow_uid} paused.")
+                time.sleep(1)
+                continue
+
+            if step_id in self.control_channel.status["skip"]:
+                logger.info(f"[CONTROL] Skipping step {step_id}")
+                step_id = self.controller.get_next_step(step_id)
+                continue
+
+            if self.control_channel.status["jump_to"]:
+                jump_to = self.control_channel.status["jump_to"]
+                if jump_to in self.controller.steps:
+                    logger.info(f"[CONTROL] Jumping to step {jump_to}")
+                    step_id = jump_to
+                    self.control_channel.status["jump_to"] = None
+                else:
+                    logger.warning(f"[CONTROL] jump_to target {jump_to} not found")
+                    break
+                continue                    
+            self.lifetime_map["current_step"] = step_id
+            self._persist_lifetime("step_start")
+
+            step = self.controller.get_step(step_id)
+
+            if self.controller.should_run_step(step_id):
+                try:
+                    result = self._run_step(step)
+
+                except RunParked:
+                    raise
+                except Exception as e:
+                    logger.error(f"[WF] Step {step['id']} failed: {e}")
+                    self.context.set("workflow_failed", True)
+                    step_id = None
+                    break
+
+                self.controller.register_step_result(step_id, result)
+
+                # Only if no exception: move to next
+                next_step_id = self.controller.get_next_step(step_id)
+                logger.info(f"[DEBUG] Completed step {step['id']} → next → {next_step_id}")
+                step_id = next_step_id
+
+            else:
+                # If step shouldn't run, just go to next
+                next_step_id = self.controller.get_next_step(step_id)
+                logger.info(f"[DEBUG] Skipped step {step['id']} → next → {next_step_id}")
+                step_id = next_step_id
+
+    def _run_dag(self):
+        """
+        Run steps declared with `depends_on` as a DAG: every step whose
+        dependencies have finished is started, up to `max_parallel_steps`
+        steps at a time. A step counts as finished once it ran or was skipped.
+        """
+        width = max(int(self.workflow.get("max_parallel_steps") or DAG_MAX_WIDTH), 1)
+        completed = set(self.lifetime_map.get("completed_steps") or [])
+        started = set(completed)
+        ready = self.controller.ready_steps(completed, started)
+        running = {}  # future → step_id
+
+        logger.info(f"[DAG] Workflow {self.workflow_uid} scheduling {len(self.plan.step_order)} steps (width {width})")
+
+        def finish(step_id):
+            completed.add(step_id)
+            self.lifetime_map["completed_steps"] = [s for s in self.plan.step_order if s in completed]
+            ready.extend(self.controller.newly_ready(step_id, completed, started))
+
+        with ThreadPoolExecutor(max_workers=width, thread_name_prefix=f"dag-{self.workflow_uid[:8]}") as executor:
+            while ready or running:
+                self.control_channel.fetch_and_apply()
+                stopping = self.control_channel.status["cancelled"] or self.context.get("workflow_failed")
+
+                if self.control_channel.status["cancelled"] and ready:
+                    logger.warning(f"[CONTROL] Workflow {self.workflow_uid} was cancelled.")
+                    ready.clear()
+
+                if self.control_channel.status["jump_to"]:
+                    logger.warning("[CONTROL] jump_to is not supported for DAG workflows; ignoring")
+                    self.control_channel.status["jump_to"] = None
+
+                while ready and len(running) < width and not stopping and not self.control_channel.status["paused"]:
+                    step_id = ready.pop(0)
+                    started.add(step_id)
 
                     if step_id in self.control_channel.status["skip"]:
                         logger.info(f"[CONTROL] Skipping step {step_id}")
-                        step_id = self.controller.get_next_step(step_id)
+                        finish(step_id)
+                        continue
+
+                    if not self.controller.should_run_step(step_id):
+                        logger.info(f"[DAG] Skipped step {step_id}")
+                        finish(step_id)
                         continue
 
-                    if self.control_channel.status["jump_to"]:
-                        jump_to = self.control_channel.status["jump_to"]
-                        if jump_to in self.controller.steps:
-                            logger.info(f"[CONTROL] Jumping to step {jump_to}")
-                            step_id = jump_to
-                            self.control_channel.status["jump_to"] = None
-                        else:
-                            logger.warning(f"[CONTROL] jump_to target {jump_to} not found")
-                            break
-                        continue                    
+                    logger.info(f"[DAG] Starting step {step_id}")
+                    running[executor.submit(self._run_step, self.controller.get_step(step_id))] = step_id
                     self.lifetime_map["current_step"] = step_id
+                    self.lifetime_map["running_steps"] = sorted(running.values())
                     self._persist_lifetime("step_start")
 
-                    step = self.controller.get_step(step_id)
-
-                    if self.controller.should_run_step(step_id):
-                        try:
-                            result = self._run_step(step)
-
-                        except Exception as e:
-                            logger.error(f"[WF] Step {step['id']} failed: {e}")
-                            self.context.set("workflow_failed", True)
-                            step_id = None
-                            break
-
-                        self.controller.register_step_result(step_id, result)
+                if not running:
+                    if stopping:
+                        break
+                    if self.control_channel.status["paused"]:
+                        logger.info(f"[CONTROL] Workflow {self.workflow_uid} paused.")
+                        time.sleep(1)
+                    continue
 
-                        # Only if no exception: move to next
-                        next_step_id = self.controller.get_next_step(step_id)
-                        logger.info(f"[DEBUG] Completed step {step['id']} → next → {next_step_id}")
-                        step_id = next_step_id
+                done, _ = wait(running, timeout=1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step_id = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.error(f"[DAG] Step {step_id} failed: {e}")
+                        self.context.set("workflow_failed", True)
+                        continue
 
-                    else:
-                        # If step shouldn't run, just go to next
-                        next_step_id = self.controller.get_next_step(step_id)
-                        logger.info(f"[DEBUG] Skipped step {step['id']} → next → {next_step_id}")
-                        step_id = next_step_id
+                    self.controller.register_step_result(step_id, result)
+                    finish(step_id)
+                    logger.info(f"[DAG] Completed step {step_id}")
 
-            finally:
-                if self.context.get("workflow_failed"):
-                    global_handler = self.workflow.get("global_failure_handler")
-                    if global_handler:
-                        logger.info("[WF FAIL] Running global_failure_handler")
-                        try:
-                            if isinstance(global_handler, list):
-                                for handler_step_id in global_handler:
-                                    step_def = self.controller.get_step(handler_step_id)
-                                    self._run_inline_step(step_def)
-                            elif isinstance(global_handler, dict):
-                                self._run_inline_step(global_handler)
-                            else:
-                                logger.warning("[WF FAIL] global_failure_handler has invalid format")
-                        except Exception as e:
-                            logger.exception("[WF FAIL] Global failure handler failed")
-
-                self._persist_lifetime("completed")
-                lifetime_manager.mark_complete(self.workflow_uid)
-                # self._archive_completed_workflow()
-
-                if self.context.get("workflow_failed"):
-                    self.lifetime_map["failure"] = {
-                        "step_id": self.context.get("failed_step_id"),
-                        "reason": self.context.get("failed_reason")
-                    }
-                    logger.info(f"[WF] Workflow {self.workflow_uid} completed WITH FAILURE.")
-                else:
-                    logger.info(f"[WF] Workflow {self.workflow_uid} completed SUCCESSFULLY.")
-        
-        except Exception as e:
-            logger.exception(f"[WF] Workflow {self.workflow_uid} crashed during run(): {e}")
+                if done:
+                    self.lifetime_map["running_steps"] = sorted(running.values())
+                    self._persist_lifetime("dag_progress")
 
     def _run_inline_step(self, step_dict):
         logger.info(f"[INLINE STEP] Running {step_dict['id']}")
@@ -235,61 +394,39 @@ class WorkflowEngine:
         if step_dict["type"] != "action":
             raise ValueError("Only 'action' steps are allowed as inline handlers.")
 
-        action = step_dict["action"]
-        input_data = self._render_input(step_dict.get("input", {}))
+        with executing_step(step_dict["id"]):
+            action = step_dict["action"]
+            input_data = self._render_input(step_dict.get("input", {}))
 
-        if action.startswith("context."):
-            parts = action.split(".")
-            module_name = parts[1]
-            method_name = parts[2]
-            instance = self.context_modules[module_name]
+            if action.startswith("context."):
+                parts = action.split(".")
+                module_name = parts[1]
+                method_name = parts[2]
+                instance = self.context_modules[module_name]
 
-            global_cfg = config.get("module_defaults", {}).get(module_name, {})
-            final_input = merge_module_config(global_cfg, input_data)
-        else:
-            module_name, class_name, method_name = action.split(".")
-            global_cfg = config.get("module_defaults", {}).get(module_name, {})
-            merged_input = merge_module_config(global_cfg, input_data)
+                global_cfg = self.plan.defaults_for(module_name)
+                final_input = merge_module_config(global_cfg, input_data)
+            else:
+                module_name, class_name, method_name = action.split(".")
+                global_cfg = self.plan.defaults_for(module_name)
+                merged_input = merge_module_config(global_cfg, input_data)
 
-            cls = self._load_module(module_name, class_name)
-            instance = cls(self.context, **merged_input)
-            final_input = merged_input
+                cls = self._load_module(module_name, class_name)
+                instance = cls(self.context, **merged_input)
+                final_input = merged_input
 
-        logger.debug(f"[INLINE STEP] Calling {action} with: {final_input}")
-        method = getattr(instance, method_name)
-        return method(**final_input)
+            logger.debug(f"[INLINE STEP] Calling {action} with: {final_input}")
+            method = getattr(instance, method_name)
+            return self._maybe_async(method)(**final_input)
 
 
 
     def _run_step(self, step):
         try:
-            if step["type"] == "action":
-                return self._run_action_step(step)
-            elif step["type"] == "webform":
-                return self._run_webform_step(step)
-            elif step["type"] == "approval":
-                return self._run_approval_step(step)
-            elif step["type"] == "defer":
-                defer_until = resolve_defer_time(step, self.context)
-                now = datetime.utcnow()
-                if defer_until > now:
-                    # Set future time in both context and lifetime
-                    self.context.set("defer_until", defer_until.isoformat())
-                    self.lifetime_map["defer_until"] = defer_until.isoformat()
-
-                    # Move current_step to the next step
-                    next_step = self.get_next_step_id(step["id"])
-                    if not next_step:
-                        raise RuntimeError(f"[DEFER] No next step found after '{step['id']}'")
-
-                    self.lifetime_map["current_step"] = next_step
-                    self.save_lifetime()
-
-                    logger.info(f"[DEFER] Workflow {self.workflow_uid} paused until {defer_until}")
-                    return  # stop execution
-
-            else:
-                raise ValueError(f"Unsupported step type: {step['type']}")
+            with executing_step(step["id"]):
+                return self._dispatch_step(step)
+        except RunParked:
+            raise
         except Exception as e:
             logger.error(f"[STEP FAIL] Step {step['id']} failed: {e}")
             self.context.set("workflow_failed", True)
@@ -302,6 +439,117 @@ class WorkflowEngine:
 
             raise
 
+    def _dispatch_step(self, step):
+        if step["type"] == "action":
+            return self._run_action_step(step)
+        elif step["type"] == "parallel":
+            return self._run_parallel_step(step)
+        elif step["type"] == "foreach":
+            return self._run_foreach_step(step)
+        elif step["type"] == "webform":
+            return self._run_webform_step(step)
+        elif step["type"] == "approval":
+            return self._run_approval_step(step)
+        elif step["type"] == "defer":
+            return self._run_defer_step(step)
+        else:
+            raise ValueError(f"Unsupported step type: {step['type']}")
+
+    def _run_parallel_step(self, step):
+        step_id = step["id"]
+        join = step.get("join", "all")
+        if join not in PARALLEL_JOIN_POLICIES:
+            raise ValueError(f"Unsupported join policy '{join}' in parallel step '{step_id}'")
+
+        children = [c for c in step.get("steps", []) if self.controller.should_run_step(c["id"])]
+        if not children:
+            logger.info(f"[PARALLEL] No runnable child steps in '{step_id}'")
+            return {"status": "ok", "join": join, "results": {}, "errors": {}}
+
+        max_workers = min(int(step.get("max_concurrency") or len(children)), len(children), PARALLEL_MAX_WORKERS)
+        logger.info(f"[PARALLEL] Running {len(children)} steps of '{step_id}' with join={join}, max_concurrency={max_workers}")
+
+        # Children are handed out as slots free up, so none is started once the join policy is met
+        queued = list(children)
+        running = {}  # future → child_id
+        results, errors = {}, {}
+        settled = False
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"parallel-{step_id}") as executor:
+            while queued or running:
+                while queued and len(running) < max_workers and not settled:
+                    child = queued.pop(0)
+                    running[executor.submit(self._run_child_step, child)] = child["id"]
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    child_id = running.pop(future)
+                    try:
+                        result, error = future.result(), None
+                    except Exception as e:
+                        result, error = None, str(e)
+                    if settled:
+                        # Still running when the join was met: awaited, so it never writes after the group returns, but not merged
+                        continue
+                    if error is None:
+                        results[child_id] = result
+                    else:
+                        errors[child_id] = error
+                    settled = join == "any" or (join == "first_success" and error is None)
+
+        if queued:
+            logger.info(f"[PARALLEL] '{step_id}' met join={join}; cancelled {[c['id'] for c in queued]}")
+
+        # Merge in declaration order so step_results does not depend on completion order
+        ordered_results = {c["id"]: results[c["id"]] for c in children if c["id"] in results}
+        ordered_errors = {c["id"]: errors[c["id"]] for c in children if c["id"] in errors}
+        for child_id, result in ordered_results.items():
+            self.controller.register_step_result(child_id, result)
+
+        if join == "all":
+            failed = bool(ordered_errors)
+        elif join == "any":
+            failed = not ordered_results
+        else:
+            failed = not ordered_results and len(ordered_errors) == len(children)
+
+        if failed:
+            raise RuntimeError(f"Parallel step '{step_id}' failed (join={join}): {ordered_errors}")
+
+        group_result = {"status": "ok", "join": join, "results": ordered_results, "errors": ordered_errors}
+        if step.get("register_output"):
+            self.context.set(step["register_output"], group_result)
+            self._persist_lifetime("register_output")
+        return group_result
+
+    def _run_child_step(self, step):
+        # Failures are reported to the parallel group, which decides per join policy whether the workflow fails
+        try:
+            with executing_step(step["id"]):
+                return self._dispatch_step(step)
+        except Exception as e:
+            logger.error(f"[PARALLEL] Child step {step['id']} failed: {e}")
+            if step.get("step_failure_handler"):
+                logger.info(f"[STEP FAIL] Running step_failure_handler for {step['id']}")
+                self._run_inline_step(step["step_failure_handler"])
+            raise
+
+    def _run_defer_step(self, step):
+        step_id = step["id"]
+        if self._resume_results.pop(step_id, None) is None:
+            defer_until = resolve_defer_time(step, self.context.get_all())
+            delay = (defer_until - datetime.utcnow()).total_seconds()
+            if delay > 0:
+                self.context.set("defer_until", defer_until.isoformat())
+                logger.info(f"[DEFER] Workflow {self.workflow_uid} deferred until {defer_until}")
+                if parkable():
+                    # The timer service resumes the run; no thread is held meanwhile
+                    raise RunParked(step_id, "defer", {"wake_at": defer_until.isoformat()})
+                time.sleep(delay)
+
+        return {"status": "resumed", "deferred_until": self.context.get("defer_until")}
+
     def get_next_step_id(self, current_step_id):
         steps = self.workflow.get("steps", [])
         for idx, s in enumerate(steps):
@@ -313,37 +561,54 @@ class WorkflowEngine:
     def _run_webform_step(self, step):
         step_id = step["id"]
         timeout = min(int(step.get("timeout_minutes", 30)), 1440)
-        module = step["module"]
-        config_file = step.get("config_file", "configs/reference_config.js")
-        css_file = step.get("css_file", "custom.css")
+        result = self._resume_results.pop(step_id, None)
 
-        approval_link = f"{BASE_URL}/{module}/{self.workflow_uid}/{step_id}/t.webform.html?config_file={config_file}"
-
-        self.context.set("approval_link", approval_link)
-        self.context.set("webform_config_file", config_file)
-        self.context.set("webform_css_file", css_file)
-
-        # Prepare the event **before** sending delivery
-        future = self.approval_manager.request_approval(
-            uid=self.workflow_uid,
-            step_id=step_id,
-            message=step.get("message", f"Form approval required for {step_id}"),
-            timeout_minutes=timeout,
-            approval_link=approval_link
-        )
-
-        self._persist_lifetime("pre_delivery_context_snapshot")
+        if result is None:
+            config_file = step.get("config_file", "configs/reference_config.js")
+            css_file = step.get("css_file", "custom.css")
+            approval_link = approval_link_for(self.workflow_uid, step)
 
-        # Now run delivery_step if needed
-        delivery = step.get("delivery_step")
-        if delivery:
-            logger.info(f"[WEBFORM] Running delivery step for approval {step_id}")
-            self._run_action_step(delivery)
+            self.context.set("approval_link", approval_link)
+            self.context.set("webform_config_file", config_file)
+            self.context.set("webform_css_file", css_file)
+            # Absolute, so a restart does not grant the form a fresh timeout
+            expires_at = (datetime.utcnow() + timedelta(minutes=timeout)).isoformat()
 
-        logger.info(f"[WEBFORM] Waiting for approval {self.workflow_uid}/{step_id}...")
+            # On the run's main thread the run parks; nested steps keep a blocking wait
+            park = parkable()
+            if park:
+                parking_lot.expect(self.workflow_uid, step_id, "webform")
 
-        # Blocking here until user approves or times out
-        result = self.approval_manager.wait_for_approval(self.workflow_uid, step_id)
+            try:
+                # Prepare the event **before** sending delivery
+                self.approval_manager.request_approval(
+                    uid=self.workflow_uid,
+                    step_id=step_id,
+                    message=step.get("message", f"Form approval required for {step_id}"),
+                    timeout_minutes=timeout,
+                    approval_link=approval_link,
+                    expires_at=expires_at,
+                    wait=not park
+                )
+
+                self._persist_lifetime("pre_delivery_context_snapshot")
+
+                # Now run delivery_step if needed
+                delivery = step.get("delivery_step")
+                if delivery:
+                    logger.info(f"[WEBFORM] Running delivery step for approval {step_id}")
+                    self._run_action_step(delivery)
+            except Exception:
+                parking_lot.discard(self.workflow_uid, step_id)
+                raise
+
+            if park:
+                raise RunParked(step_id, "webform", {"timeout_minutes": timeout, "expires_at": expires_at})
+
+            logger.info(f"[WEBFORM] Waiting for approval {self.workflow_uid}/{step_id}...")
+
+            # Blocking here until user approves or times out
+            result = self.approval_manager.wait_for_approval(self.workflow_uid, step_id)
 
         if step.get("register_output"):
             self.context.set(step["register_output"], result)
@@ -356,30 +621,23 @@ class WorkflowEngine:
 
 
     def _wait_for_context_keys(self, keys, timeout_sec=5):
-        import time
         start = time.time()
-        while True:
+        # Woken by the write that sets the last missing key, not by polling
+        if not self.context.wait_for(keys, timeout=timeout_sec):
             missing = [k for k in keys if k not in self.context.get_all()]
-            if not missing:
-                return
-            if time.time() - start > timeout_sec:
-                raise TimeoutError(f"Timed out waiting for context keys: {missing}")
-            time.sleep(0.1)
+            raise TimeoutError(f"Timed out waiting for context keys: {missing}")
         logger.info(f"[WF] Waited {round(time.time() - start, 2)}s for context keys: {keys}")
 
 
 
     def _get_missing_context_keys(self, input_dict):
-        from jinja2 import meta
-
-        env = Environment()
         missing = []
         context_keys = self.context.get_all().keys()
 
         for val in input_dict.values():
-            if isinstance(val, str):
-                ast = env.parse(val)
-                variables = meta.find_undeclared_variables(ast)
+            # Rendered values only need a parse if they still carry template markup
+            if isinstance(val, str) and ("{{" in val or "{%" in val):
+                variables = template_cache.undeclared_variables(val)
                 for v in variables:
                     if v not in context_keys:
                         missing.append(v)
@@ -389,8 +647,33 @@ class WorkflowEngine:
 
 
     def _run_action_step(self, step):
+        # Durability barrier: the state leading up to an external side effect is on disk before it happens
+        lifetime_manager.flush(self.workflow_uid)
+        result = self._call_action(step)
+
+        if isinstance(result, dict) and result.get("status") == "fail":
+            logger.error(f"[STEP FAIL] Module returned failure status at step {step['id']}: {result.get('message')}")
+            raise Exception(f"Step '{step['id']}' failed according to module result: {result.get('message')}")
+
+        if step.get("register_output"):
+            self.context.set(step["register_output"], result)
+            self._persist_lifetime("register_output")
+
+        for var in step.get("register_vars", []):
+            self._register_variable(var)
+
+        return result
+
+    def _call_action(self, step, scope=None):
+        """Render the step input (plus any per-item `scope` variables) and invoke the module method."""
+        method, safe_input = self._prepare_action(step, scope)
+        # Large outputs (response bodies, stdout) go to the artifact store; the context keeps a reference
+        return artifact_store.spill(self._maybe_async(method)(**safe_input))
+
+    def _prepare_action(self, step, scope=None):
+        """Resolve a step's bound module method and the input it accepts, without calling it."""
         action = step["action"]
-        input_data = self._render_input(step.get("input", {}))
+        input_data = self._render_input(step.get("input", {}), scope)
 
         # Wait until all context variables in the input are available
         missing_keys = self._get_missing_context_keys(input_data)
@@ -406,7 +689,7 @@ class WorkflowEngine:
             merged_input = input_data
         else:
             module_name, class_name, method_name = action.split(".")
-            global_cfg = config.get("module_defaults", {}).get(module_name, {})
+            global_cfg = self.plan.defaults_for(module_name)
             step_cfg = input_data
             merged_input = merge_module_config(global_cfg, step_cfg)
 
@@ -416,59 +699,176 @@ class WorkflowEngine:
         method = getattr(instance, method_name)
 
         # Filter input args for the method signature
-        from inspect import signature
-        sig = signature(method)
-        accepted_args = set(sig.parameters.keys())
+        accepted_args = self.plan.accepted_args(instance, method_name)
         safe_input = {k: v for k, v in merged_input.items() if k in accepted_args}
 
         logger.debug(f"[STEP] Executing {action} with args: {safe_input}")
-        result = self._maybe_async(method)(**safe_input)
+        return method, safe_input
 
-        if isinstance(result, dict) and result.get("status") == "fail":
-            logger.error(f"[STEP FAIL] Module returned failure status at step {step['id']}: {result.get('message')}")
-            self.context.set("workflow_failed", True)
-            self.context.set("failed_step_id", step["id"])
-            self.context.set("failed_reason", result.get("message", "Module reported failure."))
-            raise Exception(f"Step '{step['id']}' failed according to module result: {result.get('message')}")
+    def _prepare_item_action(self, step_id, item_step, scope):
+        with executing_step(step_id):
+            return self._prepare_action(item_step, scope)
+
+    def _is_async_action(self, action):
+        if action.startswith("context."):
+            _, module_name, method_name = action.split(".")
+            return inspect.iscoroutinefunction(getattr(self.context_modules[module_name], method_name, None))
+        module_name, class_name, method_name = action.split(".")
+        cls = self._load_module(module_name, class_name)
+        return inspect.iscoroutinefunction(getattr(cls, method_name, None))
+
+    def _run_foreach_step(self, step):
+        step_id = step["id"]
+        item_step = step.get("step")
+        if not item_step or item_step.get("type") != "action":
+            raise ValueError(f"Foreach step '{step_id}' requires an action 'step' to apply to each item")
+
+        fail_on = step.get("fail_on", "never")
+        if fail_on not in FOREACH_FAIL_POLICIES:
+            raise ValueError(f"Unsupported fail_on policy '{fail_on}' in foreach step '{step_id}'")
+
+        expression = step["items"].strip()
+        if expression.startswith("{{") and expression.endswith("}}"):
+            expression = expression[2:-2].strip()
+        items = template_cache.evaluate(expression, context=self.context.get_all())
+        if isinstance(items, dict):
+            items = list(items.items())
+        if not isinstance(items, (list, tuple)):
+            raise ValueError(f"Foreach step '{step_id}': '{step['items']}' evaluated to {type(items).__name__}, expected a list")
+
+        item_var = step.get("as", "item")
+        if self._is_async_action(item_step["action"]):
+            outcomes = async_runtime.run(self._run_foreach_items_async(step, items, item_var))
+        else:
+            outcomes = self._run_foreach_items(step, items, item_var)
+
+        results, failures, skipped = [], [], []
+        for index, (state, value) in enumerate(outcomes):
+            results.append(value if state == "ok" else None)
+            if state == "failed":
+                failures.append({"index": index, "item": items[index], "error": value})
+            elif state == "skipped":
+                skipped.append(index)
+
+        executed = len(items) - len(skipped)
+        if not failures:
+            status = "ok"
+        elif len(failures) == executed:
+            status = "fail"
+        else:
+            status = "partial"
+        aggregate = {"status": status, "results": results, "failures": failures, "skipped": skipped}
 
         if step.get("register_output"):
-            self.context.set(step["register_output"], result)
+            self.context.set(step["register_output"], aggregate)
             self._persist_lifetime("register_output")
 
-        for var in step.get("register_vars", []):
-            self._register_variable(var)
+        if failures and (fail_on == "any" or (fail_on == "all" and len(failures) == executed)):
+            raise RuntimeError(f"Foreach step '{step_id}' failed for {len(failures)} of {executed} items")
+
+        return aggregate
 
-        return result
 
 
 
+    def _run_foreach_items(self, step, items, item_var):
+        step_id = step["id"]
+        item_step = step["step"]
+        max_workers = min(int(step.get("max_parallel", 1)), PARALLEL_MAX_WORKERS, len(items)) or 1
+        logger.info(f"[FOREACH] Step '{step_id}' applying {item_step['action']} to {len(items)} items (max_parallel={max_workers})")
+
+        def run_item(index, item):
+            scope = {item_var: item, "index": index}
+            if not self.controller.should_run_item(step_id, scope):
+                return "skipped", None
+            with executing_step(step_id):
+                result = self._call_action(item_step, scope)
+            if isinstance(result, dict) and result.get("status") == "fail":
+                raise Exception(result.get("message", "Module reported failure."))
+            return "ok", result
+
+        outcomes = [None] * len(items)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"foreach-{step_id}") as executor:
+            futures = {executor.submit(run_item, i, item): i for i, item in enumerate(items)}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    outcomes[index] = future.result()
+                except Exception as e:
+                    logger.error(f"[FOREACH] Item {index} of '{step_id}' failed: {e}")
+                    outcomes[index] = "failed", str(e)
+        return outcomes
+
+    async def _run_foreach_items_async(self, step, items, item_var):
+        """Coroutine item methods: every item is awaited on the shared loop, `max_parallel` at a time."""
+        step_id = step["id"]
+        item_step = step["step"]
+        limit = min(int(step.get("max_parallel", 1)), ASYNC_MAX_INFLIGHT) or 1
+        semaphore = asyncio.Semaphore(limit)
+        logger.info(f"[FOREACH] Step '{step_id}' awaiting {item_step['action']} for {len(items)} items (max_parallel={limit})")
+
+        async def run_item(index, item):
+            scope = {item_var: item, "index": index}
+            async with semaphore:
+                try:
+                    if not self.controller.should_run_item(step_id, scope):
+                        return "skipped", None
+                    # Rendering may wait for context keys, so it runs off the loop
+                    method, safe_input = await async_runtime.to_thread(self._prepare_item_action, step_id, item_step, scope)
+                    result = artifact_store.spill(await method(**safe_input))
+                    if isinstance(result, dict) and result.get("status") == "fail":
+                        raise Exception(result.get("message", "Module reported failure."))
+                    return "ok", result
+                except Exception as e:
+                    logger.error(f"[FOREACH] Item {index} of '{step_id}' failed: {e}")
+                    return "failed", str(e)
+
+        return await asyncio.gather(*(run_item(i, item) for i, item in enumerate(items)))
 
     def _run_approval_step(self, step):
         step_id = step["id"]
         timeout = min(int(step.get("timeout_minutes", 30)), 1440)
         message = step.get("message", "Approval required")
+        result = self._resume_results.pop(step_id, None)
 
-        # Generate approval link
-        approval_link = f"{BASE_URL}/api/approve/{self.workflow_uid}/{step_id}"
-        self.context.set("approval_link", approval_link)
-
-        # Run delivery_step first (optional)
-        delivery = step.get("delivery_step")
-        if delivery:
-            self._run_action_step(delivery)
+        if result is None:
+            # Generate approval link
+            approval_link = approval_link_for(self.workflow_uid, step)
+            self.context.set("approval_link", approval_link)
+            # Absolute, so a restart does not grant the approval a fresh timeout
+            expires_at = (datetime.utcnow() + timedelta(minutes=timeout)).isoformat()
 
-        # Send to Flask
-        future = self.approval_manager.request_approval(
-            uid=self.workflow_uid,
-            step_id=step_id,
-            message=message,
-            timeout_minutes=timeout,
-            approval_link=approval_link,
-            delivery_step=step.get("delivery_step"),
-            context_snapshot=self.context.get_all()
-        )
+            # On the run's main thread the run parks; nested steps keep a blocking wait
+            park = parkable()
+            if park:
+                parking_lot.expect(self.workflow_uid, step_id, "approval")
 
-        result = self.approval_manager.wait_for_approval(self.workflow_uid, step_id)
+            try:
+                # Run delivery_step first (optional)
+                delivery = step.get("delivery_step")
+                if delivery:
+                    self._run_action_step(delivery)
+
+                # Send to Flask
+                self.approval_manager.request_approval(
+                    uid=self.workflow_uid,
+                    step_id=step_id,
+                    message=message,
+                    timeout_minutes=timeout,
+                    approval_link=approval_link,
+                    delivery_step=step.get("delivery_step"),
+                    context_snapshot=self.context.snapshot(),
+                    expires_at=expires_at,
+                    wait=not park
+                )
+            except Exception:
+                parking_lot.discard(self.workflow_uid, step_id)
+                raise
+
+            if park:
+                raise RunParked(step_id, "approval", {"timeout_minutes": timeout, "expires_at": expires_at})
+
+            result = self.approval_manager.wait_for_approval(self.workflow_uid, step_id)
         self._persist_lifetime("approval_result")
         self.controller.register_step_result(step_id, result)
 
@@ -482,18 +882,19 @@ class WorkflowEngine:
 
         if "value" in var:
             try:
-                val = Template(var["value"]).render(context=self.context.get_all())
-                self.context.set(name, val)
+                val = template_cache.render(var["value"], context=self.context.get_all())
+                # A value rendered from a spilled output is as large as that output
+                self.context.set(name, artifact_store.spill(val))
             except Exception as e:
                 if absent_action == "fail":
                     raise ValueError(f"Failed to render value for var '{name}': {e}")
         elif "conditional" in var:
             for case in var["conditional"]:
                 try:
-                    if "if" in case and eval(Template(case["if"]).render(context=self.context.get_all())):
+                    if "if" in case and eval(template_cache.render(case["if"], context=self.context.get_all())):
                         self.context.set(name, case["value"])
                         return
-                    elif "elif" in case and eval(Template(case["elif"]).render(context=self.context.get_all())):
+                    elif "elif" in case and eval(template_cache.render(case["elif"], context=self.context.get_all())):
                         self.context.set(name, case["value"])
                         return
                 except Exception as e:
@@ -507,39 +908,37 @@ class WorkflowEngine:
 
         self._persist_lifetime("register_var")
 
-    def _render_input(self, input_dict):
+    def _render_input(self, input_dict, scope=None):
+        variables = dict(scope or {}, context=self.context.get_all())
         rendered = {}
         for k, v in input_dict.items():
             if isinstance(v, str):
-                rendered[k] = Template(v).render(context=self.context.get_all())
+                rendered[k] = self.plan.template(v).render(**variables)
             elif isinstance(v, list):
-                rendered[k] = [Template(str(item)).render(context=self.context.get_all()) for item in v]
+                rendered[k] = [self.plan.template(str(item)).render(**variables) for item in v]
             else:
                 rendered[k] = v
         return rendered
 
     def _load_module(self, module_name, class_name):
-        mod_path = os.path.join(self.modules_base_path, module_name, f"{class_name.lower()}.py")
-        spec = importlib.util.spec_from_file_location(class_name, mod_path)
-        mod = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(mod)
-
-        cls = getattr(mod, class_name)
-        return cls  # Return the class, not instance
+        # Imported once per process; re-imported only when the module file changes
+        return module_registry.load_class(module_name, class_name, self.modules_base_path)  # Return the class, not instance
 
 
     def _maybe_async(self, func):
         if inspect.iscoroutinefunction(func):
-            return func
-        def wrapper(*args, **kwargs):
-            return func(*args, **kwargs)
-        return wrapper
+            # Awaited on the shared event loop; the calling step thread just waits for the result
+            def wrapper(*args, **kwargs):
+                return async_runtime.run(func(*args, **kwargs))
+            return wrapper
+        return func
 
     def _persist_lifetime(self, reason=None):
-        self.lifetime_map["context"] = self.context.get_all()
+        # An O(1) immutable context version; the writer serializes it while the run moves on
+        self.lifetime_map["context"] = self.context.snapshot()
         self.lifetime_map["last_updated"] = datetime.utcnow().isoformat()
         self.lifetime_map["reason"] = reason
-        lifetime_manager.update(self.workflow_uid, self.lifetime_map)
+        lifetime_manager.update(self.workflow_uid, dict(self.lifetime_map))
 
 
     def rehydrate_pending_approval(self, step_id):
@@ -550,15 +949,7 @@ class WorkflowEngine:
 
         logger.info(f"[RECOVERY] Rehydrating approval step: {step_id}")
         timeout = min(int(step.get("timeout_minutes", 30)), 1440)
-
-        if step["type"] == "approval":
-            approval_link = f"{BASE_URL}/api/approve/{self.workflow_uid}/{step_id}"
-        elif step["type"] == "webform":
-            module = step.get("module")
-            config_file = step.get("config_file", "configs/reference_config.js")
-            approval_link = f"{BASE_URL}/{module}/{self.workflow_uid}/{step_id}/t.webform.html?config_file={config_file}"
-        else:
-            raise Exception(f"Unknown step type for rehydration: {step['type']}")
+        approval_link = approval_link_for(self.workflow_uid, step)
 
         # Set in context for future access
         self.context.set("approval_link", approval_link)
@@ -570,25 +961,10 @@ class WorkflowEngine:
             message=f"Recovered approval: {step_id}",
             timeout_minutes=timeout,
             approval_link=approval_link,
-            context_snapshot=self.context.get_all()
+            context_snapshot=self.context.snapshot()
         )
 
         logger.info(f"[RECOVERY] Approval route re-registered for {self.workflow_uid}/{step_id}")
 
 
-    def _archive_completed_workflow(self):
-        completed_dir = os.path.join(config["directories"]["lifetimes"], "completed")
-        os.makedirs(completed_dir, exist_ok=True)
-
-        src_path = os.path.join(config["directories"]["lifetimes"], f"{self.workflow_uid}.yaml")
-        dst_path = os.path.join(completed_dir, f"{self.workflow_uid}.yaml")
-
-        try:
-            if os.path.exists(src_path):
-                os.rename(src_path, dst_path)
-                logger.info(f"[WF] Archived completed workflow to: {dst_path}")
-            else:
-                logger.warning(f"[WF] Could not archive: source not found {src_path}")
-        except Exception as e:
-            logger.error(f"[WF] Archiving failed: {e}")
 
@@ -85,6 +85,32 @@ def validate_step(step, modules_dir, context_modules):
     if 'id' not in step or 'type' not in step:
         return False, f"Step missing 'id' or 'type': {step}"
 
+    if step['type'] == 'parallel':
+        children = step.get('steps', [])
+        if not children:
+            return False, f"Parallel step '{step['id']}' must define child 'steps'"
+        for child in children:
+            ok, msg = validate_step(child, modules_dir, context_modules)
+            if not ok:
+                return False, f"In parallel step '{step['id']}': {msg}"
+        return True, f"Parallel step '{step['id']}' validated successfully ({len(children)} child steps)"
+
+    if step['type'] == 'foreach':
+        item_step = step.get('step')
+        if not step.get('items') or not item_step:
+            return False, f"Foreach step '{step['id']}' requires 'items' and 'step'"
+        if item_step.get('type') != 'action':
+            return False, f"Foreach step '{step['id']}' can only apply an 'action' step to each item"
+        ok, msg = validate_step(item_step, modules_dir, context_modules)
+        if not ok:
+            return False, f"In foreach step '{step['id']}': {msg}"
+        return True, f"Foreach step '{step['id']}' validated successfully"
+
+    if step['type'] == 'defer':
+        if ('time' in step) == ('minutes_from_now' in step):
+            return False, f"Defer step '{step['id']}' requires exactly one of 'time' or 'minutes_from_now'"
+        return True, f"Defer step '{step['id']}' validated successfully"
+
     action_str = step.get('action') or step.get('config', {}).get('action')
     if not action_str:
         return True, f"Step '{step['id']}' is valid (no action to validate)"
@@ -114,6 +140,42 @@ def validate_step(step, modules_dir, context_modules):
 
     return True, f"Step '{step['id']}' validated successfully"
 
+def iter_step_ids(step):
+    # Parallel and foreach steps contribute their children's ids to the workflow-wide namespace
+    yield step.get('id')
+    for child in step.get('steps', []):
+        yield from iter_step_ids(child)
+    if isinstance(step.get('step'), dict):
+        yield from iter_step_ids(step['step'])
+
+def validate_dependencies(steps):
+    # Steps without depends_on implicitly depend on the step declared before them
+    dependencies = {}
+    for i, step in enumerate(steps):
+        if 'depends_on' in step:
+            deps = step.get('depends_on') or []
+        else:
+            deps = [steps[i - 1]['id']] if i > 0 else []
+        for dep in deps:
+            if dep not in {s['id'] for s in steps}:
+                return False, f"Step '{step['id']}' depends on unknown step '{dep}'"
+        dependencies[step['id']] = deps
+
+    indegree = {sid: len(deps) for sid, deps in dependencies.items()}
+    queue = [sid for sid, degree in indegree.items() if degree == 0]
+    while queue:
+        done = queue.pop()
+        for sid, deps in dependencies.items():
+            if done in deps:
+                indegree[sid] -= 1
+                if indegree[sid] == 0:
+                    queue.append(sid)
+
+    cycle = [sid for sid, degree in indegree.items() if degree > 0]
+    if cycle:
+        return False, f"Dependency cycle between steps: {', '.join(cycle)}"
+    return True, "Step dependencies form a DAG"
+
 def validate_workflow_deep(args):
     raw = load_yaml(args.workflow)
     schema_path = os.path.join(os.path.dirname(__file__), "dsl.schema.json")
@@ -131,10 +193,11 @@ def validate_workflow_deep(args):
 
     step_ids = set()
     for step in workflow['steps']:
-        if step['id'] in step_ids:
-            print(f"[FAIL] Duplicate step ID: {step['id']}")
-            raise SawectlValidationError(f"[FAIL] Duplicate step ID: {step['id']}")
-        step_ids.add(step['id'])
+        for sid in iter_step_ids(step):
+            if sid in step_ids:
+                print(f"[FAIL] Duplicate step ID: {sid}")
+                raise SawectlValidationError(f"[FAIL] Duplicate step ID: {sid}")
+            step_ids.add(sid)
 
         ok, msg = validate_step(step, modules_dir, context_modules)
         if not ok:
@@ -143,6 +206,14 @@ def validate_workflow_deep(args):
         elif args.verbose:
             print(f"[OK] {msg}")
 
+    if any('depends_on' in step for step in workflow['steps']):
+        ok, msg = validate_dependencies(workflow['steps'])
+        if not ok:
+            print(f"[FAIL] {msg}")
+            raise SawectlValidationError(f"[FAIL] {msg}")
+        elif args.verbose:
+            print(f"[OK] {msg}")
+
     for cm_id, cm_conf in context_modules.items():
         ref = cm_conf.get('module')
         if not ref:
@@ -2,7 +2,6 @@
 
 from flask import Flask, request, jsonify
 import os
-import yaml
 import threading
 import time
 import uuid
@@ -12,9 +11,22 @@ from engine.utils import match_engine
 from engine.utils.recovery_loader import discover_recoverable_runs, resume_workflow_from_lifetime
 from engine.approval.approval_channel import approval_request_q, approval_result_q
 from engine.approval.approval_manager import ApprovalManager
-from engine.we import WorkflowEngine
+from engine.utils.template_cache import template_cache
+from engine.utils.async_runtime import async_runtime
+from engine.utils.module_loader import module_registry
+from engine.utils.run_executor import run_executor, run_registry, submit_workflow, RunQueueFull, RunDropped, PRIORITY_LANES
+from engine.utils.concurrency_manager import concurrency_manager
+from engine.utils.parking import parking_lot
+from engine.utils.timer_service import timer_service
+from engine.utils.cron_scheduler import cron_scheduler
+from engine.utils.git_mirror import git_mirrors
+from engine.utils.push_index import push_index, changed_paths_of
+from engine.utils.workflow_catalog import workflow_catalog
+from engine.state.lifetime_manager import lifetime_manager
+from engine.state.definition_store import definition_store, workflow_of
+from engine.state.artifact_store import artifact_store
 from git import Repo, GitCommandError
-from engine.utils.trigger_loader import initialize_triggers
+from engine.utils.trigger_loader import initialize_triggers, trigger_registry
 from waitress import serve
 from korectl.korectl import validate_workflow_from_file
 import engine.management.mock_md_server as mock_md_server
@@ -25,7 +37,6 @@ config = get_config()
 
 logger = get_logger("flask_app")
 
-running_engines = {}  # uid → engine
 from flask import request
 
 AIAGENT_INPUTS = {}  # Key: (uid, step_id) → dict
@@ -42,8 +53,6 @@ except Exception as e:
     raise e
 
 approval_routes = {}
-is_workflow_running = False
-engine_paused = False
 
 
 # Init approval manager
@@ -53,6 +62,7 @@ def handle_approval_hit(uid, step_id):
     logger.info(f"[WEB SERVER] Approval clicked: {uid}/{step_id}")
     route_key = f"/api/approve/{uid}/{step_id}"
     approval_routes.pop(route_key, None)
+    timer_service.cancel(approval_timer_id(uid, step_id))
     logger.info(f"[WEB SERVER] Approval route {route_key} removed")
     approval_manager.resolve(uid, step_id, "approved")
     # Notify the approval manager
@@ -63,22 +73,32 @@ def handle_approval_hit(uid, step_id):
     })
 
 
-def register_approval_route(uid, step_id, timeout_minutes):
+def approval_timer_id(uid, step_id):
+    return f"approval:{uid}:{step_id}"
+
+
+def expire_approval(payload):
+    uid, step_id = payload["uid"], payload["step_id"]
+    approval_routes.pop(f"/api/approve/{uid}/{step_id}", None)
+    if approval_manager.resolve(uid, step_id, "timeout", interactive=False):
+        logger.info(f"[APPROVAL] {uid}/{step_id} timed out")
+
+timer_service.register("approval_timeout", expire_approval)
+
+
+def register_approval_route(uid, step_id, timeout_minutes, expires_at=None):
     logger.info(f"Registering approval route for {uid} at step {step_id} with timeout {timeout_minutes} minutes")
     route_key = f"/api/approve/{uid}/{step_id}"
     approval_routes[route_key] = True
-
-    def expire():
-        time.sleep(timeout_minutes * 60)
-        if route_key in approval_routes:
-            approval_result_q.put({
-                "uid": uid,
-                "step_id": step_id,
-                "status": "timeout"
-            })
-            approval_routes.pop(route_key, None)
-
-    threading.Thread(target=expire, daemon=True).start()
+    # A route re-registered after a restart keeps its original deadline: the persisted
+    # `expires_at`, which also re-arms a timer that fired before the run was restored
+    timer_service.schedule(
+        approval_timer_id(uid, step_id),
+        expires_at or time.time() + timeout_minutes * 60,
+        "approval_timeout",
+        {"uid": uid, "step_id": step_id},
+        replace=False
+    )
 
 def approval_listener():
     while True:
@@ -89,7 +109,8 @@ def approval_listener():
                 register_approval_route(
                     uid=request_data["uid"],
                     step_id=request_data["step_id"],
-                    timeout_minutes=min(request_data.get("timeout_minutes", 30), 1440)
+                    timeout_minutes=min(request_data.get("timeout_minutes", 30), 1440),
+                    expires_at=request_data.get("expires_at")
                 )
                 logger.info(f"[APPROVAL] Registered route for {request_data['uid']}/{request_data['step_id']}")
         except Exception as e:
@@ -105,21 +126,48 @@ def handle_approval(uid, step_id):
 
 
 
+@app.route("/api/gitops/push", methods=["POST"])
+def handle_gitops_push():
+    """GitHub push webhook: dispatch only the webhook gitops workflows whose watched files changed."""
+    event = request.headers.get("X-GitHub-Event", "push")
+    if event == "ping":
+        return jsonify({"status": "pong"})
+    if event != "push":
+        return jsonify({"status": "ignored", "event": event}), 202
+
+    body = request.get_json(silent=True) or {}
+    slug = (body.get("repository") or {}).get("full_name")
+    ref = body.get("ref", "")
+    if not slug or not ref.startswith("refs/heads/"):
+        return jsonify({"status": "ignored", "message": "Not a branch push"}), 202
+
+    branch = ref[len("refs/heads/"):]
+    changed = changed_paths_of(body)
+    results = {}
+    for wf_id, entry in push_index.match(slug, branch, changed):
+        args = (entry["workflow_dict"], {"payload": body}, entry["approval_manager"])
+        try:
+            results[wf_id] = {"status": "accepted", "workflow_uid": submit_workflow(*args, modules_base_path=MODULES_BASE)}
+        except RunDropped as e:
+            results[wf_id] = {"status": "dropped", "message": str(e)}
+        except RunQueueFull:
+            # The push is not redelivered, so wait for queue room instead of refusing it
+            threading.Thread(target=submit_workflow, args=args, kwargs={"modules_base_path": MODULES_BASE, "block": True}, daemon=True).start()
+            results[wf_id] = {"status": "queued"}
+
+    logger.info(f"[GITOPS] Push to {slug}@{branch} ({len(changed)} paths) → {list(results) or 'no workflows'}")
+    return jsonify({"status": "ok", "repository": slug, "branch": branch, "workflows": results}), 202
+
+
 @app.route("/api/<repo>/<workflow>", methods=["POST"])
 def handle_workflow_request(repo, workflow):
     try:
         workflow_file = os.path.join(WORKFLOWS_BASE, repo, f"{workflow}.yaml")
-        if not os.path.isfile(workflow_file):
+        # Parsed once per file version by the catalog; a stat per request otherwise
+        workflow_dict = workflow_catalog.load(workflow_file)
+        if workflow_dict is None:
             return jsonify({"status": "error", "message": "Workflow not found"}), 404
 
-        with open(workflow_file, "r") as f:
-            workflow_dict = yaml.safe_load(f)
-
-        payload = {"payload": request.get_json()}
-
-        with open(workflow_file, "r") as f:
-            workflow_dict = yaml.safe_load(f)
-
         # ssign a UID externally to ensure consistency
         uid = str(uuid.uuid4())
         workflow_dict["uid"] = uid
@@ -135,8 +183,18 @@ def handle_workflow_request(repo, workflow):
             workflow_dict["access_key"] = access_key
             payload["access_key"] = access_key
 
+        # Per-request lane override; otherwise the workflow's priority / trigger type decides
+        priority = request.args.get("priority") or request.headers.get("X-Koreflow-Priority")
+        if priority and priority not in PRIORITY_LANES:
+            return jsonify({"status": "error", "message": f"Unknown priority '{priority}'. Must be one of {PRIORITY_LANES}"}), 400
+
         # Proceed with execution
-        run_workflow_async(workflow_dict, payload)
+        try:
+            submit_workflow(workflow_dict, payload, approval_manager, modules_base_path=MODULES_BASE, priority=priority)
+        except RunQueueFull as e:
+            return _queue_full_response(e)
+        except RunDropped as e:
+            return jsonify({"status": "dropped", "message": str(e)}), 409
         response = {"status": "accepted", "workflow_uid": uid}
         if workflow_type == "aiagent":
             response["access_key"] = access_key
@@ -147,28 +205,18 @@ def handle_workflow_request(repo, workflow):
         return jsonify({"status": "error", "error": str(e)}), 500
 
 
-def run_workflow_async(workflow_dict, payload):
-    def thread_runner():
-        global is_workflow_running, engine_paused
-        while engine_paused:
-            logger.info("[ENGINE] Engine paused. Waiting before running workflow...")
-            time.sleep(1)
-        is_workflow_running = True
-        try:
-            engine = WorkflowEngine(approval_manager, workflow_dict, payload, modules_base_path=MODULES_BASE)
-            running_engines[engine.workflow_uid] = engine
-            engine.run()
-        finally:
-            is_workflow_running = False
-            running_engines.pop(engine.workflow_uid, None)
-
-    threading.Thread(target=thread_runner, daemon=True).start()
+def _queue_full_response(error):
+    response = jsonify({
+        "status": "busy",
+        "message": str(error),
+        "retry_after_seconds": error.retry_after
+    })
+    return response, 429, {"Retry-After": str(error.retry_after)}
 
 
 @app.route("/api/sync/<target>", methods=["POST"])
 def sync(target):
-    global engine_paused, is_workflow_running
-    if is_workflow_running:
+    if run_registry.count("running"):
         return jsonify({"status": "error", "message": "Workflows are currently running. Cannot sync now."}), 409
 
     if target not in ["modules", "workflows", "all"]:
@@ -176,7 +224,7 @@ def sync(target):
 
     try:
         logger.info(f"[SYNC] Starting sync for {target}...")
-        engine_paused = True
+        run_executor.pause()
 
         if target == "modules":
             poll_modules(poll_modules=True, poll_workflows=False)
@@ -187,6 +235,13 @@ def sync(target):
         else:
             return jsonify({"status": "error", "message": f"Unsupported target '{target}'. Must be 'modules' or 'workflows'."}), 400
 
+        if target in ["modules", "all"]:
+            module_registry.invalidate()
+        if target in ["workflows", "all"]:
+            # Re-index only the workflow files the sync changed, and start/stop their triggers
+            workflow_catalog.refresh()
+            trigger_registry.rescan()
+
         logger.info(f"[SYNC] {target} sync completed successfully.")
         return jsonify({"status": "ok", "synced": target})
 
@@ -195,38 +250,82 @@ def sync(target):
         return jsonify({"status": "error", "message": str(e)}), 500
 
     finally:
-        engine_paused = False
+        run_executor.resume()
 
 
 @app.route("/api/system/status", methods=["GET"])
 def system_status():
-    global engine_paused, is_workflow_running
     status = {
-        "engine_paused": engine_paused,
-        "is_workflow_running": is_workflow_running
+        "engine_paused": run_executor.paused,
+        "is_workflow_running": run_registry.count("running") > 0,
+        "runs": run_registry.stats(),
+        "executor": run_executor.stats(),
+        "concurrency": concurrency_manager.stats(),
+        "parking": parking_lot.stats(),
+        "template_cache": template_cache.stats(),
+        "async_runtime": async_runtime.stats(),
+        "timers": timer_service.stats(),
+        "cron": cron_scheduler.stats(),
+        "git_mirrors": git_mirrors.stats(),
+        "push_index": push_index.stats(),
+        "triggers": trigger_registry.stats(),
+        "workflow_catalog": workflow_catalog.stats(),
+        "lifetimes": lifetime_manager.stats(),
+        "definitions": definition_store.stats(),
+        "artifacts": artifact_store.stats()
     }
     return jsonify(status)
 
 
-def resume_pending_workflows():
-    runs = discover_recoverable_runs()
-    for run in runs:
+@app.route("/api/system/runs", methods=["GET"])
+def active_runs():
+    return jsonify({"runs": run_registry.list_runs()})
+
+
+@app.route("/api/system/modules", methods=["GET"])
+def loaded_modules():
+    return jsonify({
+        "generation": module_registry.generation,
+        "modules": module_registry.list_loaded()
+    })
+
+
+def resume_parked_run(lifetime_map, interactive):
+    # Continuations of human actions go on the interactive lane; timer wakes go back to the run's own lane
+    priority = "interactive" if interactive else None
+    try:
+        resume_workflow_from_lifetime(lifetime_map, approval_manager, priority=priority)
+    except RunQueueFull:
         threading.Thread(
             target=resume_workflow_from_lifetime,
-            args=(run, approval_manager),
+            args=(lifetime_map, approval_manager),
+            kwargs={"block": True, "priority": priority},
             daemon=True
         ).start()
 
+parking_lot.resume_handler = resume_parked_run
+
+
+def resume_pending_workflows():
+    runs = discover_recoverable_runs()
+
+    def resume_all():
+        # Blocks on a full queue instead of dropping recovered runs
+        for run in runs:
+            try:
+                resume_workflow_from_lifetime(run, approval_manager, block=True)
+            except Exception as e:
+                logger.exception(f"[RECOVERY] Failed to resume {run.get('uid')}: {e}")
+
+    threading.Thread(target=resume_all, daemon=True).start()
+
 
 @app.route("/<module>/<uid>/<step_id>/submit", methods=["POST"])
 def handle_module_submit(module, uid, step_id):
     data = request.get_json()
-    payload = {
-        "step_id": step_id,
-        "form_data": data
-    }
-    approval_manager.resolve(uid, step_id, payload)
-    approval_result_q.put(payload)
+    if not approval_manager.resolve(uid, step_id, "submitted", form_data=data):
+        return jsonify({"status": "error", "message": "No pending form for this step"}), 404
+    timer_service.cancel(approval_timer_id(uid, step_id))
     return jsonify({"status": "submitted", "handler": module})
 
 # Fully self-describing module structure
@@ -288,10 +387,9 @@ def agent_jump(run_id, step_id):
 def _agent_control(run_id, command):
     access_key = request.headers.get("X-Access-Key")
     # Optionally check access_key against stored value here
-    engine = running_engines.get(run_id)
-    if not engine:
+    # Queued and parked runs get the command once they have an engine again
+    if not run_registry.send(run_id, command):
         return jsonify({"status": "error", "message": "Workflow not found or not running"}), 404
-    engine.control_channel.send(command)
     return jsonify({"status": "ok", "command": command})
 
 
@@ -330,6 +428,8 @@ def upload_workflow_yaml(repo, workflow):
             }), 400
 
         logger.info(f"[LINT] Workflow '{workflow}' validated successfully")
+        workflow_catalog.refresh_file(wf_path)
+        trigger_registry.sync_file(wf_path)
         return jsonify({
             "status": "ok",
             "message": f"Workflow '{workflow}' uploaded and validated under repo '{repo}'"
@@ -347,15 +447,20 @@ def upload_workflow_yaml(repo, workflow):
 def receive_aiagent_input(uid, step_id):
     data = request.get_json()
 
-    if uid not in running_engines:
-        return jsonify({"status": "error", "message": "Unknown or completed workflow"}), 404
+    if parking_lot.is_parked(uid, step_id):
+        # The run is parked waiting for this input: store it in the lifetime and resume
+        lifetime = lifetime_manager.load(uid) or {}
+        shared = dict(lifetime.get("context", {}).get("_aiagent_inputs") or {})
+        shared[step_id] = data
+        parking_lot.resolve(uid, step_id, {"status": "received"}, context_updates={"_aiagent_inputs": shared})
+        logger.info(f"[AIAGENT] Input received for parked run {uid}/{step_id}")
+        return jsonify({"status": "ok", "message": "Input accepted"})
 
-    engine = running_engines[uid]
-    ctx = engine.context
+    engine = run_registry.get_engine(uid)
+    if not engine:
+        return jsonify({"status": "error", "message": "Unknown or completed workflow"}), 404
 
-    shared = ctx.get("_aiagent_inputs", {})
-    shared[step_id] = data
-    ctx.set("_aiagent_inputs", shared)
+    engine.context.set_in("_aiagent_inputs", step_id, data)
 
     logger.info(f"[AIAGENT] Input received for {uid}/{step_id}: {data}")
     return jsonify({"status": "ok", "message": "Input accepted"})
@@ -363,17 +468,14 @@ def receive_aiagent_input(uid, step_id):
 @app.route("/api/agent/<uid>/status", methods=["GET"])
 def agent_status(uid):
     access_key = request.headers.get("X-Access-Key")
-    path = os.path.join(config["directories"]["lifetimes"], f"{uid}.yaml")
-    if not os.path.exists(path):
-        path = os.path.join(config["directories"]["lifetimes"], "completed", f"{uid}.yaml")
-        if not os.path.exists(path):
-            return jsonify({"error": "uid not found"}), 404
+    lifetime = lifetime_manager.load(uid)
+    if not lifetime:
+        return jsonify({"error": "uid not found"}), 404
 
-    with open(path, "r") as f:
-        lifetime = yaml.safe_load(f)
+    workflow = workflow_of(lifetime) or {}
 
     # Validate access key if AI agent
-    if lifetime.get("workflow", {}).get("trigger", {}).get("type") == "aiagent":
+    if workflow.get("trigger", {}).get("type") == "aiagent":
         expected_key = lifetime.get("access_key")
         if not expected_key or expected_key != access_key:
             return jsonify({"error": "invalid access key"}), 403
@@ -389,7 +491,7 @@ def agent_status(uid):
     # Current step info
     current_step = lifetime.get("current_step")
     step_def = next(
-        (s for s in lifetime.get("workflow", {}).get("steps", []) if s.get("id") == current_step),
+        (s for s in workflow.get("steps", []) if s.get("id") == current_step),
         None
     )
 
@@ -404,30 +506,20 @@ def agent_status(uid):
 
 @app.route("/api/resume/<uid>", methods=["POST"])
 def resume_deferred_workflow(uid):
-    path = os.path.join(config["directories"]["lifetimes"], f"{uid}.yaml")
-    if not os.path.exists(path):
+    """Wake a run parked on a defer step before its time is up."""
+    lifetime_map = lifetime_manager.load(uid)
+    if not lifetime_map:
         return jsonify({"status": "error", "message": f"uid {uid} not found"}), 404
 
-    with open(path, "r") as f:
-        lifetime_map = yaml.safe_load(f)
-
-    if "defer_until" not in lifetime_map:
+    parked = lifetime_map.get("parked") or {}
+    if parked.get("reason") != "defer":
         return jsonify({"status": "error", "message": "Not a deferred workflow"}), 400
 
-    # Remove defer_until to avoid re-triggering
-    lifetime_map.pop("defer_until", None)
-
-    threading.Thread(
-        target=resume_workflow_from_lifetime,
-        args=(lifetime_map, approval_manager),
-        daemon=True
-    ).start()
+    if not parking_lot.resolve(uid, parked["step_id"], {"status": "resumed_early"}):
+        return jsonify({"status": "error", "message": "Deferred workflow is already resuming"}), 409
 
     return jsonify({"status": "ok", "resumed": uid})
 
-from engine.utils.defer_manager import run_defer_manager
-run_defer_manager()
-
 
 if __name__ == "__main__":
     # registering api routes for UI
@@ -436,6 +528,8 @@ if __name__ == "__main__":
     app.register_blueprint(api)
 
     poller_controller()
+    # Restore persisted timers before parked runs and approval routes re-register theirs
+    timer_service.start()
     # Resume any pending workflows
     logger.info("[WEB SERVER] Resuming pending workflows...")
     resume_pending_workflows()
@@ -1,4 +1,5 @@
 import time
+from engine.utils.parking import RunParked, parkable, parking_lot, current_step_id
 from commons.logs import get_logger
 
 logger = get_logger("aiagent_input")
@@ -9,28 +10,45 @@ class Aiagent_input:
         self.config = module_config or {}
 
         self.uid = self.context.get("workflow_uid")
-        self.step_id = self.context.get("current_step_id")
-        self.shared_dict = self.context.get("_aiagent_inputs", {})
+        self.step_id = current_step_id()
 
-    def wait_for_input(self, expected_keys=None, timeout_seconds=900):
+    def _has_input(self, context):
+        return self.step_id in (context.get("_aiagent_inputs") or {})
+
+    def wait_for_input(self, expected_keys=None, timeout_seconds=900, park_after_seconds=1):
         logger.info(f"[AIAGENT] Waiting for agent input at {self.uid}/{self.step_id}...")
 
-        start = time.time()
-        while True:
-            if self.step_id in self.shared_dict:
-                input_data = self.shared_dict.pop(self.step_id)
-                logger.info(f"[AIAGENT] Received input: {input_data}")
-                self.context.set(f"ai_input_{self.step_id}", input_data)
-
-                # Optional: unpack into context
-                for k, v in input_data.items():
-                    self.context.set(k, v)
-
-                return {
-                    "status": "received",
-                    "data": input_data
-                }
-
-            if time.time() - start > timeout_seconds:
-                raise TimeoutError(f"Timeout waiting for agent input at {self.uid}/{self.step_id}")
-            time.sleep(1)
+        # The deadline is kept in the context so it holds across park/resume cycles
+        deadline = (self.context.get("_aiagent_deadlines") or {}).get(self.step_id)
+        if deadline is None:
+            deadline = time.time() + timeout_seconds
+            self.context.set_in("_aiagent_deadlines", self.step_id, deadline)
+
+        if parkable():
+            # An agent that answers right away is picked up in place; otherwise park instead of holding the thread
+            grace = max(min(park_after_seconds, deadline - time.time()), 0)
+            if not self.context.wait_until(self._has_input, timeout=grace) and time.time() < deadline:
+                # The input endpoint resumes the run, the timer service times it out
+                parking_lot.expect(self.uid, self.step_id, "aiagent_input")
+                if not self._has_input(self.context.get_all()):
+                    raise RunParked(self.step_id, "aiagent_input", {"timeout_seconds": timeout_seconds, "wake_at": deadline})
+                parking_lot.discard(self.uid, self.step_id)
+
+        # Woken by the write that delivers the input, not by polling
+        received = self.context.wait_until(self._has_input, timeout=max(deadline - time.time(), 0))
+        self.context.pop_in("_aiagent_deadlines", self.step_id)
+        if not received:
+            raise TimeoutError(f"Timeout waiting for agent input at {self.uid}/{self.step_id}")
+
+        input_data = self.context.pop_in("_aiagent_inputs", self.step_id)
+        logger.info(f"[AIAGENT] Received input: {input_data}")
+        self.context.set(f"ai_input_{self.step_id}", input_data)
+
+        # Optional: unpack into context
+        for k, v in input_data.items():
+            self.context.set(k, v)
+
+        return {
+            "status": "received",
+            "data": input_data
+        }
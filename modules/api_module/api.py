@@ -3,9 +3,14 @@ import time
 from datetime import datetime, timedelta
 from commons.logs import get_logger
 from engine.utils.match_engine import extract_json_path, evaluate_operator
+from engine.utils.parking import RunParked, parkable, current_step_id
+from engine.utils.async_runtime import async_runtime
 
 logger = get_logger("api_module")
 
+# Poll waits shorter than this sleep in place; parking costs a lifetime flush and an engine rebuild per poll
+DEFAULT_PARK_AFTER_SECONDS = 60
+
 class API:
     def __init__(self, context, **module_config):
         self.context = context
@@ -55,15 +60,71 @@ class API:
                 "data": None
             }
 
+    async def acall(self, method, url, headers=None, params=None, json=None, data=None, timeout=None):
+        timeout = timeout or self.config.get("timeout", 10)
+        headers = headers or self.config.get("headers")
+
+        try:
+            response = await async_runtime.http_client().request(
+                method=method,
+                url=url,
+                headers=headers,
+                params=params,
+                json=json,
+                data=data,
+                timeout=timeout
+            )
+            result = {
+                "status_code": response.status_code,
+                "body": response.text,
+                "url": str(response.url),
+            }
+            if 200 <= response.status_code < 300:
+                logger.info(f"[API] Async request to {url} succeeded with status {response.status_code}")
+                return {
+                    "status": "ok",
+                    "message": f"Request to {url} succeeded with status {response.status_code}",
+                    "data": result
+                }
+            logger.error(f"[API] Async request to {url} failed: Status {response.status_code}, Body: {response.text}")
+            return {
+                "status": "fail",
+                "message": f"Request to {url} failed with status {response.status_code}",
+                "data": result
+            }
+        except Exception as e:
+            logger.error(f"[API] Exception during async API call: {e}")
+            return {
+                "status": "fail",
+                "message": f"Exception occurred during API call: {e}",
+                "data": None
+            }
+
+    def _forget_deadline(self, step_id):
+        if step_id in (self.context.get("_blocking_deadlines") or {}):
+            self.context.pop_in("_blocking_deadlines", step_id)
+
     def blocking_call(self, method, url, headers=None, params=None, body=None,
                       poll_interval_seconds=None, timeout_minutes=None,
-                      polling_mode="status_code", expected_status_code=200, success_condition=None):
+                      polling_mode="status_code", expected_status_code=200, success_condition=None,
+                      park_after_seconds=None):
         
         poll_interval_seconds = poll_interval_seconds or self.config.get("poll_interval_seconds", 10)
         timeout_minutes = timeout_minutes or self.config.get("timeout_minutes", 5)
+        if park_after_seconds is None:
+            park_after_seconds = self.config.get("park_after_seconds", DEFAULT_PARK_AFTER_SECONDS)
         headers = headers or self.config.get("headers")
 
         deadline = datetime.utcnow() + timedelta(minutes=timeout_minutes)
+        step_id = current_step_id()
+        park = parkable()
+        if park:
+            # The deadline is kept in the context so it holds across park/resume cycles
+            known = (self.context.get("_blocking_deadlines") or {}).get(step_id)
+            if known:
+                deadline = datetime.fromisoformat(known)
+            else:
+                self.context.set_in("_blocking_deadlines", step_id, deadline.isoformat())
 
         while datetime.utcnow() < deadline:
             try:
@@ -71,15 +132,23 @@ class API:
 
                 if polling_mode == "status_code":
                     if response.status_code == expected_status_code:
+                        self._forget_deadline(step_id)
                         return {"status": "success", "response": response.json() if response.content else {}}
                 elif polling_mode == "response_body" and success_condition:
                     data = response.json()
                     actual_value = extract_json_path(data, success_condition["path"])
                     if evaluate_operator(success_condition["operator"], actual_value, success_condition["value"]):
+                        self._forget_deadline(step_id)
                         return {"status": "success", "response": data}
             except Exception as e:
                 logger.error(f"[API] Error during blocking call: {e}")
 
-            time.sleep(poll_interval_seconds)
+            wake_at = min(datetime.utcnow() + timedelta(seconds=poll_interval_seconds), deadline)
+            wait = max((wake_at - datetime.utcnow()).total_seconds(), 0)
+            if park and wait >= park_after_seconds:
+                # Free the run's thread for a long pause; the timer service resumes the step for the next poll
+                raise RunParked(step_id, "blocking_call", {"wake_at": wake_at.isoformat()})
+            time.sleep(wait)
 
+        self._forget_deadline(step_id)
         return {"status": "timeout", "reason": f"Polling timed out after {timeout_minutes} minutes"}
@@ -1,5 +1,6 @@
 import requests
 from commons.logs import get_logger
+from engine.utils.async_runtime import async_runtime
 
 logger = get_logger("chatbot_module")
 
@@ -11,7 +12,42 @@ class Chatbot:
 
     def ask(self, provider=None, system_prompt=None, user_message=None,
             model=None, temperature=None, api_key=None):
+        request, error = self._prepare(provider, system_prompt, user_message, model, temperature, api_key)
+        if error:
+            return error
 
+        try:
+            response = requests.post(request["url"], headers=request["headers"], json=request["payload"])
+            response.raise_for_status()
+            return self._reply(request, response.json())
+        except Exception as e:
+            logger.error(f"[CHATBOT] Error during request: {e}")
+            return {
+                "status": "fail",
+                "message": f"Exception occurred during Chatbot call: {str(e)}",
+                "data": None
+            }
+
+    async def aask(self, provider=None, system_prompt=None, user_message=None,
+                   model=None, temperature=None, api_key=None):
+        request, error = self._prepare(provider, system_prompt, user_message, model, temperature, api_key)
+        if error:
+            return error
+
+        try:
+            response = await async_runtime.http_client().post(request["url"], headers=request["headers"], json=request["payload"])
+            response.raise_for_status()
+            return self._reply(request, response.json())
+        except Exception as e:
+            logger.error(f"[CHATBOT] Error during request: {e}")
+            return {
+                "status": "fail",
+                "message": f"Exception occurred during Chatbot call: {str(e)}",
+                "data": None
+            }
+
+    def _prepare(self, provider, system_prompt, user_message, model, temperature, api_key):
+        """The provider request to send, or a failure result when it cannot be made."""
         provider = (provider or self.config.get("provider", "")).lower()
         model = model or self.config.get("model")
         temperature = temperature if temperature is not None else self.config.get("temperature", 0.7)
@@ -24,108 +60,94 @@ class Chatbot:
             logger.warning("[CHATBOT] No API key provided.")
 
         if not api_key and provider in ["openai", "anthropic", "mistral"]:
-            return {
+            return None, {
                 "status": "fail",
                 "message": f"Missing API key for provider '{provider}'",
                 "data": None
             }
 
-        try:
-            if provider == "openai":
-                return self._ask_openai(system_prompt, user_message, model or "gpt-4", temperature, api_key)
-            elif provider == "anthropic":
-                return self._ask_claude(system_prompt, user_message, model or "claude-3-opus-20240229", temperature, api_key)
-            elif provider == "grok":
-                return {
-                    "status": "fail",
-                    "message": "X/Twitter Grok API is not publicly available",
-                    "data": None
-                }
-            elif provider == "mistral":
-                return self._ask_mistral(system_prompt, user_message, model or "mistral-medium", temperature, api_key)
-            else:
-                return {
-                    "status": "fail",
-                    "message": f"Unsupported provider '{provider}'",
-                    "data": None
-                }
-        except Exception as e:
-            logger.error(f"[CHATBOT] Error during request: {e}")
-            return {
+        if provider == "openai":
+            return self._openai_request(system_prompt, user_message, model or "gpt-4", temperature, api_key), None
+        elif provider == "anthropic":
+            return self._claude_request(system_prompt, user_message, model or "claude-3-opus-20240229", temperature, api_key), None
+        elif provider == "grok":
+            return None, {
                 "status": "fail",
-                "message": f"Exception occurred during Chatbot call: {str(e)}",
+                "message": "X/Twitter Grok API is not publicly available",
                 "data": None
             }
-
-    def _ask_openai(self, system_prompt, user_message, model, temperature, api_key):
-        url = "https://api.openai.com/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "model": model,
-            "temperature": temperature,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ]
+        elif provider == "mistral":
+            return self._mistral_request(system_prompt, user_message, model or "mistral-medium", temperature, api_key), None
+        return None, {
+            "status": "fail",
+            "message": f"Unsupported provider '{provider}'",
+            "data": None
         }
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
+
+    @staticmethod
+    def _reply(request, body):
         return {
             "status": "ok",
-            "message": "OpenAI chat completed successfully",
+            "message": f"{request['label']} chat completed successfully",
             "data": {
-                "reply": response.json()["choices"][0]["message"]["content"].strip()
+                "reply": request["reply"](body).strip()
             }
         }
 
-    def _ask_claude(self, system_prompt, user_message, model, temperature, api_key):
-        url = "https://api.anthropic.com/v1/messages"
-        headers = {
-            "x-api-key": api_key,
-            "anthropic-version": "2023-06-01",
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "model": model,
-            "temperature": temperature,
-            "max_tokens": 1000,
-            "messages": [
-                {"role": "user", "content": f"{system_prompt}\n\n{user_message}"}
-            ]
-        }
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
+    def _openai_request(self, system_prompt, user_message, model, temperature, api_key):
         return {
-            "status": "ok",
-            "message": "Claude chat completed successfully",
-            "data": {
-                "reply": response.json()["content"][0]["text"].strip()
-            }
+            "label": "OpenAI",
+            "url": "https://api.openai.com/v1/chat/completions",
+            "headers": {
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json"
+            },
+            "payload": {
+                "model": model,
+                "temperature": temperature,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_message}
+                ]
+            },
+            "reply": lambda body: body["choices"][0]["message"]["content"]
         }
 
-    def _ask_mistral(self, system_prompt, user_message, model, temperature, api_key):
-        url = "https://api.mistral.ai/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "model": model,
-            "temperature": temperature,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ]
+    def _claude_request(self, system_prompt, user_message, model, temperature, api_key):
+        return {
+            "label": "Claude",
+            "url": "https://api.anthropic.com/v1/messages",
+            "headers": {
+                "x-api-key": api_key,
+                "anthropic-version": "2023-06-01",
+                "Content-Type": "application/json"
+            },
+            "payload": {
+                "model": model,
+                "temperature": temperature,
+                "max_tokens": 1000,
+                "messages": [
+                    {"role": "user", "content": f"{system_prompt}\n\n{user_message}"}
+                ]
+            },
+            "reply": lambda body: body["content"][0]["text"]
         }
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
+
+    def _mistral_request(self, system_prompt, user_message, model, temperature, api_key):
         return {
-            "status": "ok",
-            "message": "Mistral chat completed successfully",
-            "data": {
-                "reply": response.json()["choices"][0]["message"]["content"].strip()
-            }
+            "label": "Mistral",
+            "url": "https://api.mistral.ai/v1/chat/completions",
+            "headers": {
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json"
+            },
+            "payload": {
+                "model": model,
+                "temperature": temperature,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_message}
+                ]
+            },
+            "reply": lambda body: body["choices"][0]["message"]["content"]
         }
@@ -81,7 +81,7 @@ class Git:
         }
 
     def add_file_from_template(self, template, destination, variables=None, commit_message="Add generated file"):
-        ctx = self.context.get_all()
+        ctx = dict(self.context.get_all())
         if variables:
             ctx.update(variables)
 
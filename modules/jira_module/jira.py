@@ -1,5 +1,6 @@
 import requests
 from commons.logs import get_logger
+from engine.utils.async_runtime import async_runtime
 
 logger = get_logger("jira_module")
 
@@ -17,20 +18,61 @@ class Jira:
         logger.debug(f"[INIT] Jira module initialized with base_url: {self.base_url}")
 
     def _parse_response(self, resp, success_msg="", fail_msg=""):
+        # Works for requests and httpx responses alike
         try:
             data = resp.json()
         except Exception as e:
             data = {"error": resp.text}
             logger.warning(f"[JIRA] Failed to parse response JSON: {e}")
-        if resp.ok:
+        if 200 <= resp.status_code < 400:
             return {"status": "ok", "message": success_msg, "data": data}
         else:
             logger.warning(f"[HTTP] {resp.request.method} {resp.url} - {resp.status_code}")
             return {"status": "fail", "message": fail_msg or str(data), "data": data}
 
+    def _send(self, request):
+        """Perform a request built by one of the *_request helpers with requests."""
+        resp = requests.request(request["method"], request["url"], auth=self.auth, headers=request.get("headers", self.headers),
+                                json=request.get("json"), params=request.get("params"), data=request.get("data"))
+        return self._parse_response(resp, request["success"], request["fail"])
+
+    async def _asend(self, request):
+        """The same on the engine's event loop."""
+        resp = await async_runtime.http_client().request(
+            request["method"], request["url"], auth=self.auth, headers=request.get("headers", self.headers),
+            json=request.get("json"), params=request.get("params"), content=request.get("data"))
+        return self._parse_response(resp, request["success"], request["fail"])
+
     def create_ticket(self, project_key, summary, issue_type, description=None, custom_fields=None,
                       assignee=None, watchers=None, labels=None, components=None):
-        url = f"{self.base_url}/rest/api/2/issue"
+        parsed = self._send(self._create_request(project_key, summary, issue_type, description, custom_fields,
+                                                 assignee, labels, components))
+        if parsed["status"] == "ok":
+            key = parsed["data"].get("key")
+            parsed["data"] = key
+            if watchers:
+                for watcher in watchers:
+                    self.add_watcher(key, watcher)
+        else:
+            logger.error(f"[JIRA] Ticket creation failed: {parsed['data']}")
+
+        return parsed
+
+    async def acreate_ticket(self, project_key, summary, issue_type, description=None, custom_fields=None,
+                             assignee=None, watchers=None, labels=None, components=None):
+        parsed = await self._asend(self._create_request(project_key, summary, issue_type, description, custom_fields,
+                                                        assignee, labels, components))
+        if parsed["status"] == "ok":
+            key = parsed["data"].get("key")
+            parsed["data"] = key
+            for watcher in watchers or []:
+                await self.aadd_watcher(key, watcher)
+        else:
+            logger.error(f"[JIRA] Ticket creation failed: {parsed['data']}")
+
+        return parsed
+
+    def _create_request(self, project_key, summary, issue_type, description, custom_fields, assignee, labels, components):
         logger.info(f"[JIRA] Creating ticket in project: {project_key} with summary: {summary}")
 
         fields = {
@@ -51,48 +93,65 @@ class Jira:
             fields["components"] = [{"name": c} for c in components]
 
         logger.debug(f"[JIRA] Final payload: {fields}")
-        resp = requests.post(url, json={"fields": fields}, auth=self.auth, headers=self.headers)
-        parsed = self._parse_response(resp, "Ticket created", "Failed to create ticket")
+        return {"method": "POST", "url": f"{self.base_url}/rest/api/2/issue", "json": {"fields": fields},
+                "success": "Ticket created", "fail": "Failed to create ticket"}
 
-        if parsed["status"] == "ok":
-            key = parsed["data"].get("key")
-            parsed["data"] = key
-            if watchers:
-                for watcher in watchers:
-                    self.add_watcher(key, watcher)
-        else:
-            logger.error(f"[JIRA] Ticket creation failed: {parsed['data']}")
+    def update_ticket(self, issue_key, fields):
+        return self._send(self._update_request(issue_key, fields))
 
-        return parsed
+    async def aupdate_ticket(self, issue_key, fields):
+        return await self._asend(self._update_request(issue_key, fields))
 
-    def update_ticket(self, issue_key, fields):
-        url = f"{self.base_url}/rest/api/2/issue/{issue_key}"
+    def _update_request(self, issue_key, fields):
         logger.info(f"[JIRA] Updating ticket {issue_key} with fields {fields}")
-        resp = requests.put(url, json={"fields": fields}, auth=self.auth, headers=self.headers)
-        return self._parse_response(resp, f"Updated ticket {issue_key}", f"Failed to update {issue_key}")
+        return {"method": "PUT", "url": f"{self.base_url}/rest/api/2/issue/{issue_key}", "json": {"fields": fields},
+                "success": f"Updated ticket {issue_key}", "fail": f"Failed to update {issue_key}"}
 
     def add_comment(self, issue_key, comment):
         if not issue_key:
             return {"status": "fail", "message": "Empty issue key", "data": None}
-        url = f"{self.base_url}/rest/api/2/issue/{issue_key}/comment"
+        return self._send(self._comment_request(issue_key, comment))
+
+    async def aadd_comment(self, issue_key, comment):
+        if not issue_key:
+            return {"status": "fail", "message": "Empty issue key", "data": None}
+        return await self._asend(self._comment_request(issue_key, comment))
+
+    def _comment_request(self, issue_key, comment):
         logger.info(f"[JIRA] Adding comment to {issue_key}")
-        resp = requests.post(url, json={"body": comment}, auth=self.auth, headers=self.headers)
-        return self._parse_response(resp, f"Comment added to {issue_key}", f"Failed to comment on {issue_key}")
+        return {"method": "POST", "url": f"{self.base_url}/rest/api/2/issue/{issue_key}/comment", "json": {"body": comment},
+                "success": f"Comment added to {issue_key}", "fail": f"Failed to comment on {issue_key}"}
 
     def get_ticket(self, issue_key):
-        url = f"{self.base_url}/rest/api/2/issue/{issue_key}"
+        return self._send(self._get_request(issue_key))
+
+    async def aget_ticket(self, issue_key):
+        return await self._asend(self._get_request(issue_key))
+
+    def _get_request(self, issue_key):
         logger.debug(f"[JIRA] Fetching ticket: {issue_key}")
-        resp = requests.get(url, auth=self.auth, headers=self.headers)
-        return self._parse_response(resp, f"Ticket {issue_key} fetched", f"Failed to fetch {issue_key}")
+        return {"method": "GET", "url": f"{self.base_url}/rest/api/2/issue/{issue_key}",
+                "success": f"Ticket {issue_key} fetched", "fail": f"Failed to fetch {issue_key}"}
 
     def search_tickets(self, jql):
-        url = f"{self.base_url}/rest/api/2/search"
+        return self._send(self._search_request(jql))
+
+    async def asearch_tickets(self, jql):
+        return await self._asend(self._search_request(jql))
+
+    def _search_request(self, jql):
         logger.info(f"[JIRA] Searching tickets with JQL: {jql}")
-        resp = requests.get(url, params={"jql": jql}, auth=self.auth, headers=self.headers)
-        return self._parse_response(resp, "Search successful", "Search failed")
+        return {"method": "GET", "url": f"{self.base_url}/rest/api/2/search", "params": {"jql": jql},
+                "success": "Search successful", "fail": "Search failed"}
 
     def get_status(self, issue_key):
-        result = self.get_ticket(issue_key)
+        return self._status_of(issue_key, self.get_ticket(issue_key))
+
+    async def aget_status(self, issue_key):
+        return self._status_of(issue_key, await self.aget_ticket(issue_key))
+
+    @staticmethod
+    def _status_of(issue_key, result):
         if result["status"] != "ok":
             return result
         try:
@@ -117,18 +176,28 @@ class Jira:
         return self._parse_response(resp, f"File attached to {issue_key}", f"Failed to attach file to {issue_key}")
 
     def transition_ticket(self, issue_key, transition_id):
-        url = f"{self.base_url}/rest/api/2/issue/{issue_key}/transitions"
+        return self._send(self._transition_request(issue_key, transition_id))
+
+    async def atransition_ticket(self, issue_key, transition_id):
+        return await self._asend(self._transition_request(issue_key, transition_id))
+
+    def _transition_request(self, issue_key, transition_id):
         logger.info(f"[JIRA] Transitioning {issue_key} with transition ID {transition_id}")
         payload = {
             "transition": {"id": str(transition_id)}
         }
-        resp = requests.post(url, json=payload, auth=self.auth, headers=self.headers)
-        return self._parse_response(resp, f"Transitioned {issue_key}", f"Failed to transition {issue_key}")
+        return {"method": "POST", "url": f"{self.base_url}/rest/api/2/issue/{issue_key}/transitions", "json": payload,
+                "success": f"Transitioned {issue_key}", "fail": f"Failed to transition {issue_key}"}
 
     def add_watcher(self, issue_key, username):
-        url = f"{self.base_url}/rest/api/2/issue/{issue_key}/watchers"
+        return self._send(self._watcher_request(issue_key, username))
+
+    async def aadd_watcher(self, issue_key, username):
+        return await self._asend(self._watcher_request(issue_key, username))
+
+    def _watcher_request(self, issue_key, username):
         logger.info(f"[JIRA] Adding watcher {username} to {issue_key}")
         headers = self.headers.copy()
         headers["Content-Type"] = "application/json"
-        resp = requests.post(url, data=f'"{username}"', auth=self.auth, headers=headers)
-        return self._parse_response(resp, f"Watcher {username} added", f"Failed to add watcher {username}")
+        return {"method": "POST", "url": f"{self.base_url}/rest/api/2/issue/{issue_key}/watchers", "data": f'"{username}"',
+                "headers": headers, "success": f"Watcher {username} added", "fail": f"Failed to add watcher {username}"}
@@ -2,6 +2,7 @@ import requests
 import ast
 import json
 from commons.logs import get_logger
+from engine.utils.async_runtime import async_runtime
 
 logger = get_logger("slack_module")
 
@@ -13,6 +14,70 @@ class Slack:
         logger.info(f"[SLACK] Initialized with config: {self.config}")
 
     def send_info_message(self, channel, title, message=None, keyed_message=None, flatten_form_result=False, color="info", webhook_url=None):
+        webhook_url = self._webhook_url(webhook_url)
+        if not webhook_url:
+            logger.error("[SLACK] Missing webhook URL")
+            return {"status": "fail", "message": "Missing webhook URL", "data": None}
+        payload = self._info_payload(channel, title, message, keyed_message, flatten_form_result, color)
+
+        try:
+            response = requests.post(webhook_url, json=payload)
+            response.raise_for_status()
+            logger.info(f"[SLACK] Info message sent to {channel}")
+            return {"status": "ok", "message": f"Message sent to {channel}", "data": {"channel": channel}}
+        except Exception as e:
+            logger.error(f"[SLACK] Failed to send info message: {e}")
+            return {"status": "fail", "message": str(e), "data": None}
+
+    async def asend_info_message(self, channel, title, message=None, keyed_message=None, flatten_form_result=False, color="info", webhook_url=None):
+        webhook_url = self._webhook_url(webhook_url)
+        if not webhook_url:
+            logger.error("[SLACK] Missing webhook URL")
+            return {"status": "fail", "message": "Missing webhook URL", "data": None}
+        payload = self._info_payload(channel, title, message, keyed_message, flatten_form_result, color)
+
+        try:
+            response = await async_runtime.http_client().post(webhook_url, json=payload)
+            response.raise_for_status()
+            logger.info(f"[SLACK] Info message sent to {channel}")
+            return {"status": "ok", "message": f"Message sent to {channel}", "data": {"channel": channel}}
+        except Exception as e:
+            logger.error(f"[SLACK] Failed to send info message: {e}")
+            return {"status": "fail", "message": str(e), "data": None}
+
+    def send_incident_message(self, channel, message, severity=None, oncall_user=None):
+        webhook_url = self._webhook_url()
+        if not webhook_url:
+            logger.error("[SLACK] Missing webhook URL for incident")
+            return {"status": "fail", "message": "Missing webhook URL", "data": None}
+        payload = self._incident_payload(channel, message, severity, oncall_user)
+
+        try:
+            response = requests.post(webhook_url, json=payload)
+            response.raise_for_status()
+            logger.info(f"[SLACK] Incident message sent to {channel}")
+            return {"status": "ok", "message": f"Incident sent to {channel}", "data": {"channel": channel}}
+        except Exception as e:
+            logger.error(f"[SLACK] Failed to send incident message: {e}")
+            return {"status": "fail", "message": str(e), "data": None}
+
+    async def asend_incident_message(self, channel, message, severity=None, oncall_user=None):
+        webhook_url = self._webhook_url()
+        if not webhook_url:
+            logger.error("[SLACK] Missing webhook URL for incident")
+            return {"status": "fail", "message": "Missing webhook URL", "data": None}
+        payload = self._incident_payload(channel, message, severity, oncall_user)
+
+        try:
+            response = await async_runtime.http_client().post(webhook_url, json=payload)
+            response.raise_for_status()
+            logger.info(f"[SLACK] Incident message sent to {channel}")
+            return {"status": "ok", "message": f"Incident sent to {channel}", "data": {"channel": channel}}
+        except Exception as e:
+            logger.error(f"[SLACK] Failed to send incident message: {e}")
+            return {"status": "fail", "message": str(e), "data": None}
+
+    def _webhook_url(self, webhook_url=None):
         webhook_url = (
             webhook_url or
             self.context.get("slack_webhook_url") or
@@ -20,11 +85,9 @@ class Slack:
             self.config.get("webhook_url")
         )
         logger.info(f"[SLACK] Webhook URL: {webhook_url}")
+        return webhook_url
 
-        if not webhook_url:
-            logger.error("[SLACK] Missing webhook URL")
-            return {"status": "fail", "message": "Missing webhook URL", "data": None}
-
+    def _info_payload(self, channel, title, message, keyed_message, flatten_form_result, color):
         fields = []
 
         if message:
@@ -67,7 +130,7 @@ class Slack:
                         "short": True
                     })
 
-        payload = {
+        return {
             "channel": channel,
             "text": title,
             "attachments": [
@@ -78,28 +141,8 @@ class Slack:
             ]
         }
 
-        try:
-            response = requests.post(webhook_url, json=payload)
-            response.raise_for_status()
-            logger.info(f"[SLACK] Info message sent to {channel}")
-            return {"status": "ok", "message": f"Message sent to {channel}", "data": {"channel": channel}}
-        except Exception as e:
-            logger.error(f"[SLACK] Failed to send info message: {e}")
-            return {"status": "fail", "message": str(e), "data": None}
-
-    def send_incident_message(self, channel, message, severity=None, oncall_user=None):
-        webhook_url = (
-            self.context.get("slack_webhook_url") or
-            self.context.get("webhook_url") or
-            self.config.get("webhook_url")
-        )
-        logger.info(f"[SLACK] Webhook URL for incident: {webhook_url}")
-
-        if not webhook_url:
-            logger.error("[SLACK] Missing webhook URL for incident")
-            return {"status": "fail", "message": "Missing webhook URL", "data": None}
-
-        payload = {
+    def _incident_payload(self, channel, message, severity, oncall_user):
+        return {
             "channel": channel,
             "text": message,
             "attachments": [
@@ -113,15 +156,6 @@ class Slack:
             ],
         }
 
-        try:
-            response = requests.post(webhook_url, json=payload)
-            response.raise_for_status()
-            logger.info(f"[SLACK] Incident message sent to {channel}")
-            return {"status": "ok", "message": f"Incident sent to {channel}", "data": {"channel": channel}}
-        except Exception as e:
-            logger.error(f"[SLACK] Failed to send incident message: {e}")
-            return {"status": "fail", "message": str(e), "data": None}
-
     def _get_color(self, severity):
         return {
             "sev1": "#ff0000",